@@ -33,9 +33,14 @@
 #include <sys/mman.h>
 #include <sys/socket.h>
 #include <sys/stat.h>
+#include <sys/statfs.h>
 #include <sys/un.h>
 #include <unistd.h>
 
+#ifndef HUGETLBFS_MAGIC
+#define HUGETLBFS_MAGIC 0x958458f6
+#endif
+
 int UxsocketInit(const char *path) {
   int fd;
   struct sockaddr_un saun;
@@ -173,6 +178,11 @@ int ShmCreate(const char *path, size_t size, void **addr) {
     perror("util_create_shmsiszed: open failed");
     goto error_out;
   }
+
+  // files on hugetlbfs can only have a size that is a multiple of the huge page size
+  struct statfs fs;
+  if (fstatfs(fd, &fs) == 0 && fs.f_type == HUGETLBFS_MAGIC)
+    size = (size + fs.f_bsize - 1) / fs.f_bsize * fs.f_bsize;
   if (ftruncate(fd, size) != 0) {
     perror("util_create_shmsiszed: ftruncate failed");
     goto error_remove;
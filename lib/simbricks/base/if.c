@@ -33,12 +33,17 @@
 #include <sys/mman.h>
 #include <sys/socket.h>
 #include <sys/stat.h>
+#include <sys/statfs.h>
 #include <sys/un.h>
 #include <unistd.h>
 
 #include <simbricks/base/if.h>
 #include <simbricks/base/proto.h>
 
+#ifndef HUGETLBFS_MAGIC
+#define HUGETLBFS_MAGIC 0x958458f6
+#endif
+
 enum ConnState {
   kConnClosed = 0,
   kConnListening,
@@ -60,6 +65,14 @@ int SimbricksBaseIfSHMPoolCreate(struct SimbricksBaseIfSHMPool *pool, const char
     return -1;
   }
 
+  // files on hugetlbfs can only have a size that is a multiple of the huge page size
+  struct statfs fs;
+  if (fstatfs(pool->fd, &fs) == 0 && fs.f_type == HUGETLBFS_MAGIC) {
+    size_t page_size = fs.f_bsize;
+    pool_size = (pool_size + page_size - 1) / page_size * page_size;
+    pool->size = pool_size;
+  }
+
   if (ftruncate(pool->fd, pool_size) != 0) {
     perror("SimbricksBaseIfSHMPoolCreate: ftruncate failed");
     close(pool->fd);
@@ -612,6 +612,16 @@ int Runner::ParseArgs(int argc, char *argv[]) {
   if (netAdapterParams_->link_latency_set)
     netParams_.link_latency = netAdapterParams_->link_latency * 1000ULL;
 
+  // as the listener, the NIC allocates the queues of both interfaces
+  if (pcieAdapterParams_->queue_len_set)
+    pcieParams_.in_num_entries = pcieParams_.out_num_entries = pcieAdapterParams_->queue_len;
+  if (netAdapterParams_->queue_len_set)
+    netParams_.in_num_entries = netParams_.out_num_entries = netAdapterParams_->queue_len;
+  if (pcieAdapterParams_->entry_size_set)
+    pcieParams_.in_entries_size = pcieParams_.out_entries_size = pcieAdapterParams_->entry_size;
+  if (netAdapterParams_->entry_size_set)
+    netParams_.in_entries_size = netParams_.out_entries_size = netAdapterParams_->entry_size;
+
   return 0;
 }
 
@@ -57,7 +57,10 @@ static bool ParseUInteger(const char *str, uint64_t *val) {
 // ADDR = connect:UX_SOCKET_PATH |
 //        listen:UX_SOCKET_PATH:SHM_PATH
 // SYNC = sync=<true|false>
-// ARGS = :latency=XX | :sync_interval=XX
+// ARGS = :latency=XX | :sync_interval=XX | :queue_len=XX | :entry_size=XX
+//
+// queue_len and entry_size set the number and size of entries of both queues and
+// are only used by listeners, which allocate the queues.
 //
 // Returns NULL when a failure occured
 struct SimbricksAdapterParams *SimbricksParametersParse(const char *url) {
@@ -70,6 +73,8 @@ struct SimbricksAdapterParams *SimbricksParametersParse(const char *url) {
   params->shm_path = NULL;
   params->link_latency_set = false;
   params->sync_interval_set = false;
+  params->queue_len_set = false;
+  params->entry_size_set = false;
 
   const char *url_end = url + strlen(url);
   const char *start = url;
@@ -185,6 +190,22 @@ struct SimbricksAdapterParams *SimbricksParametersParse(const char *url) {
         free(arg);
         goto error;
       }
+    } else if (delim - start == 9 && strncmp(start, "queue_len", 9) == 0) {
+      if (ParseUInteger(arg, &params->queue_len) && params->queue_len > 0) {
+        params->queue_len_set = true;
+      } else {
+        fprintf(stderr, "Failed to parse queue length value: %s\n", url);
+        free(arg);
+        goto error;
+      }
+    } else if (delim - start == 10 && strncmp(start, "entry_size", 10) == 0) {
+      if (ParseUInteger(arg, &params->entry_size) && params->entry_size > 0) {
+        params->entry_size_set = true;
+      } else {
+        fprintf(stderr, "Failed to parse entry size value: %s\n", url);
+        free(arg);
+        goto error;
+      }
     } else {
       fprintf(stderr, "Invalid optional parameter: %s\n", url);
       free(arg);
@@ -243,6 +264,10 @@ int SimbricksParametersEstablish(struct SimBricksBaseIfEstablishData *ifs, const
     } else {
       bps->sync_mode = kSimbricksBaseIfSyncDisabled;
     }
+    if (ap->queue_len_set)
+      bps->in_num_entries = bps->out_num_entries = ap->queue_len;
+    if (ap->entry_size_set)
+      bps->in_entries_size = bps->out_entries_size = ap->entry_size;
   }
 
   // Allocate mempool if needed
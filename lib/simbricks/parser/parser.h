@@ -39,6 +39,10 @@ struct SimbricksAdapterParams {
   uint64_t link_latency;
   bool sync_interval_set;
   uint64_t sync_interval;
+  bool queue_len_set;
+  uint64_t queue_len;
+  bool entry_size_set;
+  uint64_t entry_size;
 };
 
 struct SimbricksAdapterParams *SimbricksParametersParse(const char *url);
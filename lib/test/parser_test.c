@@ -86,6 +86,10 @@ static bool test_valid_listen() {
     fprintf(stderr, "Sync is true but expected false\n");
     goto error;
   }
+  if (params->queue_len_set || params->entry_size_set) {
+    fprintf(stderr, "Expected that queue length and entry size are not set\n");
+    goto error;
+  }
   // success
   SimbricksParametersFree(params);
   return true;
@@ -139,8 +143,60 @@ error:
   return false;
 }
 
+static bool test_valid_queue_size() {
+  char *url = "listen:/some/path:/shm/path:sync=true:queue_len=1024:entry_size=2112";
+  struct SimbricksAdapterParams *params = SimbricksParametersParse(url);
+  if (!params) {
+    fprintf(stderr, "Parsing of '%s' failed unexpectedly\n", url);
+    goto error;
+  }
+  if (!params->queue_len_set) {
+    fprintf(stderr, "Expected that queue length is set, but it is not\n");
+    goto error;
+  }
+  if (params->queue_len != 1024) {
+    fprintf(stderr, "Queue length was %lu but expected %d\n", params->queue_len, 1024);
+    goto error;
+  }
+  if (!params->entry_size_set) {
+    fprintf(stderr, "Expected that entry size is set, but it is not\n");
+    goto error;
+  }
+  if (params->entry_size != 2112) {
+    fprintf(stderr, "Entry size was %lu but expected %d\n", params->entry_size, 2112);
+    goto error;
+  }
+  // success
+  SimbricksParametersFree(params);
+  return true;
+error:
+  // failure
+  SimbricksParametersFree(params);
+  return false;
+}
+
+static bool test_invalid_queue_size() {
+  char *urls[] = {
+      "listen:/some/path:/shm/path:sync=true:queue_len=0",
+      "listen:/some/path:/shm/path:sync=true:queue_len=abc",
+      "listen:/some/path:/shm/path:sync=true:entry_size=0",
+      "listen:/some/path:/shm/path:sync=true:entry_size=",
+  };
+  for (size_t i = 0; i < sizeof(urls) / sizeof(urls[0]); i++) {
+    struct SimbricksAdapterParams *params = SimbricksParametersParse(urls[i]);
+    if (params) {
+      fprintf(stderr, "Parsing of '%s' succeeded unexpectedly\n", urls[i]);
+      SimbricksParametersFree(params);
+      return false;
+    }
+  }
+  return true;
+}
+
 int main(void) {
   TEST_CASE(test_valid_connect, "test_valid_connect")
   TEST_CASE(test_valid_listen, "test_valid_listen")
   TEST_CASE(test_valid_optional_args, "test_valid_optional_args")
+  TEST_CASE(test_valid_queue_size, "test_valid_queue_size")
+  TEST_CASE(test_invalid_queue_size, "test_invalid_queue_size")
 }
\ No newline at end of file
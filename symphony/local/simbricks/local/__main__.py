@@ -25,6 +25,7 @@ users interact with for running simulations locally."""
 import argparse
 import asyncio
 import fnmatch
+import glob
 import importlib
 import importlib.util
 import os
@@ -35,10 +36,17 @@ import sys
 from simbricks.orchestration.instantiation import base as inst_base
 from simbricks.orchestration.simulation import base as sim_base
 from simbricks.orchestration.system import base as sys_base
+from simbricks.runtime import checkpoint_cache as rt_checkpoint_cache
+from simbricks.runtime import cpu_alloc
+from simbricks.runtime import critical_path as rt_critical_path
 from simbricks.runtime import output as sim_out
+from simbricks.runtime import output_stream as sim_out_stream
+from simbricks.runtime import result_cache as rt_result_cache
 from simbricks.runtime.runs import base as runs_base
 from simbricks.runtime.runs import local as rt_local
+from simbricks.utils import content_cache as utils_content_cache
 from simbricks.utils import file as utils_file
+from simbricks.utils import timeline as utils_timeline
 
 
 def parse_args() -> argparse.Namespace:
@@ -58,6 +66,14 @@ def parse_args() -> argparse.Namespace:
         default=False,
         help="List available experiment names",
     )
+    parser.add_argument(
+        "--critical-path",
+        action="store_const",
+        const=True,
+        default=False,
+        help="Instead of running the experiments, analyze which components determine their"
+        " startup time, based on the timelines of earlier runs in the workdir",
+    )
     parser.add_argument(
         "--filter",
         metavar="PATTERN",
@@ -78,7 +94,7 @@ def parse_args() -> argparse.Namespace:
         action="store_const",
         const=True,
         default=False,
-        help="Run experiments even if output already exists (overwrites output)",
+        help="Run experiments even if the result cache has their results (replaces them)",
     )
     parser.add_argument(
         "--verbose",
@@ -99,7 +115,66 @@ def parse_args() -> argparse.Namespace:
         metavar="S",
         type=int,
         default=None,
-        help="Enable periodic sigusr1 to each simulator every S seconds.",
+        help=(
+            "Enable periodic sigusr1 to each simulator every S seconds and collect the reported"
+            " statistics in the output."
+        ),
+    )
+    parser.add_argument(
+        "--resource-sample-int",
+        metavar="S",
+        type=float,
+        default=None,
+        help="Sample CPU, memory and I/O usage of each simulator from /proc every S seconds",
+    )
+    parser.add_argument(
+        "--timeout",
+        metavar="S",
+        type=int,
+        default=None,
+        help="Terminate simulations running longer than S seconds (overrides the experiment's"
+        " timeout)",
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        metavar="S",
+        type=int,
+        default=None,
+        help="Terminate simulations whose simulators produced no new output for S seconds",
+    )
+    parser.add_argument(
+        "--output-retention",
+        metavar="POLICY",
+        type=sim_out.OutputRetention.parse,
+        default=None,
+        help="How much simulator output to keep in memory: 'full' (default), 'head-tail:HEAD:TAIL'"
+        " to keep the first HEAD and last TAIL lines, or 'spill:MB' to move output to disk once"
+        " it exceeds MB megabytes",
+    )
+    parser.add_argument(
+        "--output-coalesce",
+        metavar="S",
+        type=float,
+        default=None,
+        help="Wait up to S seconds after draining simulator output that trickles in slowly, to"
+        " process it in fewer, larger batches",
+    )
+    parser.add_argument(
+        "--output-stream",
+        metavar="FORMAT",
+        type=sim_out_stream.OutputCompression,
+        choices=list(sim_out_stream.OutputCompression),
+        default=None,
+        help="Additionally write output incrementally to out.ndjson[.gz|.zst] while the"
+        " simulation runs. FORMAT is the compression: none, gzip or zstd",
+    )
+    parser.add_argument(
+        "--output-to-file",
+        action="store_const",
+        const=True,
+        default=False,
+        help="Write simulator and proxy output directly to log files in their output directories"
+        " instead of collecting it in out.json",
     )
 
     # arguments for the experiment environment
@@ -117,6 +192,53 @@ def parse_args() -> argparse.Namespace:
         default=pathlib.Path("./out/"),
         help="Work directory base",
     )
+    g_env.add_argument(
+        "--image-cache",
+        metavar="DIR",
+        type=pathlib.Path,
+        help="Directory to cache built and converted disk images in across runs",
+    )
+    g_env.add_argument(
+        "--image-cache-size",
+        metavar="GB",
+        type=float,
+        help="Size limit of the image cache, least recently used images are evicted",
+    )
+    g_env.add_argument(
+        "--result-cache",
+        metavar="DIR",
+        type=pathlib.Path,
+        help="Directory to cache results in, runs identical to earlier ones are skipped",
+    )
+    g_env.add_argument(
+        "--result-cache-size",
+        metavar="GB",
+        type=float,
+        help="Size limit of the result cache, least recently used results are evicted",
+    )
+    g_env.add_argument(
+        "--checkpoint-cache",
+        metavar="DIR",
+        type=pathlib.Path,
+        help="Directory to share checkpoints in between runs with the same configuration",
+    )
+    g_env.add_argument(
+        "--checkpoint-cache-size",
+        metavar="GB",
+        type=float,
+        help="Size limit of the checkpoint cache, unused checkpoints are evicted",
+    )
+    g_env.add_argument(
+        "--shm-backing",
+        choices=[backing.value for backing in inst_base.ShmBacking],
+        default=inst_base.ShmBacking.WORKDIR.value,
+        help="Where to place the shared memory pools of simulators: workdir, tmpfs or hugetlbfs",
+    )
+    g_env.add_argument(
+        "--shm-mount",
+        metavar="DIR",
+        help="Mount point of the tmpfs or hugetlbfs for shared memory pools",
+    )
 
     # arguments for the parallel runtime
     g_par = parser.add_argument_group("Parallel Runtime")
@@ -142,6 +264,44 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Memory limit for parallel runs (in MB)",
     )
+    g_par.add_argument(
+        "--pin-cores",
+        action="store_const",
+        const=True,
+        default=False,
+        help="Pin each simulator to exclusive cores",
+    )
+    g_par.add_argument(
+        "--placement",
+        metavar="POLICY",
+        choices=[policy.value for policy in cpu_alloc.PlacementPolicy],
+        default=cpu_alloc.PlacementPolicy.COMPACT.value,
+        help=(
+            "How to place pinned simulators on cores: compact (close to the simulators they"
+            " communicate with), spread (across NUMA nodes) or sequential"
+        ),
+    )
+    g_par.add_argument(
+        "--prepare-ahead",
+        metavar="N",
+        type=int,
+        default=0,
+        help="Number of queued runs to prepare while other runs execute",
+    )
+    g_par.add_argument(
+        "--prepare-concurrency",
+        metavar="N",
+        type=int,
+        default=2,
+        help="Maximum number of runs prepared ahead concurrently",
+    )
+    g_par.add_argument(
+        "--prepare-disk-reserve",
+        metavar="MB",
+        type=int,
+        default=1024,
+        help="Free disk space to keep when preparing runs ahead (in MB)",
+    )
 
     return parser.parse_args()
 
@@ -157,22 +317,59 @@ def copy_instantiation(to_copy: inst_base.Instantiation) -> inst_base.Instantiat
     return inst_copy
 
 
-def add_exp(
+def setup_instantiation(
     instantiation: inst_base.Instantiation,
-    prereq: runs_base.Run | None,
-    rt: runs_base.Runtime,
     args: argparse.Namespace,
-) -> runs_base.Run:
+    image_cache: utils_content_cache.ContentCache | None = None,
+) -> None:
     workdir = utils_file.join_paths(
         args.workdir, f"{instantiation.simulation.name}/{instantiation.id()}"
     )
-    env = inst_base.InstantiationEnvironment(pathlib.Path(workdir).resolve(), args.global_input_dir)
+    env = inst_base.InstantiationEnvironment(
+        pathlib.Path(workdir).resolve(),
+        args.global_input_dir,
+        inst_base.ShmBacking(args.shm_backing),
+        args.shm_mount,
+        image_cache,
+    )
     instantiation.env = env
     assert len(instantiation.fragments) == 1
     instantiation.assigned_fragment = instantiation.fragments[0]
 
+
+def report_critical_path(instantiation: inst_base.Instantiation, args: argparse.Namespace) -> None:
+    name = instantiation.simulation.name
+    paths = glob.glob(
+        os.path.join(glob.escape(args.workdir), glob.escape(name), "*", "output", "trace.json")
+    )
+    if not paths:
+        print(f"{name}: no timelines of earlier runs found")
+        return
+    setup_instantiation(instantiation, args)
+    graph = instantiation.sim_dependencies()
+    timelines = [utils_timeline.Timeline.load_chrome_trace(path) for path in paths]
+    timings = rt_critical_path.mean_timings(graph, timelines)
+    analysis = rt_critical_path.CriticalPathAnalysis(instantiation, timings)
+    print(f"{name} ({len(timelines)} runs):")
+    print(analysis.format_report())
+
+
+def add_exp(
+    instantiation: inst_base.Instantiation,
+    prereq: runs_base.Run | None,
+    rt: runs_base.Runtime,
+    args: argparse.Namespace,
+    image_cache: utils_content_cache.ContentCache | None = None,
+    repetition: int = 0,
+) -> runs_base.Run:
+    setup_instantiation(instantiation, args, image_cache)
     output = sim_out.SimulationOutput(instantiation.simulation)
-    run = runs_base.Run(instantiation=instantiation, prereq=prereq, simulation_output=output)
+    run = runs_base.Run(
+        instantiation=instantiation,
+        prereq=prereq,
+        simulation_output=output,
+        repetition=repetition,
+    )
     rt.add_run(run)
     return run
 
@@ -182,12 +379,54 @@ def main():
 
     # initialize runtime
     if args.runtime == "parallel":
-        rt = rt_local.LocalParallelRuntime(cores=args.cores, mem=args.mem, verbose=args.verbose)
+        rt = rt_local.LocalParallelRuntime(
+            cores=args.cores,
+            mem=args.mem,
+            verbose=args.verbose,
+            pin_cores=args.pin_cores,
+            placement_policy=cpu_alloc.PlacementPolicy(args.placement),
+            prepare_ahead=args.prepare_ahead,
+            prepare_concurrency=args.prepare_concurrency,
+            prepare_disk_reserve=args.prepare_disk_reserve,
+        )
     else:
         rt = rt_local.LocalSimpleRuntime(verbose=args.verbose)
 
     if args.profile_int:
         rt.enable_profiler(args.profile_int)
+    if args.resource_sample_int:
+        rt.enable_resource_sampling(args.resource_sample_int)
+    if args.output_retention:
+        rt.set_output_retention(args.output_retention)
+    if args.output_coalesce:
+        rt.set_output_coalesce_window(args.output_coalesce)
+    if args.output_stream:
+        rt.enable_output_stream(args.output_stream)
+
+    image_cache = None
+    if args.image_cache is not None:
+        max_size = None
+        if args.image_cache_size is not None:
+            max_size = int(args.image_cache_size * 10**9)
+        image_cache = utils_content_cache.ContentCache(args.image_cache, max_size)
+
+    result_cache = None
+    if args.result_cache is not None:
+        max_size = None
+        if args.result_cache_size is not None:
+            max_size = int(args.result_cache_size * 10**9)
+        result_cache = rt_result_cache.ResultCache(args.result_cache, max_size)
+        rt.enable_result_cache(result_cache, args.force)
+
+    checkpoint_cache = None
+    if args.checkpoint_cache is not None:
+        max_size = None
+        if args.checkpoint_cache_size is not None:
+            max_size = int(args.checkpoint_cache_size * 10**9)
+        checkpoint_cache = rt_checkpoint_cache.CheckpointCache(args.checkpoint_cache, max_size)
+        rt.enable_checkpoint_cache(checkpoint_cache)
+    # runs creating the checkpoint for each checkpoint key
+    checkpoint_runs: dict[str, runs_base.Run] = {}
 
     # load python modules with experiments
     instantiations: list[inst_base.Instantiation] = []
@@ -226,11 +465,23 @@ def main():
             if not match:
                 continue
 
+        if args.output_to_file:
+            inst.simulation.output_to_file = True
+        if args.timeout is not None:
+            inst.simulation.timeout = args.timeout
+        if args.stall_timeout is not None:
+            inst.simulation.stall_timeout = args.stall_timeout
+
         inst.finalize_validate()
 
+        if args.critical_path:
+            report_critical_path(inst, args)
+            continue
+
         # if this is an experiment with a checkpoint we might have to create
         # it
         prereq = None
+        checkpoint_key = None
         if inst.create_checkpoint and inst.simulation.any_supports_checkpointing():
             checkpointing_inst = copy_instantiation(inst)
             checkpointing_inst.restore_checkpoint = False
@@ -238,14 +489,50 @@ def main():
             inst.create_checkpoint = False
             inst.restore_checkpoint = True
 
-            prereq = add_exp(instantiation=checkpointing_inst, rt=rt, prereq=None, args=args)
+            if checkpoint_cache is None:
+                prereq = add_exp(
+                    instantiation=checkpointing_inst,
+                    rt=rt,
+                    prereq=None,
+                    args=args,
+                    image_cache=image_cache,
+                )
+            else:
+                setup_instantiation(checkpointing_inst, args, image_cache)
+                checkpoint_key = checkpoint_cache.checkpoint_key(checkpointing_inst)
+                if checkpoint_key in checkpoint_runs:
+                    # same configuration up to the checkpoint as an earlier instantiation
+                    prereq = checkpoint_runs[checkpoint_key]
+                elif not checkpoint_cache.has_checkpoint(checkpoint_key):
+                    prereq = add_exp(
+                        instantiation=checkpointing_inst,
+                        rt=rt,
+                        prereq=None,
+                        args=args,
+                        image_cache=image_cache,
+                    )
+                    checkpoint_cache.create_checkpoint(checkpointing_inst, checkpoint_key)
+                    checkpoint_runs[checkpoint_key] = prereq
 
         for index in range(args.firstrun, args.firstrun + args.runs):
             inst_copy = copy_instantiation(inst)
             inst_copy.preserve_tmp_folder = False
-            if index == args.firstrun + args.runs - 1:
+            if checkpoint_key is None and index == args.firstrun + args.runs - 1:
                 inst_copy._preserve_checkpoints = False
-            add_exp(instantiation=inst_copy, rt=rt, prereq=prereq, args=args)
+            add_exp(
+                instantiation=inst_copy,
+                rt=rt,
+                prereq=prereq,
+                args=args,
+                image_cache=image_cache,
+                repetition=index,
+            )
+            if checkpoint_key is not None:
+                # cached checkpoints are kept as long as any run still restores from them
+                checkpoint_cache.use_checkpoint(inst_copy, checkpoint_key)
+
+    if args.critical_path:
+        return
 
     # register interrupt handler
     signal.signal(signal.SIGINT, lambda *_: rt.interrupt())
@@ -253,6 +540,16 @@ def main():
     # invoke runtime to run experiments
     asyncio.run(rt.start())
 
+    if image_cache is not None and args.verbose:
+        print(
+            f"image cache: {image_cache.hits} hits, {image_cache.misses} misses,"
+            f" {image_cache.size() / 10**9:.1f} GB used"
+        )
+    if result_cache is not None and args.verbose:
+        print(result_cache.format_stats())
+    if checkpoint_cache is not None and args.verbose:
+        print(checkpoint_cache.format_stats())
+
 
 if __name__ == "__main__":
     main()
@@ -22,7 +22,10 @@
 
 from __future__ import annotations
 
+import enum
+import os
 import pathlib
+import time
 import typing
 import uuid
 
@@ -38,7 +41,9 @@ from simbricks.orchestration.system import eth as sys_eth
 from simbricks.orchestration.system import mem as sys_mem
 from simbricks.orchestration.system import pcie as sys_pcie
 from simbricks.utils import base as utils_base
+from simbricks.utils import content_cache as utils_content_cache
 from simbricks.utils import file as utils_file
+from simbricks.utils import timeline as utils_timeline
 
 if typing.TYPE_CHECKING:
     from os import PathLike
@@ -48,12 +53,43 @@ if typing.TYPE_CHECKING:
     from simbricks.runtime import command_executor as cmd_exec
 
 
+class ShmBacking(enum.Enum):
+    """Where the shared memory pools holding the queues between simulators are placed."""
+
+    WORKDIR = "workdir"
+    """In the working directory, next to the Unix sockets."""
+    TMPFS = "tmpfs"
+    """On a tmpfs mount, `/dev/shm` by default, so the pools never touch a disk."""
+    HUGETLBFS = "hugetlbfs"
+    """On a hugetlbfs mount, backing the pools with huge pages to reduce TLB pressure."""
+
+
+def _find_mount(fs_type: str) -> str | None:
+    try:
+        with open("/proc/mounts", encoding="utf-8") as file:
+            for line in file:
+                cols = line.split()
+                if len(cols) > 2 and cols[2] == fs_type:
+                    return cols[1]
+    except OSError:
+        pass
+    return None
+
+
 class InstantiationEnvironment(utils_base.IdObj):
     def __init__(
         self,
         workdir: pathlib.Path,
         global_input_dir: pathlib.Path | None,
+        shm_backing: ShmBacking = ShmBacking.WORKDIR,
+        shm_mount: str | None = None,
+        image_cache: utils_content_cache.ContentCache | None = None,
     ):
+        """
+        `shm_backing` selects where shared memory pools are placed. For tmpfs and hugetlbfs,
+        `shm_mount` is the mount point to use, by default `/dev/shm` or the first hugetlbfs
+        mount respectively. `image_cache` stores built and converted disk images across runs.
+        """
         super().__init__()
         self._work_dir: pathlib.Path = workdir.resolve()
 
@@ -64,9 +100,25 @@ class InstantiationEnvironment(utils_base.IdObj):
         self._tmp_dir: pathlib.Path = self._work_dir / "tmp"
         self._img_dir: pathlib.Path = self._tmp_dir / "imgs"
         self._cp_dir: pathlib.Path = self._tmp_dir / "checkpoints"
+        self._checkpoint_dirs: dict[int, str] = {}
         self._shm_base: pathlib.Path = self._tmp_dir / "shm"
+        self.shm_backing: ShmBacking = shm_backing
+        self._shm_mount: pathlib.Path | None = None
+        self._shm_pool_base: pathlib.Path = self._shm_base
+        if shm_backing != ShmBacking.WORKDIR:
+            if shm_mount is None:
+                if shm_backing == ShmBacking.TMPFS:
+                    shm_mount = "/dev/shm"
+                else:
+                    shm_mount = _find_mount("hugetlbfs")
+                    if shm_mount is None:
+                        raise RuntimeError("no hugetlbfs mount found for the shared memory pools")
+            self._shm_mount = pathlib.Path(shm_mount)
+            # the mount is shared with other runs, so use a directory unique to this one
+            self._shm_pool_base = self._shm_mount / f"simbricks-{uuid.uuid4().hex[:12]}"
         self._proxy_dir: pathlib.Path = self._tmp_dir / "proxies"
         self._input_artifacts_dir: pathlib.Path = self._work_dir / "input_artifacts"
+        self.image_cache: utils_content_cache.ContentCache | None = image_cache
 
     # --------------------------------------------------
     # Read-only accessor functions for path properties -
@@ -88,11 +140,16 @@ class InstantiationEnvironment(utils_base.IdObj):
         return p.as_posix()
 
     def global_input_dir(self, relative_path: str | None = None, must_exist: bool = True) -> str:
-        if self._global_input_dir is None:
-            raise RuntimeError("Global input directory is not set")
+        """The global input directory, linked into the workdir by `prepare_env()`. Before that,
+        paths in the configured directory are returned, e.g. for computing cache keys."""
+        global_input_dir = self._global_input_dir
+        if global_input_dir is None:
+            if self._global_input_dir_src is None:
+                raise RuntimeError("Global input directory is not set")
+            global_input_dir = self._global_input_dir_src.resolve()
         if relative_path is None:
-            return self._global_input_dir.as_posix()
-        return utils_file.join_paths(self._global_input_dir, relative_path, must_exist)
+            return global_input_dir.as_posix()
+        return utils_file.join_paths(global_input_dir, relative_path, must_exist)
 
     def output_base(self, relative_path: str | None = None, must_exist: bool = False) -> str:
         if relative_path is None:
@@ -121,6 +178,12 @@ class InstantiationEnvironment(utils_base.IdObj):
             return self._shm_base.as_posix()
         return utils_file.join_paths(self._shm_base, relative_path, must_exist)
 
+    def shm_pool_base(self, relative_path: str | None = None, must_exist: bool = False) -> str:
+        """Directory of the shared memory pools, which depends on `shm_backing`."""
+        if relative_path is None:
+            return self._shm_pool_base.as_posix()
+        return utils_file.join_paths(self._shm_pool_base, relative_path, must_exist)
+
     def proxy_dir(self, relative_path: str | None = None, must_exist: bool = False) -> str:
         if relative_path is None:
             return self._proxy_dir.as_posix()
@@ -143,21 +206,70 @@ class InstantiationEnvironment(utils_base.IdObj):
     def dynamic_img_path(self, img: disk_images.DiskImage, format: str) -> str:
         return self.img_dir(f"{img._id}.{format}")
 
-    def hdcopy_path(self, img: disk_images.DiskImage, format: str) -> str:
-        return self.img_dir(f"{img._id}_hdcopy.{format}")
+    def hdcopy_path(self, img: disk_images.DiskImage, format: str, ident: str | None = None) -> str:
+        """Path of a per-host copy of `img`, `ident` distinguishes copies of the same image."""
+        if ident is None:
+            return self.img_dir(f"{img._id}_hdcopy.{format}")
+        return self.img_dir(f"{img._id}_hdcopy.{ident}.{format}")
+
+    def set_checkpoint_dirs(self, checkpoint_dirs: dict[int, str]) -> None:
+        """Use the given checkpoint directories, by simulator ID, instead of ones in `cp_dir()`,
+        e.g. to share checkpoints between instantiations."""
+        self._checkpoint_dirs = checkpoint_dirs
 
     def cpdir_sim(self, sim: sim_base.Simulator) -> str:
+        if sim.id() in self._checkpoint_dirs:
+            return self._checkpoint_dirs[sim.id()]
         return self.cp_dir(f"checkpoint.{sim.full_name()}-{sim._id}")
 
     def get_simulator_output_dir(self, sim: sim_base.Simulator) -> str:
         return self.output_base(f"output.{sim.full_name()}-{sim._id}")
 
+    def get_simulator_log_paths(self, sim: sim_base.Simulator) -> tuple[str, str]:
+        """Paths of the stdout and stderr log files of a simulator whose output is written
+        directly to files."""
+        out_dir = self.get_simulator_output_dir(sim)
+        return f"{out_dir}/stdout.log", f"{out_dir}/stderr.log"
+
+    def get_proxy_output_dir(self, proxy: inst_proxy.Proxy) -> str:
+        return self.output_base(f"output.{proxy.name}")
+
+    def get_proxy_log_paths(self, proxy: inst_proxy.Proxy) -> tuple[str, str]:
+        out_dir = self.get_proxy_output_dir(proxy)
+        return f"{out_dir}/stdout.log", f"{out_dir}/stderr.log"
+
     def get_simulator_shm_pool_path(self, sim: sim_base.Simulator) -> str:
-        return self.shm_base(f"{sim.full_name()}-shm-pool-{sim._id}")
+        return self.shm_pool_base(f"{sim.full_name()}-shm-pool-{sim._id}")
+
+    def get_proxy_shm_pool_path(self, proxy: inst_proxy.Proxy) -> str:
+        return self.shm_pool_base(f"proxy-shm-pool-{proxy.id()}")
+
+    def check_shm_capacity(self, required: int) -> None:
+        """Raises if the file system holding the shared memory pools does not have `required`
+        bytes available. On hugetlbfs, each pool is rounded up to whole huge pages by the
+        simulators, which `required` must already account for."""
+        path = self._shm_mount if self._shm_mount is not None else self._shm_pool_base
+        while not path.exists():
+            path = path.parent
+        stat = os.statvfs(path)
+        available = stat.f_bavail * stat.f_frsize
+        if required > available:
+            raise RuntimeError(
+                f"shared memory pools require {required / 2**20:.1f} MiB, but only"
+                f" {available / 2**20:.1f} MiB are available in {path}"
+            )
 
     def get_simulation_output_path(self) -> str:
         return self.output_base("out.json")
 
+    def get_simulation_trace_path(self) -> str:
+        """Path of the timeline of the run in the Chrome trace event format."""
+        return self.output_base("trace.json")
+
+    def get_simulation_output_stream_path(self, suffix: str) -> str:
+        """Path of the streaming output file, `suffix` depends on the compression."""
+        return self.output_base(f"out{suffix}")
+
 
 class Instantiation(utils_base.IdObj):
     def __init__(
@@ -185,6 +297,11 @@ class Instantiation(utils_base.IdObj):
         self._proxy_pairs: list[inst_proxy.ProxyPair] = []
         self._inf_socktype_assignment: dict[sys_base.Interface, inst_socket.SockType] = {}
         self._parameters: dict[typing.Any, typing.Any] = {}
+        self.timeline: utils_timeline.Timeline = utils_timeline.Timeline(sim.name)
+        """Phases of preparing and running this instantiation."""
+        self._retained_images: list[tuple[str, str]] = []
+        """Key and suffix of the image cache entries used by this instantiation, which are
+        retained until its cleanup."""
 
     @property
     def command_executor(self) -> cmd_exec.CommandExecutorFactory:
@@ -331,6 +448,8 @@ class Instantiation(utils_base.IdObj):
         instance._sim_dependency = None
         instance._socket_per_interface = {}
         instance._cmd_executor = None
+        instance.timeline = utils_timeline.Timeline(sim.name)
+        instance._retained_images = []
 
         instance._parameters = utils_base.json_to_dict(
             utils_base.get_json_attr_top(json_obj, "parameters")
@@ -450,12 +569,36 @@ class Instantiation(utils_base.IdObj):
     #     cop._inf_socktype_assignment = self._inf_socktype_assignment
     #     return cop
 
+    def shm_pool_requirement(self) -> int:
+        """Total size in bytes of the shared memory pools of the simulators and proxies in the
+        assigned fragment."""
+        page_size = 4096
+        if self.env.shm_backing == ShmBacking.HUGETLBFS:
+            page_size = os.statvfs(self.env._shm_mount).f_bsize
+        sizes = [sim.shm_pool_size(self) for sim in self.assigned_fragment.all_simulators()]
+        sizes.extend(proxy.shm_pool_size(self) for proxy in self.assigned_fragment.all_proxies())
+        return sum(-(-size // page_size) * page_size for size in sizes if size > 0)
+
+    def disk_space_estimate(self) -> int:
+        """Upper bound for the disk space in bytes preparing the assigned fragment needs."""
+        return sum(sim.disk_space_estimate(self) for sim in self.assigned_fragment.all_simulators())
+
     async def prepare(self) -> None:
+        await self.prepare_env()
+        await self.simulation.prepare(inst=self)
+
+    async def prepare_env(self) -> None:
+        """Prepare the working directories shared by all simulators. Afterwards, simulators can
+        be prepared individually with `Simulator.prepare()`."""
+        start = time.time()
         to_prepare = [self.env.shm_base(), self.env.img_dir()]
+        if self.env.shm_pool_base() != self.env.shm_base():
+            to_prepare.append(self.env.shm_pool_base())
         if not self.create_checkpoint and not self.restore_checkpoint:
             to_prepare.append(self.env.cp_dir())
         for tp in to_prepare:
-            utils_file.rmtree(tp)
+            # leftovers of earlier runs are deleted in the background
+            utils_file.rmtree_deferred(tp)
             utils_file.mkdir(tp)
 
         if self.env._global_input_dir_src is not None:
@@ -463,18 +606,33 @@ class Instantiation(utils_base.IdObj):
             if not (gi_src.exists() and gi_src.is_dir()):
                 raise RuntimeError("Global input directory does not exist or is not a directory")
             self.env._global_input_dir = self.env._work_dir / "global_input"
+            # left behind if an earlier attempt to prepare this run failed
+            self.env._global_input_dir.unlink(missing_ok=True)
             self.env._global_input_dir.symlink_to(gi_src)
 
-        await self.simulation.prepare(inst=self)
+        self.env.check_shm_capacity(self.shm_pool_requirement())
+        self.timeline.add("instantiation", "prepare env", start)
+
+    def retain_cached_image(self, key: str, suffix: str) -> None:
+        """Record that the image cache entry is used by this instantiation, after retaining it
+        in the image cache. It is released in `cleanup()`."""
+        self._retained_images.append((key, suffix))
 
     async def cleanup(self) -> None:
+        if self._retained_images:
+            assert self.env.image_cache is not None
+            for key, suffix in self._retained_images:
+                self.env.image_cache.release(key, suffix)
+            self._retained_images = []
         if self.preserve_tmp_folder:
             return
         to_delete = [self.env.shm_base(), self.env.img_dir()]
+        if self.env.shm_pool_base() != self.env.shm_base():
+            to_delete.append(self.env.shm_pool_base())
         if not self._preserve_checkpoints:
             to_delete.append(self.env.cp_dir())
         for td in to_delete:
-            utils_file.rmtree(td)
+            utils_file.rmtree_deferred(td)
 
     def find_sim_by_interface(self, interface: sys_base.Interface) -> sim_base.Simulator:
         return self.find_sim_by_spec(spec=interface.component)
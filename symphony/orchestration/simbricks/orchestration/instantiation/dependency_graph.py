@@ -68,6 +68,12 @@ class SimulationDependencyNode:
             return typing.cast(inst_proxy.Proxy, self.value)
         raise RuntimeError("Value stored is not a proxy")
 
+    def name(self) -> str:
+        """Name of the simulator or proxy, e.g. to identify it in the timeline of a run."""
+        if self.type == SimulationDependencyNodeType.SIMULATOR:
+            return self.get_simulator().full_name()
+        return self.get_proxy().name
+
     def __repr__(self) -> str:
         match self.type:
             case SimulationDependencyNodeType.SIMULATOR:
@@ -39,6 +39,9 @@ if typing.TYPE_CHECKING:
     from simbricks.orchestration.instantiation import fragment as inst_fragment
     from simbricks.orchestration.simulation import base as sim_base
 
+MIN_SHM_POOL_SIZE: int = 256 * 2**20
+"""Minimum size in bytes of the shared memory pool of proxies, their built-in default."""
+
 
 class Proxy(utils_base.IdObj, abc.ABC):
     def __init__(self):
@@ -120,6 +123,21 @@ class Proxy(utils_base.IdObj, abc.ABC):
                 wait_sockets.add(socket)
         return wait_sockets
 
+    def shm_pool_size(self, inst: inst_base.Instantiation) -> int:
+        """Size in bytes of the shared memory pool this proxy needs for the queues of the
+        interfaces where the simulator connects to the proxy, at least `MIN_SHM_POOL_SIZE`.
+        The proxy mirrors the queues of the simulator listening on the remote side, which
+        may not support configured queue sizes, so the larger of the configured and the
+        default size is reserved for each channel."""
+        size = 0
+        for iface in self._interfaces:
+            if inst.get_interface_socktype(iface) != inst_socket.SockType.CONNECT:
+                continue
+            assert iface.channel is not None
+            chan = inst.simulation.retrieve_or_create_channel(iface.channel)
+            size += max(chan.shm_size(), chan.shm_size(configured=False))
+        return max(size, MIN_SHM_POOL_SIZE)
+
     async def wait_ready(self) -> None:
         if self._ready_file is None:
             raise RuntimeError("Proxy does not specify a ready_file")
@@ -144,6 +162,9 @@ class DummyProxy(Proxy):
     def run_cmd(self, inst: inst_base.Instantiation, proxy_host_ip: str) -> str:
         raise NotImplementedError("function run_cmd() should not be called for DummyProxy")
 
+    def shm_pool_size(self, inst: inst_base.Instantiation) -> int:
+        return 0
+
 
 class TCPProxy(Proxy):
     def run_cmd(self, inst: inst_base.Instantiation, proxy_host_ip: str) -> str:
@@ -161,10 +182,10 @@ class TCPProxy(Proxy):
             self._ip = opposing_proxy._ip
             self._port = opposing_proxy._port
 
-        shm_path = inst.env.shm_base(f"proxy-shm-pool-{self.id()}")
         cmd_args.append("-s")
-        cmd_args.append(shm_path)
-        # TODO: allow to set shm size
+        cmd_args.append(inst.env.get_proxy_shm_pool_path(self))
+        cmd_args.append("-S")
+        cmd_args.append(str(max(1, -(-self.shm_pool_size(inst) // 2**20))))
 
         for interface in self._interfaces:
             if inst.get_interface_socktype(interface) == inst_socket.SockType.CONNECT:
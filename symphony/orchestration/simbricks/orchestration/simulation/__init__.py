@@ -53,3 +53,23 @@ __all__ += [
 from simbricks.orchestration.simulation.net import NetSim
 
 __all__ += ["NetSim"]
+
+from simbricks.orchestration.simulation.readiness import (
+    CallbackProbe,
+    DelayProbe,
+    ListeningProbe,
+    OutputProbe,
+    ProbeTarget,
+    ReadinessProbe,
+    SocketsProbe,
+)
+
+__all__ += [
+    "ReadinessProbe",
+    "ProbeTarget",
+    "SocketsProbe",
+    "OutputProbe",
+    "ListeningProbe",
+    "CallbackProbe",
+    "DelayProbe",
+]
@@ -31,6 +31,7 @@ import typing_extensions as tpe
 import simbricks.orchestration.instantiation.base as inst_base
 import simbricks.orchestration.instantiation.socket as inst_socket
 import simbricks.orchestration.simulation.channel as sim_chan
+import simbricks.orchestration.simulation.readiness as sim_ready
 import simbricks.orchestration.system as sys_conf
 import simbricks.utils.base as utils_base
 
@@ -67,6 +68,7 @@ class Simulator(utils_base.IdObj):
         when taking checkpoints to only attach certain simulators after the
         checkpoint has been taken."""
         self._extra_args: str | None = None
+        self._output_to_file: bool | None = None
         simulation.add_sim(self)
 
     def filter_components_by_pred(
@@ -102,6 +104,19 @@ class Simulator(utils_base.IdObj):
     def wait_terminate(self, wait: bool):
         self._wait = wait
 
+    @property
+    def output_to_file(self) -> bool:
+        """Whether stdout and stderr of this simulator are written directly to log files in its
+        output directory instead of being collected by the orchestrator. Defaults to the
+        simulation's `output_to_file`."""
+        if self._output_to_file is None:
+            return self._simulation.output_to_file
+        return self._output_to_file
+
+    @output_to_file.setter
+    def output_to_file(self, output_to_file: bool | None):
+        self._output_to_file = output_to_file
+
     def toJSON(self) -> dict:
         json_obj = super().toJSON()
         json_obj["name"] = self.name
@@ -116,6 +131,7 @@ class Simulator(utils_base.IdObj):
         json_obj["wait"] = self._wait
         json_obj["start_tick"] = self._start_tick
         json_obj["extra_args"] = self._extra_args
+        json_obj["output_to_file"] = self._output_to_file
         return json_obj
 
     @classmethod
@@ -138,6 +154,7 @@ class Simulator(utils_base.IdObj):
         instance._wait = bool(utils_base.get_json_attr_top(json_obj, "wait"))
         instance._start_tick = int(utils_base.get_json_attr_top(json_obj, "start_tick"))
         instance._extra_args = utils_base.get_json_attr_top_or_none(json_obj, "extra_args")
+        instance._output_to_file = utils_base.get_json_attr_top_or_none(json_obj, "output_to_file")
 
         return instance
 
@@ -191,6 +208,8 @@ class Simulator(utils_base.IdObj):
         sync: bool | None = None,
         latency: int | None = None,
         sync_period: int | None = None,
+        queue_len: int | None = None,
+        entry_size: int | None = None,
     ) -> str:
         if not channel and (sync is None or latency is None or sync_period is None):
             raise ValueError(
@@ -204,6 +223,10 @@ class Simulator(utils_base.IdObj):
                 latency = channel.sys_channel.latency
             if not sync_period:
                 sync_period = channel.sync_period
+            if not queue_len:
+                queue_len = channel.queue_len
+            if not entry_size:
+                entry_size = channel.entry_size
 
         sync_str = "true" if sync else "false"
 
@@ -213,10 +236,16 @@ class Simulator(utils_base.IdObj):
                 f":sync_interval={sync_period}"
             )
         else:
-            return (
+            # the listener allocates the queues, so only it needs their size
+            url = (
                 f"listen:{socket._path}:{inst.env.get_simulator_shm_pool_path(self)}:sync={sync_str}"
                 f":latency={latency}:sync_interval={sync_period}"
             )
+            if queue_len:
+                url += f":queue_len={queue_len}"
+            if entry_size:
+                url += f":entry_size={entry_size}"
+            return url
 
     def get_interface_url(
         self,
@@ -234,8 +263,30 @@ class Simulator(utils_base.IdObj):
             sync=chan._synchronized,
             latency=intf.channel.latency,
             sync_period=chan.sync_period,
+            queue_len=chan.queue_len,
+            entry_size=chan.entry_size,
         )
 
+    def supports_queue_size(self) -> bool:
+        """Whether the simulator sizes the queues of the channels it listens on as set through
+        `Channel.set_queue_size()`. Other simulators use their default queues."""
+        return False
+
+    def shm_pool_size(self, inst: inst_base.Instantiation) -> int:
+        """Size in bytes of the shared memory pool this simulator creates for the queues of the
+        channels it listens on."""
+        size = 0
+        for comp in self._components:
+            for interface in comp.interfaces():
+                socket = inst.get_socket(interface=interface)
+                if socket is None or socket._type != inst_socket.SockType.LISTEN:
+                    continue
+                assert interface.channel is not None
+                chan = self._get_channel(interface.channel)
+                if chan is not None:
+                    size += chan.shm_size(self.supports_queue_size())
+        return size
+
     def components(self) -> set[sys_conf.Component]:
         return self._components
 
@@ -343,7 +394,39 @@ class Simulator(utils_base.IdObj):
     def sockets_wait(self, inst: inst_base.Instantiation) -> list[inst_socket.Socket]:
         return self._get_all_sockets_by_type(inst=inst, sock_type=inst_socket.SockType.LISTEN)
 
+    def readiness_probes(self, inst: inst_base.Instantiation) -> list[sim_ready.ReadinessProbe]:
+        """
+        Probes that must all complete before this simulator is considered ready.
+
+        By default, a simulator is ready as soon as all sockets it listens on exist. If this
+        returns an empty list, the runtime instead waits for the fixed `start_delay()`.
+        """
+        wait_socks = self.sockets_wait(inst=inst)
+        if wait_socks:
+            return [sim_ready.SocketsProbe(wait_socks)]
+        return []
+
+    def checkpoint_config(self, inst: inst_base.Instantiation) -> list[str]:
+        """Everything that determines the state of the simulator when a checkpoint is taken.
+        Checkpoints can be shared between simulators with the same configuration."""
+        return [type(self).__qualname__, self._executable, self.extra_args]
+
+    def input_files(self, inst: inst_base.Instantiation) -> list[str]:
+        """Files besides the executable that the results of the simulator depend on, e.g. disk
+        images. Used to tell whether earlier results can be reused."""
+        return []
+
+    def disk_space_estimate(self, inst: inst_base.Instantiation) -> int:
+        """Upper bound for the disk space in bytes `prepare()` needs in the working directory."""
+        return 0
+
+    def shutdown_grace_period(self) -> float:
+        """Seconds to wait for the simulator and the processes it spawned to exit after being
+        interrupted, and again after being terminated, before escalating to the next signal."""
+        return 5
+
     def start_delay(self) -> int:
+        """Fixed delay to wait after starting the simulator if it has no readiness probes."""
         return 5
 
     def supports_checkpointing(self) -> bool:
@@ -397,7 +480,15 @@ class Simulation(utils_base.IdObj):
         """
         self.system: sys_conf.System = system
         self.timeout: int | None = None
-        """Timeout for experiment in seconds."""
+        """Timeout for experiment in seconds, starting once all simulators are prepared."""
+        self.stall_timeout: int | None = None
+        """Terminate the experiment if none of its simulators and proxies produced new output,
+        also to log files, for this many seconds after all simulators are prepared. Combine with
+        the profiler (periodic SIGUSR1) for simulators that are otherwise quiet while running."""
+        self.output_to_file: bool = False
+        """Write the output of all simulators and proxies directly to log files instead of
+        collecting it in the simulation output. Can be overridden per simulator. Useful for
+        simulators producing large amounts of output."""
         self.metadata: dict[str, tp.Any] = {}
 
         self._sys_sim_map: dict[sys_conf.Component, Simulator] = {}
@@ -423,6 +514,8 @@ class Simulation(utils_base.IdObj):
         json_obj["metadata"] = self.metadata
         json_obj["system"] = self.system.id()
         json_obj["timeout"] = self.timeout
+        json_obj["stall_timeout"] = self.stall_timeout
+        json_obj["output_to_file"] = self.output_to_file
 
         simulators_json = []
         for sim in self._sim_list:
@@ -467,6 +560,10 @@ class Simulation(utils_base.IdObj):
         assert system_id == system.id()
         instance.system = system
         instance.timeout = utils_base.get_json_attr_top_or_none(json_obj, "timeout")
+        instance.stall_timeout = utils_base.get_json_attr_top_or_none(json_obj, "stall_timeout")
+        instance.output_to_file = bool(
+            utils_base.get_json_attr_top_or_none(json_obj, "output_to_file")
+        )
 
         instance._sim_list = []
         instance._sys_sim_map = {}
@@ -572,6 +669,18 @@ class Simulation(utils_base.IdObj):
             if amount and ratio:
                 chan.set_sync_period(amount=amount, ratio=ratio)
 
+    def set_queue_size(
+        self,
+        channel_type: type[sys_conf.Channel],
+        queue_len: int | None = None,
+        entry_size: int | None = None,
+    ) -> None:
+        """Set the shared memory queue size of all channels of the given type, e.g.
+        `sys_eth.EthChannel`. Call this after all simulators were added."""
+        for chan in self.get_all_channels():
+            if isinstance(chan.sys_channel, channel_type):
+                chan.set_queue_size(queue_len=queue_len, entry_size=entry_size)
+
     def resreq_mem(self) -> int:
         """Memory required to run all simulators in this experiment."""
         mem = 0
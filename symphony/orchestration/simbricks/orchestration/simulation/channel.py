@@ -26,8 +26,20 @@ import typing_extensions as tpe
 
 from simbricks.orchestration.simulation import base as sim_base
 from simbricks.orchestration.system import base as system_base
+from simbricks.orchestration.system import eth as system_eth
+from simbricks.orchestration.system import mem as system_mem
+from simbricks.orchestration.system import pcie as system_pcie
 from simbricks.utils import base as utils_base
 
+DEFAULT_QUEUE_LEN: int = 8192
+"""Number of entries per queue direction that simulators use by default."""
+DEFAULT_ENTRY_SIZES: dict[type[system_base.Channel], int] = {
+    system_eth.EthChannel: 1536 + 64,
+    system_pcie.PCIeChannel: 9024 + 64,
+    system_mem.MemChannel: 8192 + 64,
+}
+"""Queue entry sizes in bytes that simulators use by default, per channel type."""
+
 
 class Channel(utils_base.IdObj):
     def __init__(self, chan: system_base.Channel):
@@ -41,12 +53,20 @@ class Channel(utils_base.IdObj):
         """
         assert self.sync_period <= chan.latency
         self.sys_channel: system_base.Channel = chan
+        self.queue_len: int | None = None
+        """Number of entries in each direction's shared memory queue. `None` uses the
+        simulators' default."""
+        self.entry_size: int | None = None
+        """Size of the queue entries in bytes, bounding the largest message. `None` uses the
+        simulators' default."""
 
     def toJSON(self):
         json_obj = super().toJSON()
         json_obj["synchronized"] = self._synchronized
         json_obj["sync_period"] = self.sync_period
         json_obj["sys_channel"] = self.sys_channel.id()
+        json_obj["queue_len"] = self.queue_len
+        json_obj["entry_size"] = self.entry_size
         return json_obj
 
     @classmethod
@@ -54,6 +74,8 @@ class Channel(utils_base.IdObj):
         instance = super().fromJSON(json_obj)
         instance._synchronized = bool(utils_base.get_json_attr_top(json_obj, "synchronized"))
         instance.sync_period = int(utils_base.get_json_attr_top(json_obj, "sync_period"))
+        instance.queue_len = utils_base.get_json_attr_top_or_none(json_obj, "queue_len")
+        instance.entry_size = utils_base.get_json_attr_top_or_none(json_obj, "entry_size")
         chan_id = int(utils_base.get_json_attr_top(json_obj, "sys_channel"))
         instance.sys_channel = simulation.system.get_chan(chan_id)
         return instance
@@ -64,3 +86,31 @@ class Channel(utils_base.IdObj):
         utils_base.has_expected_type(obj=ratio, expected_type=utils_base.Time)
         self.sync_period = amount * ratio
         assert self.sync_period <= self.sys_channel.latency
+
+    def set_queue_size(self, queue_len: int | None = None, entry_size: int | None = None) -> None:
+        """Set the size of the shared memory queues of this channel. Channels carrying a lot of
+        traffic benefit from longer queues, as the sender has to wait less for the receiver to
+        free entries. Only takes effect if the listening simulator supports it, see
+        `Simulator.supports_queue_size()`."""
+        if queue_len is not None and queue_len <= 0:
+            raise ValueError("queue_len must be positive")
+        if entry_size is not None and entry_size <= 0:
+            raise ValueError("entry_size must be positive")
+        self.queue_len = queue_len
+        self.entry_size = entry_size
+
+    def shm_size(self, configured: bool = True) -> int:
+        """Size in bytes of the shared memory the queues of this channel occupy in the pool of
+        the listening simulator. Without `configured`, the size with the simulators' default
+        queues, used by simulators not supporting `set_queue_size()`."""
+        queue_len = self.queue_len if configured else None
+        if queue_len is None:
+            queue_len = DEFAULT_QUEUE_LEN
+        entry_size = self.entry_size if configured else None
+        if entry_size is None:
+            entry_size = 2048
+            for chan_type, size in DEFAULT_ENTRY_SIZES.items():
+                if isinstance(self.sys_channel, chan_type):
+                    entry_size = size
+                    break
+        return 2 * queue_len * entry_size
@@ -23,6 +23,8 @@
 from __future__ import annotations
 
 import abc
+import json
+import os
 
 import typing_extensions as tpe
 
@@ -40,6 +42,8 @@ class HostSim(sim_base.Simulator):
         self._disk_images: dict[
             sys_host.FullSystemHost, list[tuple[disk_images.DiskImage, str]]
         ] = {}
+        self.disk_copy_strategies: dict[str, disk_images.DiskCopyStrategy] = {}
+        """How the copy of each disk image was created, by path of the copy."""
 
     def toJSON(self) -> dict:
         return super().toJSON()
@@ -48,6 +52,7 @@ class HostSim(sim_base.Simulator):
     def fromJSON(cls, simulation: sim_base.Simulation, json_obj: dict) -> tpe.Self:
         instance = super().fromJSON(simulation, json_obj)
         instance._disk_images = {}
+        instance.disk_copy_strategies = {}
         return instance
 
     def full_name(self) -> str:
@@ -60,11 +65,63 @@ class HostSim(sim_base.Simulator):
     def supported_image_formats(self) -> list[str]:
         pass
 
-    @abc.abstractmethod
     async def copy_disk_image(
         self, inst: inst_base.Instantiation, disk_image: disk_images.DiskImage, ident: str
     ) -> str:
-        pass
+        """Create a private copy of `disk_image` for this simulator and return its path. Copies
+        are copy-on-write wherever possible, see `disk_images.copy_image_file()`. The strategy
+        used is recorded in `disk_copy_strategies` and the timeline."""
+        format = disk_image.find_format(self)
+        copy_path = inst.env.hdcopy_path(disk_image, format, ident)
+        with inst.timeline.span(self.full_name(), "copy disk image", path=copy_path) as args:
+            strategy = await disk_images.copy_image_file(
+                disk_image.path(inst, format), copy_path, format, disk_image.read_only
+            )
+            args["strategy"] = strategy.value
+        self.disk_copy_strategies[copy_path] = strategy
+        return copy_path
+
+    def checkpoint_config(self, inst: inst_base.Instantiation) -> list[str]:
+        config = super().checkpoint_config(inst)
+        for host in self.filter_components_by_type(ty=sys_host.FullSystemHost):
+            config.append(type(host).__qualname__)
+            config.extend([str(host.memory), str(host.cores), host.cpu_freq])
+            if isinstance(host, sys_host.BaseLinuxHost):
+                config.extend(host.pre_checkpoint_cmds(inst))
+                config.append(host.kcmd_append or "")
+                config.extend(str(module) for module in host.load_modules)
+            for disk in host.disks:
+                # ids differ between otherwise identical systems
+                disk_json = {
+                    key: val for key, val in disk.toJSON().items() if key not in ("id", "host")
+                }
+                config.append(json.dumps(disk_json, sort_keys=True))
+        for path in self.input_files(inst):
+            stat = os.stat(path)
+            config.append(f"{path} {stat.st_size} {stat.st_mtime_ns}")
+        return config
+
+    def input_files(self, inst: inst_base.Instantiation) -> list[str]:
+        files = []
+        for host in self.filter_components_by_type(ty=sys_host.FullSystemHost):
+            for disk in host.disks:
+                files.extend(disk.input_files(inst, disk.find_format(self)))
+        return files
+
+    def disk_space_estimate(self, inst: inst_base.Instantiation) -> int:
+        size = 0
+        for host in self.filter_components_by_type(ty=sys_host.FullSystemHost):
+            for disk in host.disks:
+                if not disk.needs_copy:
+                    continue
+                format = disk.find_format(self)
+                try:
+                    src = disk.path(inst, format)
+                except Exception:
+                    # built during prepare(), size is not known yet
+                    continue
+                size += disk_images.copy_space_estimate(src, format)
+        return size
 
     async def prepare(self, inst: inst_base.Instantiation):
         await super().prepare(inst)
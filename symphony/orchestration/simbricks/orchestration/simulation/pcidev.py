@@ -75,6 +75,9 @@ class NICSim(PCIDevSim):
         assert len(self._components) < 1
         super().add(nic)
 
+    def supports_queue_size(self) -> bool:
+        return True
+
     def run_cmd(self, inst: inst_base.Instantiation) -> str:
         channels = self.get_channels()
 
@@ -105,15 +108,29 @@ class NICSim(PCIDevSim):
 
         socket = inst.get_socket(interface=nic_device._pci_if)
         assert socket is not None and socket._type == inst_socket.SockType.LISTEN
+        pci_chan = pci_channels[0]
         params_url = self.get_parameters_url(
-            inst, socket, sync=run_sync, latency=pci_latency, sync_period=sync_period
+            inst,
+            socket,
+            sync=run_sync,
+            latency=pci_latency,
+            sync_period=sync_period,
+            queue_len=pci_chan.queue_len,
+            entry_size=pci_chan.entry_size,
         )
         cmd += f"{params_url} "
 
         socket = inst.get_socket(interface=nic_device._eth_if)
         assert socket is not None and socket._type == inst_socket.SockType.LISTEN
+        eth_chan = eth_channels[0]
         params_url = self.get_parameters_url(
-            inst, socket, sync=run_sync, latency=eth_latency, sync_period=sync_period
+            inst,
+            socket,
+            sync=run_sync,
+            latency=eth_latency,
+            sync_period=sync_period,
+            queue_len=eth_chan.queue_len,
+            entry_size=eth_chan.entry_size,
         )
         cmd += f"{params_url} "
 
@@ -0,0 +1,168 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Readiness probes determine when a started simulator is ready, i.e. when simulators depending
+on it can be started. A simulator returns its probes from `Simulator.readiness_probes()` and is
+marked ready once all of them completed."""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import os
+import re
+import typing
+
+if typing.TYPE_CHECKING:
+    from simbricks.orchestration.instantiation import socket as inst_socket
+
+
+class ProbeTarget(abc.ABC):
+    """The started process a probe is evaluated against. Implemented by the runtime."""
+
+    @property
+    @abc.abstractmethod
+    def pid(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def running(self) -> bool:
+        pass
+
+    @abc.abstractmethod
+    async def wait_for_output(self, pattern: re.Pattern[str]) -> re.Match[str]:
+        """Wait for a stdout or stderr line matching `pattern`, including lines that were
+        produced before this function was called."""
+        pass
+
+
+class ReadinessProbe(abc.ABC):
+    needs_output: bool = False
+    """Whether the probe inspects the simulator's output. If so, the output of simulators that
+    write it directly to files is read back at least until the simulator is ready."""
+
+    @abc.abstractmethod
+    async def wait(self, target: ProbeTarget) -> None:
+        """Returns once the probed condition holds."""
+        pass
+
+
+class SocketsProbe(ReadinessProbe):
+    """Ready once all given (listening) sockets were created."""
+
+    def __init__(self, sockets: typing.Iterable[inst_socket.Socket]) -> None:
+        self.sockets: list[inst_socket.Socket] = list(sockets)
+
+    async def wait(self, target: ProbeTarget) -> None:
+        await asyncio.gather(*[sock.wait() for sock in self.sockets])
+
+
+class OutputProbe(ReadinessProbe):
+    """Ready once the simulator printed a line matching the given regular expression."""
+
+    needs_output = True
+
+    def __init__(self, pattern: str | re.Pattern[str]) -> None:
+        self.pattern: re.Pattern[str] = re.compile(pattern)
+
+    async def wait(self, target: ProbeTarget) -> None:
+        await target.wait_for_output(self.pattern)
+
+
+def _proc_socket_inodes(pid: int) -> set[str]:
+    inodes = set()
+    fd_dir = f"/proc/{pid}/fd"
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:
+        return inodes
+    for fd in fds:
+        try:
+            link = os.readlink(f"{fd_dir}/{fd}")
+        except OSError:
+            continue
+        if link.startswith("socket:["):
+            inodes.add(link[8:-1])
+    return inodes
+
+
+def _listening_socket_inodes() -> set[str]:
+    inodes = set()
+    # TCP sockets in state 0A (LISTEN), inode is the 10th column
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table, encoding="utf-8") as file:
+                next(file, None)
+                for line in file:
+                    cols = line.split()
+                    if len(cols) > 9 and cols[3] == "0A":
+                        inodes.add(cols[9])
+        except OSError:
+            continue
+    # Unix sockets with __SO_ACCEPTCON set in the flags column, inode is the 7th column
+    try:
+        with open("/proc/net/unix", encoding="utf-8") as file:
+            next(file, None)
+            for line in file:
+                cols = line.split()
+                if len(cols) > 6 and int(cols[3], 16) & 0x10000:
+                    inodes.add(cols[6])
+    except OSError:
+        pass
+    return inodes
+
+
+class ListeningProbe(ReadinessProbe):
+    """Ready once the simulator process is alive and holds a listening TCP or Unix socket."""
+
+    def __init__(self, interval: float = 0.1) -> None:
+        self.interval: float = interval
+
+    async def wait(self, target: ProbeTarget) -> None:
+        while True:
+            if not target.running():
+                raise RuntimeError(f"process {target.pid} exited before it started listening")
+            own = _proc_socket_inodes(target.pid)
+            if own and not own.isdisjoint(_listening_socket_inodes()):
+                return
+            await asyncio.sleep(self.interval)
+
+
+class CallbackProbe(ReadinessProbe):
+    """Ready once the given coroutine function returns."""
+
+    needs_output = True
+
+    def __init__(self, callback: typing.Callable[[ProbeTarget], typing.Awaitable[None]]) -> None:
+        self.callback = callback
+
+    async def wait(self, target: ProbeTarget) -> None:
+        await self.callback(target)
+
+
+class DelayProbe(ReadinessProbe):
+    """Ready after a fixed delay. Only use this when nothing better is available."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay: float = delay
+
+    async def wait(self, target: ProbeTarget) -> None:
+        await asyncio.sleep(self.delay)
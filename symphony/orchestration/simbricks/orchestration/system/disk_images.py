@@ -24,14 +24,22 @@ from __future__ import annotations
 
 import abc
 import asyncio
+import enum
+import errno
+import fcntl
+import hashlib
 import io
+import os
 import pathlib
+import shutil
 import tarfile
 import typing as tp
 
 import typing_extensions as tpe
 
 from simbricks.utils import base as utils_base
+from simbricks.utils import content_cache as utils_content_cache
+from simbricks.utils import file as utils_file
 
 if tp.TYPE_CHECKING:
     from simbricks.orchestration.instantiation import base as inst_base
@@ -40,11 +48,138 @@ if tp.TYPE_CHECKING:
     from simbricks.orchestration.system.host import base as sys_host
 
 
+class DiskCopyStrategy(enum.Enum):
+    """How a per-host copy of a disk image was created."""
+
+    QCOW2_OVERLAY = "qcow2-overlay"
+    """A qcow2 image with the original image as backing file, only storing the changes."""
+    REFLINK = "reflink"
+    """A copy sharing all data blocks with the original until they are written, on file systems
+    supporting it (e.g. btrfs, XFS)."""
+    HARDLINK = "hardlink"
+    """A hard link to the original image, only used for read-only images."""
+    COPY = "copy"
+    """A full copy of the image."""
+
+
+_FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+
+
+def _reflink(src: str, dst: str) -> bool:
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+            return True
+        except OSError as err:
+            if err.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL):
+                return False
+            raise
+
+
+def _link(src: str, dst: str) -> bool:
+    try:
+        os.link(src, dst)
+        return True
+    except OSError as err:
+        if err.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            return False
+        raise
+
+
+async def copy_image_file(
+    src: str, dst: str, format: str, read_only: bool = False
+) -> DiskCopyStrategy:
+    """
+    Creates `dst` as a copy of the image `src` in the given format using the cheapest strategy
+    available: a qcow2 overlay for qcow2 images if `qemu-img` is installed, a hard link for
+    read-only images, a reflink if the file system supports it, and a full copy otherwise.
+    """
+    utils_file.rmtree(dst)
+    pathlib.Path(dst).parent.mkdir(parents=True, exist_ok=True)
+
+    qemu_img = shutil.which("qemu-img")
+    if format == "qcow2" and qemu_img is not None:
+        backing = pathlib.Path(src).resolve().as_posix()
+        process = await asyncio.create_subprocess_exec(
+            qemu_img,
+            "create",
+            "-q",
+            "-f",
+            "qcow2",
+            "-F",
+            "qcow2",
+            "-b",
+            backing,
+            dst,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        if process.returncode == 0:
+            return DiskCopyStrategy.QCOW2_OVERLAY
+        print(f"creating qcow2 overlay for {src} failed, falling back: {stderr.decode()}")
+
+    if read_only and await asyncio.to_thread(_link, src, dst):
+        return DiskCopyStrategy.HARDLINK
+    if await asyncio.to_thread(_reflink, src, dst):
+        return DiskCopyStrategy.REFLINK
+    await asyncio.to_thread(shutil.copyfile, src, dst)
+    return DiskCopyStrategy.COPY
+
+
+def copy_space_estimate(src: str, format: str) -> int:
+    """Upper bound for the disk space in bytes `copy_image_file()` needs for a copy of `src`.
+    Whether a reflink or hard link can be used is only known when copying, so only qcow2 overlays
+    are assumed to need no space."""
+    if format == "qcow2" and shutil.which("qemu-img") is not None:
+        return 0
+    try:
+        return os.path.getsize(src)
+    except OSError:
+        return 0
+
+
+async def convert_image_file(src: str, src_format: str, dst: str, format: str) -> None:
+    """Convert the image `src` to `format` at `dst` using `qemu-img`."""
+    qemu_img = shutil.which("qemu-img")
+    if qemu_img is None:
+        raise RuntimeError(f"converting {src} to {format} requires qemu-img")
+    process = await asyncio.create_subprocess_exec(
+        qemu_img,
+        "convert",
+        "-q",
+        "-f",
+        src_format,
+        "-O",
+        format,
+        src,
+        dst,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"converting {src} to {format} failed: {stderr.decode()}")
+
+
+_built_images: dict[str, str] = {}
+"""Images built in this process without an image cache, by cache key."""
+_build_locks: dict[str, asyncio.Lock] = {}
+"""Serialize building images with the same cache key without an image cache, e.g. for hosts
+sharing one image, which would otherwise build into the same path concurrently."""
+
+
 class DiskImage(utils_base.IdObj):
     def __init__(self, system: sys_base.System) -> None:
         super().__init__()
         system._add_disk_image(self)
         self.needs_copy = True
+        self.read_only: bool = False
+        """Whether the simulator never writes to the image. Copies of read-only images can be
+        hard links to the original."""
+        self._prepared_paths: dict[str, str] = {}
+        """Paths of formats that were built or converted during `prepare()`, e.g. in the image
+        cache."""
 
     @abc.abstractmethod
     def available_formats(self) -> list[str]:
@@ -54,6 +189,11 @@ class DiskImage(utils_base.IdObj):
     def path(self, inst: inst_base.Instantiation, format: str) -> str:
         raise Exception("must be overwritten")
 
+    def input_files(self, inst: inst_base.Instantiation, format: str) -> list[str]:
+        """Files the image in `format` is made from, also before it is prepared. Used to tell
+        whether earlier results can be reused."""
+        return []
+
     @staticmethod
     def assert_is_file(path: str) -> None:
         if not pathlib.Path(path).is_file():
@@ -62,6 +202,21 @@ class DiskImage(utils_base.IdObj):
     async def _prepare_format(self, inst: inst_base.Instantiation, format: str) -> None:
         pass
 
+    async def _cache_key(self, inst: inst_base.Instantiation, format: str) -> str | None:
+        """
+        Key identifying the content of this image in `format`, derived from everything the image
+        is built from. Images with a key are built through `_build_format()`, and stored in the
+        image cache if one is configured. `None` if the image needs no preparation in `format`
+        or cannot be cached.
+        """
+        return None
+
+    async def _build_format(self, inst: inst_base.Instantiation, format: str, dst: str) -> None:
+        """Build the image in `format` at `dst`. By default moves the result of
+        `_prepare_format()` there."""
+        await self._prepare_format(inst, format)
+        await asyncio.to_thread(shutil.move, inst.env.dynamic_img_path(self, format), dst)
+
     # Determining the format should actually happen in the simulator, since it is the choice of the
     # host simulator what disk image format it wants to use. The choice in the simulator is
     # constrained by the supported formats of the disk image. This also allows the simulator to
@@ -88,17 +243,69 @@ class DiskImage(utils_base.IdObj):
         sim = tp.cast("sim_host.HostSim", sim)
         format = self.find_format(sim)
 
-        await self._prepare_format(inst, format)
+        key = await self._cache_key(inst, format)
+        if key is None:
+            await self._prepare_format(inst, format)
+            return
+
+        cache = inst.env.image_cache
+        if cache is None:
+            path = inst.env.dynamic_img_path(self, format)
+            await self._build_or_reuse(inst, format, key, path)
+        else:
+            path = await self._get_cached(inst, cache, format, key)
+        self._prepared_paths[format] = path
+
+    async def _get_cached(
+        self,
+        inst: inst_base.Instantiation,
+        cache: utils_content_cache.ContentCache,
+        format: str,
+        key: str,
+    ) -> str:
+        # Simulators use the entry directly or as backing file of a qcow2 overlay, so it is
+        # retained until the cleanup of `inst` to protect it from eviction, also by other runs
+        # and processes. Retaining waits while the entry is locked for eviction, after which it
+        # may be gone and has to be built again.
+        suffix = f".{format}"
+        while True:
+            path = await cache.get(key, lambda dst: self._build_format(inst, format, dst), suffix)
+            await utils_file.run_blocking(cache.retain, key, suffix)
+            if os.path.exists(path):
+                inst.retain_cached_image(key, suffix)
+                return path
+            cache.release(key, suffix)
+
+    async def _build_or_reuse(
+        self, inst: inst_base.Instantiation, format: str, key: str, path: str
+    ) -> None:
+        # Without an image cache, identical images are still only built once per process, as
+        # long as the first one was not removed by the cleanup of its run yet.
+        async with _build_locks.setdefault(key, asyncio.Lock()):
+            built = _built_images.get(key)
+            if built is not None:
+                if built == path and os.path.exists(path):
+                    return
+                try:
+                    await asyncio.to_thread(shutil.copyfile, built, path)
+                    return
+                except FileNotFoundError:
+                    pass
+            await self._build_format(inst, format, path)
+            _built_images[key] = path
 
     def toJSON(self) -> dict:
         json_obj = super().toJSON()
         json_obj["needs_copy"] = self.needs_copy
+        json_obj["read_only"] = self.read_only
         return json_obj
 
     @classmethod
     def fromJSON(cls, system: sys_base.System, json_obj: dict) -> tpe.Self:
         instance = super().fromJSON(json_obj)
         instance.needs_copy = utils_base.get_json_attr_top(json_obj, "needs_copy")
+        instance.read_only = bool(utils_base.get_json_attr_top_or_none(json_obj, "read_only"))
+        instance._prepared_paths = {}
         return instance
 
     def add_host(self, host: sys_host.Host) -> None:
@@ -137,6 +344,9 @@ class ExternalDiskImage(DiskImage):
         DiskImage.assert_is_file(path)
         return path
 
+    def input_files(self, inst: inst_base.Instantiation, format: str) -> list[str]:
+        return [self.path(inst, format)]
+
     def toJSON(self) -> dict:
         json_obj = super().toJSON()
         json_obj["path"] = self._path
@@ -161,7 +371,7 @@ class DistroDiskImage(DiskImage):
     def available_formats(self) -> list[str]:
         return self.formats
 
-    def path(self, inst: inst_base.Instantiation, format: str) -> str:
+    def _source_path(self, inst: inst_base.Instantiation, format: str) -> str:
         path = inst.env.global_input_dir(f"images/{self.name}/{self.name}", True)
         if format == "raw":
             path += ".raw"
@@ -169,9 +379,44 @@ class DistroDiskImage(DiskImage):
             pass
         else:
             raise RuntimeError("Unsupported disk format")
+        return path
+
+    def path(self, inst: inst_base.Instantiation, format: str) -> str:
+        if format in self._prepared_paths:
+            return self._prepared_paths[format]
+        path = self._source_path(inst, format)
         DiskImage.assert_is_file(path)
         return path
 
+    def _conversion_source(self, inst: inst_base.Instantiation, format: str) -> tuple[str, str]:
+        for src_format in self.formats:
+            src = self._source_path(inst, src_format)
+            if src_format != format and pathlib.Path(src).is_file():
+                return src, src_format
+        raise RuntimeError(f"disk image {self.name} is not available in any format")
+
+    def input_files(self, inst: inst_base.Instantiation, format: str) -> list[str]:
+        path = self._source_path(inst, format)
+        if pathlib.Path(path).is_file():
+            return [path]
+        return [self._conversion_source(inst, format)[0]]
+
+    async def _cache_key(self, inst: inst_base.Instantiation, format: str) -> str | None:
+        # only images that are not shipped in the requested format need to be converted
+        if pathlib.Path(self._source_path(inst, format)).is_file():
+            return None
+        src, src_format = self._conversion_source(inst, format)
+        cache = inst.env.image_cache
+        if cache is None:
+            digest = src
+        else:
+            digest = await cache.file_digest(src)
+        return utils_content_cache.content_key("convert", digest, src_format, format)
+
+    async def _build_format(self, inst: inst_base.Instantiation, format: str, dst: str) -> None:
+        src, src_format = self._conversion_source(inst, format)
+        await convert_image_file(src, src_format, dst, format)
+
     def toJSON(self) -> dict:
         json_obj = super().toJSON()
         json_obj["name"] = self.name
@@ -189,6 +434,8 @@ class DistroDiskImage(DiskImage):
 # Abstract base class for dynamically generated images
 class DynamicDiskImage(DiskImage):
     def path(self, inst: inst_base.Instantiation, format: str) -> str:
+        if format in self._prepared_paths:
+            return self._prepared_paths[format]
         return inst.env.dynamic_img_path(self, format)
 
     @abc.abstractmethod
@@ -210,19 +457,50 @@ class LinuxConfigDiskImage(DynamicDiskImage):
     def available_formats(self) -> list[str]:
         return ["raw"]
 
-    async def _prepare_format(self, inst: inst_base.Instantiation, format: str) -> None:
-        path = self.path(inst, format)
+    @staticmethod
+    def _digest_files(files: list[tuple[str, tp.IO]]) -> str:
+        digest = hashlib.sha256()
+        for name, handle in files:
+            digest.update(name.encode("utf-8") + b"\0")
+            with handle:
+                while chunk := handle.read(1 << 20):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode("utf-8")
+                    digest.update(len(chunk).to_bytes(8, "little"))
+                    digest.update(chunk)
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def _write_tar(path: str, files: list[tuple[str, tp.IO]]) -> None:
         with tarfile.open(path, "w:") as tar:
-            for file in self.host.config_files(inst):
-                f_i = tarfile.TarInfo(f"guest/{file.file_name}")
+            for name, f in files:
+                f_i = tarfile.TarInfo(f"guest/{name}")
                 f_i.mode = 0o777
-                f = file.IOHandle(inst)
                 f.seek(0, io.SEEK_END)
                 f_i.size = f.tell()
                 f.seek(0, io.SEEK_SET)
                 tar.addfile(tarinfo=f_i, fileobj=f)
                 f.close()
 
+    def _open_config_files(self, inst: inst_base.Instantiation) -> list[tuple[str, tp.IO]]:
+        return [(file.file_name, file.IOHandle(inst)) for file in self.host.config_files(inst)]
+
+    async def _cache_key(self, inst: inst_base.Instantiation, format: str) -> str | None:
+        # Hosts running the same applications with the same configuration, e.g. in repeated
+        # runs, get identical images, so key on file names and contents. Reading the files
+        # happens in a worker thread to not block the event loop on large local files.
+        files = self._open_config_files(inst)
+        digest = await asyncio.to_thread(self._digest_files, files)
+        return utils_content_cache.content_key("linux-config", digest, format)
+
+    async def _build_format(self, inst: inst_base.Instantiation, format: str, dst: str) -> None:
+        files = self._open_config_files(inst)
+        await asyncio.to_thread(self._write_tar, dst, files)
+
+    async def _prepare_format(self, inst: inst_base.Instantiation, format: str) -> None:
+        await self._build_format(inst, format, inst.env.dynamic_img_path(self, format))
+
     def toJSON(self):
         json_obj = super().toJSON()
         json_obj["host"] = self.host.id()
@@ -250,11 +528,32 @@ class PackerDiskImage(DynamicDiskImage):
         super().__init__(system)
         self.config_path = packer_config_path
         self.vars: dict[str, str] = {}
+        self.inputs: list[str] | None = None
+        """Files and directories the build reads besides the configuration, e.g. provisioning
+        scripts, the HTTP directory and the base image. Their contents are part of the image's
+        cache key. The image is only cached if this is set, as the configuration alone does not
+        tell what it depends on; an empty list declares that it has no further inputs."""
         self._prepared: bool = False
 
     def available_formats(self) -> list[str]:
         return ["raw", "qcow2"]
 
+    async def _cache_key(self, inst: inst_base.Instantiation, format: str) -> str | None:
+        if self.inputs is None:
+            return None
+        with open(self.config_path, "rb") as file:
+            config = file.read()
+        variables = [f"{key}={val}" for key, val in sorted(self.vars.items())]
+        cache = inst.env.image_cache
+        inputs = []
+        for path in sorted(self.inputs):
+            digest = path if cache is None else await cache.path_digest(path)
+            inputs.append(f"{path}={digest}")
+        return utils_content_cache.content_key("packer", config, *variables, *inputs, format)
+
+    def input_files(self, inst: inst_base.Instantiation, format: str) -> list[str]:
+        return [self.config_path, *(self.inputs or [])]
+
     async def _prepare_format(self, inst: inst_base.Instantiation, format: str) -> None:
         if self._prepared:
             return
@@ -284,6 +583,7 @@ class PackerDiskImage(DynamicDiskImage):
         json_obj = super().toJSON()
         json_obj["config_path"] = self.config_path
         json_obj["vars"] = utils_base.dict_to_json(self.vars)
+        json_obj["inputs"] = self.inputs
         return json_obj
 
     @classmethod
@@ -293,6 +593,7 @@ class PackerDiskImage(DynamicDiskImage):
         instance.config_path = utils_base.get_json_attr_top(json_obj, "config_path")
         vars_json = utils_base.get_json_attr_top(json_obj, "vars")
         instance.vars = utils_base.json_to_dict(vars_json)
+        instance.inputs = utils_base.get_json_attr_top_or_none(json_obj, "inputs")
         return instance
 
 
@@ -186,6 +186,13 @@ class BaseLinuxHost(FullSystemHost):
         """Commands to run to prepare node after checkpoint restore."""
         return self._concat_app_cmds(inst, app.BaseLinuxApplication.prepare_post_cp.__name__)
 
+    def pre_checkpoint_cmds(self, inst: instantiation.Instantiation) -> list[str]:
+        """Commands `config_str()` runs before the checkpoint is taken. Hosts with the same
+        commands, disk images and simulator configuration reach identical checkpoints."""
+        return self.prepare_pre_cp(inst) + (
+            self.applications[0].prepare_pre_cp(inst) if self.applications else []
+        )
+
     def config_str(self, inst: instantiation.Instantiation) -> str:
         sim = inst.find_sim_by_spec(spec=self)
         if inst.create_checkpoint:
@@ -194,8 +201,7 @@ class BaseLinuxHost(FullSystemHost):
             cp_cmd = []
 
         es = (
-            self.prepare_pre_cp(inst)
-            + (self.applications[0].prepare_pre_cp(inst) if self.applications else [])
+            self.pre_checkpoint_cmds(inst)
             + cp_cmd
             + self.prepare_post_cp(inst)
             + (self.applications[0].prepare_post_cp(inst) if self.applications else [])
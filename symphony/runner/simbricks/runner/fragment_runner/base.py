@@ -8,6 +8,7 @@ import io
 import json
 import logging
 import pathlib
+import time
 import traceback
 import typing
 import uuid
@@ -41,6 +42,7 @@ from simbricks.orchestration.system import base as sys_base
 from simbricks.runner import utils as runner_utils
 from simbricks.runtime import simulation_executor as sim_exec
 from simbricks.utils import artifatcs as utils_art
+from simbricks.utils import file as utils_file
 
 if typing.TYPE_CHECKING:
     from simbricks.orchestration.instantiation import proxy as inst_proxy
@@ -58,6 +60,10 @@ class RunnerSimulationExecutorCallbacks(sim_exec.SimulationExecutorCallbacks):
         self._send_queue = send_queue
         self._run_id: str = run_id
 
+    def needs_output_lines(self) -> bool:
+        # output is forwarded to the backend as it is produced
+        return True
+
     # ---------------------------------------
     # Callbacks related to whole simulation -
     # ---------------------------------------
@@ -393,7 +399,9 @@ class FragmentRunner(abc.ABC):
     async def _prepare_run(self, start_event: StartRunReq) -> Run:
         LOGGER.debug(f"prepare run {start_event.run_id}")
 
+        start = time.time()
         inst = await self._assemble_inst(start_event)
+        inst.timeline.add("runner", "assemble instantiation", start)
         callbacks = RunnerSimulationExecutorCallbacks(
             inst, self._send_event_queue, start_event.run_id
         )
@@ -419,12 +427,16 @@ class FragmentRunner(abc.ABC):
             res = await sim_task
 
             output_path = run.inst.env.get_simulation_output_path()
-            res.dump(outpath=output_path)  # TODO: FIXME
+            await utils_file.run_blocking(res.dump, outpath=output_path)
+            await utils_file.run_blocking(
+                run.inst.timeline.dump_chrome_trace, run.inst.env.get_simulation_trace_path()
+            )
 
             # handle output artifacts properly
             if run.inst.assigned_fragment.output_artifact_paths:
                 with io.BytesIO() as output_artifact:
-                    utils_art.create_artifact(
+                    await utils_file.run_blocking(
+                        utils_art.create_artifact,
                         file=output_artifact,
                         paths_to_include=run.inst.assigned_fragment.output_artifact_paths,
                         base_path=pathlib.Path(run.inst.env.work_dir()),
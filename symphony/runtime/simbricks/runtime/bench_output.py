@@ -0,0 +1,102 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Benchmark for the simulator output path.
+
+Starts a number of processes that write line-oriented output as fast as they can, collects their
+output through `CommandExecutor` like the runtime does for simulators, and reports the achieved
+throughput per process::
+
+    python -m simbricks.runtime.bench_output --procs 4 --mb 256
+"""
+
+import argparse
+import asyncio
+import shlex
+import sys
+import time
+
+from simbricks.runtime import command_executor as cmd_exec
+
+_PRODUCER = (
+    "import sys\n"
+    "line = b'x' * {line_len} + b'\\n'\n"
+    "chunk = line * max(1, (1 << 20) // len(line))\n"
+    "for _ in range({chunks}):\n"
+    "    sys.stdout.buffer.write(chunk)\n"
+)
+
+
+async def _run_producer(
+    idx: int, mb: int, line_len: int, coalesce_window: float
+) -> tuple[int, int, int, float]:
+    lines_collected = 0
+
+    async def noop(*_) -> None:
+        pass
+
+    async def collect(lines: list[str]) -> None:
+        nonlocal lines_collected
+        lines_collected += len(lines)
+
+    script = _PRODUCER.format(line_len=line_len, chunks=mb)
+    cmd = shlex.join([sys.executable, "-c", script])
+    executor = cmd_exec.CommandExecutor(
+        cmd, f"producer{idx}", noop, noop, collect, collect, coalesce_window
+    )
+    start = time.perf_counter()
+    await executor.start()
+    await executor.wait()
+    return idx, executor.bytes_read, lines_collected, time.perf_counter() - start
+
+
+async def _bench(args: argparse.Namespace) -> None:
+    results = await asyncio.gather(
+        *[_run_producer(i, args.mb, args.line_len, args.coalesce_window) for i in range(args.procs)]
+    )
+    total_bytes = 0
+    total_time = 0.0
+    for idx, nbytes, nlines, duration in results:
+        total_bytes += nbytes
+        total_time = max(total_time, duration)
+        print(
+            f"producer{idx}: {nbytes / 1e6:.1f} MB, {nlines} lines in {duration:.2f} s"
+            f" -> {nbytes / 1e6 / duration:.1f} MB/s"
+        )
+    print(f"aggregate: {total_bytes / 1e6 / total_time:.1f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procs", type=int, default=1, help="Number of concurrent producers")
+    parser.add_argument("--mb", type=int, default=128, help="MiB of output per producer")
+    parser.add_argument("--line-len", type=int, default=100, help="Length of each output line")
+    parser.add_argument(
+        "--coalesce-window",
+        type=float,
+        default=0.0,
+        help="Output coalescing window of the command executors in seconds",
+    )
+    asyncio.run(_bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
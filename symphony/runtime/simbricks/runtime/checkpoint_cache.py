@@ -0,0 +1,119 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Cache of simulator checkpoints shared between instantiations and invocations.
+
+Checkpoints are keyed by the configuration of the simulators up to the point the checkpoint is
+taken, see `Simulator.checkpoint_config()`. For hosts, this includes the commands
+`BaseLinuxHost.config_str()` runs before the checkpoint commands, so runs that only differ in
+what happens after the checkpoint share a single checkpoint run, and later invocations skip it
+entirely. Each run restoring from a checkpoint holds a reference to it until it finished, which
+protects the checkpoint from being evicted, also by other processes using the same cache.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import typing
+
+from simbricks.utils import content_cache as utils_content_cache
+from simbricks.utils import file as utils_file
+
+if typing.TYPE_CHECKING:
+    from simbricks.orchestration.instantiation import base as inst_base
+    from simbricks.orchestration.simulation import base as sim_base
+
+
+class CheckpointCache:
+    def __init__(self, root: str | os.PathLike[str], max_size: int | None = None) -> None:
+        self.cache: utils_content_cache.ContentCache = utils_content_cache.ContentCache(
+            root, max_size
+        )
+        """Stores the checkpoints, `max_size` in bytes limits its size."""
+        self.created: int = 0
+        self.reused: int = 0
+        self._creating: dict[inst_base.Instantiation, tuple[str, str]] = {}
+        """Key and staging path of the checkpoint each checkpointing instantiation creates."""
+        self._restoring: dict[inst_base.Instantiation, str] = {}
+        """Key of the checkpoint each restoring instantiation holds a reference to."""
+
+    @staticmethod
+    def _checkpointed_sims(inst: inst_base.Instantiation) -> list[tuple[str, sim_base.Simulator]]:
+        """Simulators that take checkpoints with their configuration, in a stable order."""
+        sims = [
+            (json.dumps(sim.checkpoint_config(inst)), sim)
+            for sim in inst.assigned_fragment.all_simulators()
+            if sim.supports_checkpointing()
+        ]
+        return sorted(sims, key=lambda config_sim: (config_sim[0], config_sim[1].id()))
+
+    def checkpoint_key(self, inst: inst_base.Instantiation) -> str:
+        return utils_content_cache.content_key(
+            *(config for config, _ in self._checkpointed_sims(inst))
+        )
+
+    def has_checkpoint(self, key: str) -> bool:
+        return self.cache.lookup(key) is not None
+
+    def _use_dir(self, inst: inst_base.Instantiation, checkpoint_dir: str) -> None:
+        # simulators with identical configuration are interchangeable, so they are assigned
+        # checkpoint directories by position
+        inst.env.set_checkpoint_dirs(
+            {
+                sim.id(): f"{checkpoint_dir}/checkpoint.{i}"
+                for i, (_, sim) in enumerate(self._checkpointed_sims(inst))
+            }
+        )
+
+    def create_checkpoint(self, inst: inst_base.Instantiation, key: str) -> None:
+        """Let `inst` create the checkpoint for `key`. It is published once `inst` finished
+        successfully."""
+        staging = self.cache.staging_path(key)
+        utils_file.mkdir(staging)
+        self._creating[inst] = (key, staging)
+        self._use_dir(inst, staging)
+
+    def use_checkpoint(self, inst: inst_base.Instantiation, key: str) -> None:
+        """Let `inst` restore the checkpoint for `key`, which may still be created by another
+        run. The checkpoint is retained until `inst` finished."""
+        self.cache.retain(key)
+        self._restoring[inst] = key
+        self._use_dir(inst, self.cache.entry_path(key).as_posix())
+
+    def finish(self, inst: inst_base.Instantiation, success: bool) -> None:
+        """Publish the checkpoint created by `inst` or release the one it restored from."""
+        if inst in self._creating:
+            key, staging = self._creating.pop(inst)
+            if success:
+                self.cache.publish(key, staging)
+                self.created += 1
+            else:
+                utils_file.rmtree(staging)
+        if inst in self._restoring:
+            self.cache.release(self._restoring.pop(inst))
+            self.reused += 1
+
+    def format_stats(self) -> str:
+        return (
+            f"checkpoint cache: {self.created} checkpoints created, {self.reused} restores,"
+            f" {self.cache.size() / 10**9:.1f} GB used"
+        )
@@ -23,18 +23,88 @@
 from __future__ import annotations
 
 import asyncio
+import codecs
+import os
+import pathlib
 import shlex
+import shutil
 import signal
 import typing
 from asyncio.subprocess import Process
 from collections import abc
 
+from simbricks.utils import file as utils_file
+
 if typing.TYPE_CHECKING:
     from simbricks.orchestration.instantiation import proxy as inst_proxy
     from simbricks.orchestration.simulation import base as sim_base
     from simbricks.runtime import simulation_executor as sim_exec
 
 
+_STREAM_LIMIT = 1024 * 1024
+"""Buffer limit of the stdout and stderr stream readers and maximum size of a single read."""
+_TAIL_INTERVAL = 0.1
+"""Polling interval in seconds when tailing log files of processes that write output directly
+to files."""
+_GROUP_POLL_INTERVAL = 0.05
+"""Polling interval in seconds when waiting for the remaining members of a process group to
+exit after the process itself exited."""
+
+
+def _group_has_running_members(pgid: int) -> bool:
+    """Whether a process in the process group `pgid` is running, ignoring zombies."""
+    try:
+        pids = [entry for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return True
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as file:
+                stat = file.read()
+        except OSError:
+            continue
+        # the command name in parentheses may contain spaces
+        fields = stat[stat.rindex(b")") + 2 :].split()
+        if int(fields[2]) == pgid and fields[0] != b"Z":
+            return True
+    return False
+
+
+class LineSplitter:
+    """Incrementally decodes a UTF-8 byte stream and splits it into lines.
+
+    Multi-byte characters split across chunks are decoded correctly, invalid sequences are
+    replaced instead of raising."""
+
+    def __init__(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial: list[str] = []
+        """Pieces of the current, not yet terminated line."""
+
+    def feed(self, data: bytes) -> list[str]:
+        text = self._decoder.decode(data)
+        if "\n" not in text:
+            if text:
+                self._partial.append(text)
+            return []
+        lines = text.split("\n")
+        if self._partial:
+            self._partial.append(lines[0])
+            lines[0] = "".join(self._partial)
+        last = lines.pop()
+        self._partial = [last] if last else []
+        return lines
+
+    def finish(self) -> list[str]:
+        """Returns the remaining unterminated line, if any, at the end of the stream."""
+        rest = self._decoder.decode(b"", final=True)
+        if rest:
+            self._partial.append(rest)
+        lines = ["".join(self._partial)] if self._partial else []
+        self._partial = []
+        return lines
+
+
 class CommandExecutor:
     def __init__(
         self,
@@ -44,44 +114,88 @@ class CommandExecutor:
         exited_callback: typing.Callable[[int], typing.Awaitable[None]],
         stdout_callback: typing.Callable[[list[str]], typing.Awaitable[None]],
         stderr_callback: typing.Callable[[list[str]], typing.Awaitable[None]],
+        coalesce_window: float = 0.0,
+        log_files: tuple[str, str] | None = None,
+        tail_logs: bool = True,
+        cpus: list[int] | None = None,
+        own_process_group: bool = False,
     ):
-        self._stdout_buf = bytearray()
-        self._stderr_buf = bytearray()
+        self._stdout_splitter = LineSplitter()
+        self._stderr_splitter = LineSplitter()
+        self._coalesce_window: float = coalesce_window
+        """If output trickles in slowly, wait this many seconds after draining a stream so that
+        output is handed to the callbacks in fewer, larger batches. Fast streams are never
+        delayed."""
+        self._log_files: tuple[str, str] | None = log_files
+        """If set, stdout and stderr of the process are redirected directly to these files
+        instead of pipes."""
+        self._tail_logs: bool = tail_logs
+        """Whether to read back the log files to invoke the output callbacks."""
+        self._cpus: list[int] | None = cpus
+        """If set, the process is pinned to these cores when it is spawned."""
+        self._own_process_group: bool = own_process_group
+        """Whether the process is spawned in its own process group. Signals for stopping it are
+        then sent to the whole group, which includes processes it spawned, e.g. helpers of
+        shell wrappers."""
+        self.bytes_read: int = 0
+        self.lines_read: int = 0
         self._cmd_parts = shlex.split(cmd)
         self._label = label
         self._started_cb = started_callback
         self._exited_cb = exited_callback
         self._stdout_cb = stdout_callback
         self._stderr_cb = stderr_callback
+        self._output_listeners: list[typing.Callable[[list[str]], None]] = []
 
         self._proc: Process
         self._terminate_future: asyncio.Task
 
-    def _parse_buf(self, buf: bytearray, data: bytes) -> list[str]:
-        if data is not None:
-            buf.extend(data)
-        lines = []
-        start = 0
-        for i in range(0, len(buf)):
-            if buf[i] == ord("\n"):
-                line = buf[start:i].decode("utf-8")
-                lines.append(line)
-                start = i + 1
-        del buf[0:start]
-
-        if len(data) == 0 and len(buf) > 0:
-            lines.append(buf.decode("utf-8"))
+    def _split_lines(self, splitter: LineSplitter, data: bytes) -> list[str]:
+        if data:
+            lines = splitter.feed(data)
+        else:
+            lines = splitter.finish()
+        self.bytes_read += len(data)
+        self.lines_read += len(lines)
         return lines
 
+    def add_output_listener(self, listener: typing.Callable[[list[str]], None]) -> None:
+        """Register a function that is invoked with every batch of stdout and stderr lines
+        before the output callbacks."""
+        self._output_listeners.append(listener)
+
+    def remove_output_listener(self, listener: typing.Callable[[list[str]], None]) -> None:
+        self._output_listeners.remove(listener)
+
+    def unread_log_size(self) -> int | None:
+        """Total size of the log files the process writes its output to if they are not read
+        back, in which case output listeners do not see the output. `None` otherwise."""
+        if self._log_files is None or self._tail_logs:
+            return None
+        size = 0
+        for path in self._log_files:
+            try:
+                size += os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+        return size
+
+    def _notify_output_listeners(self, lines: list[str]) -> None:
+        if lines:
+            for listener in list(self._output_listeners):
+                listener(lines)
+
     async def _consume_stdout(self, data: bytes) -> None:
         eof = len(data) == 0
-        ls = self._parse_buf(self._stdout_buf, data)
+        ls = self._split_lines(self._stdout_splitter, data)
+        self._notify_output_listeners(ls)
         if len(ls) > 0 or eof:
             await self._stdout_cb(ls)
 
     async def _consume_stderr(self, data: bytes) -> None:
         eof = len(data) == 0
-        ls = self._parse_buf(self._stderr_buf, data)
+        ls = self._split_lines(self._stderr_splitter, data)
+        self._notify_output_listeners(ls)
         if len(ls) > 0 or eof:
             await self._stderr_cb(ls)
 
@@ -89,24 +203,54 @@ class CommandExecutor:
         self, stream: asyncio.StreamReader, consume_fn: abc.Callable[[bytes], abc.Awaitable[None]]
     ) -> None:
         while True:
-            bs = await stream.read(8192)
-            if bs:
-                await consume_fn(bs)
-            else:
-                await consume_fn(bs)
+            # returns whatever is buffered right now, up to the stream limit
+            bs = await stream.read(_STREAM_LIMIT)
+            await consume_fn(bs)
+            if not bs:
                 return
-            await asyncio.sleep(1)
+            if self._coalesce_window > 0 and len(bs) < _STREAM_LIMIT // 16:
+                await asyncio.sleep(self._coalesce_window)
+
+    async def _tail_file_loop(
+        self, path: str, consume_fn: abc.Callable[[bytes], abc.Awaitable[None]]
+    ) -> None:
+        with open(path, "rb") as file:
+            while True:
+                # check before reading so that output written right before exiting is not lost
+                exited = self._proc.returncode is not None
+                bs = file.read(_STREAM_LIMIT)
+                if bs:
+                    await consume_fn(bs)
+                elif exited:
+                    await consume_fn(bs)
+                    return
+                else:
+                    await asyncio.sleep(_TAIL_INTERVAL)
 
     async def _waiter(self) -> None:
-        assert self._proc.stdout is not None and self._proc.stderr is not None
-        stdout_handler = asyncio.create_task(
-            self._consume_stream_loop(self._proc.stdout, self._consume_stdout)
-        )
-        stderr_handler = asyncio.create_task(
-            self._consume_stream_loop(self._proc.stderr, self._consume_stderr)
-        )
+        handlers = []
+        if self._log_files is None:
+            assert self._proc.stdout is not None and self._proc.stderr is not None
+            handlers.append(
+                asyncio.create_task(
+                    self._consume_stream_loop(self._proc.stdout, self._consume_stdout)
+                )
+            )
+            handlers.append(
+                asyncio.create_task(
+                    self._consume_stream_loop(self._proc.stderr, self._consume_stderr)
+                )
+            )
+        elif self._tail_logs:
+            stdout_path, stderr_path = self._log_files
+            handlers.append(
+                asyncio.create_task(self._tail_file_loop(stdout_path, self._consume_stdout))
+            )
+            handlers.append(
+                asyncio.create_task(self._tail_file_loop(stderr_path, self._consume_stderr))
+            )
         rc = await self._proc.wait()
-        await asyncio.gather(stdout_handler, stderr_handler)
+        await asyncio.gather(*handlers)
         await self._exited_cb(rc)
 
     async def send_input(self, bs: bytes, eof=False) -> None:
@@ -115,16 +259,57 @@ class CommandExecutor:
         if eof:
             self._proc.stdin.close()
 
+    def _spawn_args(self) -> list[str]:
+        """The command to spawn. If the process is pinned, it is started through `taskset`, so
+        the affinity is set before the command is executed and inherited by all its threads."""
+        if self._cpus and shutil.which("taskset") is not None:
+            cpu_list = ",".join(str(cpu) for cpu in self._cpus)
+            return ["taskset", "--cpu-list", cpu_list, *self._cmd_parts]
+        return self._cmd_parts
+
     async def start(self) -> None:
-        self._proc = await asyncio.create_subprocess_exec(
-            *self._cmd_parts,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            stdin=asyncio.subprocess.DEVNULL,
-        )
+        # Python code must not run in the forked child of a multi-threaded process, so the
+        # process group and affinity are not set up through preexec_fn. A new session also makes
+        # the process the leader of a new process group.
+        args = self._spawn_args()
+        if self._log_files is None:
+            self._proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                stdin=asyncio.subprocess.DEVNULL,
+                limit=_STREAM_LIMIT,
+                start_new_session=self._own_process_group,
+            )
+        else:
+            stdout_path, stderr_path = self._log_files
+            for path in self._log_files:
+                pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # the child keeps its own copies of the file descriptors
+            with open(stdout_path, "wb") as stdout, open(stderr_path, "wb") as stderr:
+                self._proc = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdout=stdout,
+                    stderr=stderr,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    start_new_session=self._own_process_group,
+                )
+        if self._cpus and args is self._cmd_parts:
+            # without taskset, threads the command started before this are not pinned
+            try:
+                os.sched_setaffinity(self._proc.pid, self._cpus)
+            except ProcessLookupError:
+                pass
         await self._started_cb()
         self._terminate_future = asyncio.create_task(self._waiter())
 
+    @property
+    def pid(self) -> int:
+        return self._proc.pid
+
+    def running(self) -> bool:
+        return self._proc.returncode is None
+
     async def wait(self) -> None:
         """
         Wait for running process to finish and output to be collected.
@@ -134,46 +319,90 @@ class CommandExecutor:
         """
         await asyncio.shield(self._terminate_future)
 
+    def _signal(self, sig: signal.Signals) -> None:
+        """Send `sig` to the process group if the process has its own, otherwise only to the
+        process."""
+        if self._own_process_group:
+            try:
+                os.killpg(self._proc.pid, sig)
+            except ProcessLookupError:
+                pass
+        elif self._proc.returncode is None:
+            self._proc.send_signal(sig)
+
+    async def _group_alive(self) -> bool:
+        """Whether any process in the process group is still running."""
+        if not self._own_process_group:
+            return self._proc.returncode is None
+        try:
+            os.killpg(self._proc.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        # members that already exited but were not reaped yet by their new parent still count
+        # for killpg(), scanning /proc for them must not block draining the output of other
+        # simulators
+        return await utils_file.run_blocking(_group_has_running_members, self._proc.pid)
+
+    async def _wait_group(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the process and all members of its process group
+        to exit. Returns whether they did."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            await asyncio.wait_for(self._proc.wait(), timeout)
+        # before Python 3.11, asyncio.wait_for() throws asyncio.TimeoutError -_-
+        except (TimeoutError, asyncio.TimeoutError):
+            return False
+        while await self._group_alive():
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(_GROUP_POLL_INTERVAL)
+        return True
+
     async def interrupt(self) -> None:
         """Sends an interrupt signal."""
-        if self._proc.returncode is None:
-            self._proc.send_signal(signal.SIGINT)
+        self._signal(signal.SIGINT)
 
     async def terminate(self) -> None:
         """Sends a terminate signal."""
-        if self._proc.returncode is None:
-            self._proc.terminate()
+        self._signal(signal.SIGTERM)
 
     async def kill(self) -> None:
         """Sends a kill signal."""
-        if self._proc.returncode is None:
-            self._proc.kill()
-
-    async def int_term_kill(self, delay: int = 5) -> None:
-        """Attempts to stop this component by sending signals in the following
-        order: interrupt, terminate, kill."""
-        await self.interrupt()
-        try:
-            await asyncio.wait_for(self._proc.wait(), delay)
-            return
-        # before Python 3.11, asyncio.wait_for() throws asyncio.TimeoutError -_-
-        except (TimeoutError, asyncio.TimeoutError):
-            print(
-                f"terminating component {self._cmd_parts[0]} pid {self._proc.pid}",
-                flush=True,
-            )
-            await self.terminate()
+        self._signal(signal.SIGKILL)
+
+    async def int_term_kill(self, grace: float = 5) -> None:
+        """Attempts to stop this component by sending signals in the following order:
+        interrupt, terminate, kill. Each signal is only escalated if the process, or its process
+        group, did not exit within `grace` seconds, otherwise this returns right away."""
+        if await self._group_alive():
+            await self.interrupt()
+            if not await self._wait_group(grace):
+                print(
+                    f"terminating component {self._cmd_parts[0]} pid {self._proc.pid}",
+                    flush=True,
+                )
+                await self.terminate()
+                if not await self._wait_group(grace):
+                    print(
+                        f"killing component {self._cmd_parts[0]} pid {self._proc.pid}",
+                        flush=True,
+                    )
+                    await self.kill()
+        await self._proc.wait()
 
-        try:
-            await asyncio.wait_for(self._proc.wait(), delay)
-            return
-        except (TimeoutError, asyncio.TimeoutError):
+        # final sweep: members of the group that outlived the process, e.g. because they
+        # ignore the signals or were spawned while the process exited
+        if self._own_process_group and await self._group_alive():
             print(
-                f"killing component {self._cmd_parts[0]} pid {self._proc.pid}",
+                f"killing leftover processes of component {self._cmd_parts[0]}"
+                f" (process group {self._proc.pid})",
                 flush=True,
             )
             await self.kill()
-        await self._proc.wait()
+            await self._wait_group(grace)
 
     async def sigusr1(self) -> None:
         """Sends an SIGUSR1 signal."""
@@ -182,8 +411,11 @@ class CommandExecutor:
 
 
 class CommandExecutorFactory:
-    def __init__(self, sim_exec_cbs: sim_exec.SimulationExecutorCallbacks):
+    def __init__(
+        self, sim_exec_cbs: sim_exec.SimulationExecutorCallbacks, coalesce_window: float = 0.0
+    ):
         self._sim_exec_cbs = sim_exec_cbs
+        self._coalesce_window: float = coalesce_window
 
     async def exec_generic_prepare_cmds(self, cmds: list[str]) -> None:
         for cmd in cmds:
@@ -202,7 +434,13 @@ class CommandExecutorFactory:
                 await self._sim_exec_cbs.simulation_prepare_cmd_stderr(cmd, lines)
 
             executor = CommandExecutor(
-                cmd, "simulation_prepare", started_cb, exited_cb, stdout_cb, stderr_cb
+                cmd,
+                "simulation_prepare",
+                started_cb,
+                exited_cb,
+                stdout_cb,
+                stderr_cb,
+                self._coalesce_window,
             )
             await executor.start()
             await executor.wait()
@@ -223,14 +461,30 @@ class CommandExecutorFactory:
                 await self._sim_exec_cbs.simulator_prepare_stderr(sim, lines)
 
             executor = CommandExecutor(
-                cmd, sim.full_name(), started_cb, exited_cb, stdout_cb, stderr_cb
+                cmd,
+                sim.full_name(),
+                started_cb,
+                exited_cb,
+                stdout_cb,
+                stderr_cb,
+                self._coalesce_window,
             )
             await executor.start()
             await executor.wait()
 
-    async def start_simulator(self, sim: sim_base.Simulator, cmd) -> CommandExecutor:
+    async def start_simulator(
+        self,
+        sim: sim_base.Simulator,
+        cmd,
+        output_listener: typing.Callable[[list[str]], None] | None = None,
+        log_files: tuple[str, str] | None = None,
+        tail_logs: bool = True,
+        cpus: list[int] | None = None,
+    ) -> CommandExecutor:
         async def started_cb() -> None:
             await self._sim_exec_cbs.simulator_started(sim, cmd)
+            if log_files is not None:
+                await self._sim_exec_cbs.simulator_output_files(sim, *log_files)
 
         async def exited_cb(exit_code: int) -> None:
             await self._sim_exec_cbs.simulator_exited(sim, exit_code)
@@ -242,14 +496,34 @@ class CommandExecutorFactory:
             await self._sim_exec_cbs.simulator_stderr(sim, lines)
 
         executor = CommandExecutor(
-            cmd, sim.full_name(), started_cb, exited_cb, stdout_cb, stderr_cb
+            cmd,
+            sim.full_name(),
+            started_cb,
+            exited_cb,
+            stdout_cb,
+            stderr_cb,
+            self._coalesce_window,
+            log_files,
+            tail_logs,
+            cpus,
+            own_process_group=True,
         )
+        if output_listener is not None:
+            executor.add_output_listener(output_listener)
         await executor.start()
         return executor
 
-    async def start_proxy(self, proxy: inst_proxy.Proxy, cmd) -> CommandExecutor:
+    async def start_proxy(
+        self,
+        proxy: inst_proxy.Proxy,
+        cmd,
+        log_files: tuple[str, str] | None = None,
+        tail_logs: bool = True,
+    ) -> CommandExecutor:
         async def started_cb() -> None:
             await self._sim_exec_cbs.proxy_started(proxy, cmd)
+            if log_files is not None:
+                await self._sim_exec_cbs.proxy_output_files(proxy, *log_files)
 
         async def exited_cb(exit_code: int) -> None:
             await self._sim_exec_cbs.proxy_exited(proxy, exit_code)
@@ -260,6 +534,17 @@ class CommandExecutorFactory:
         async def stderr_cb(lines: list[str]) -> None:
             await self._sim_exec_cbs.proxy_stderr(proxy, lines)
 
-        executor = CommandExecutor(cmd, proxy.name, started_cb, exited_cb, stdout_cb, stderr_cb)
+        executor = CommandExecutor(
+            cmd,
+            proxy.name,
+            started_cb,
+            exited_cb,
+            stdout_cb,
+            stderr_cb,
+            self._coalesce_window,
+            log_files,
+            tail_logs,
+            own_process_group=True,
+        )
         await executor.start()
         return executor
@@ -0,0 +1,349 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Allocation of exclusive CPU cores to simulators.
+
+SimBricks simulators busy-poll their shared memory queues, so simulators sharing a core slow each
+other down considerably. The allocator hands out disjoint sets of core IDs, which the runtime
+then pins the simulator processes to. Simulators connected through a channel exchange messages
+through shared memory at every synchronization interval, so placement additionally tries to put
+them on cores sharing a cache or at least the same NUMA node."""
+
+from __future__ import annotations
+
+import enum
+import glob
+import os
+import re
+import typing
+
+if typing.TYPE_CHECKING:
+    from simbricks.orchestration.simulation import base as sim_base
+
+
+def _parse_cpu_list(cpu_list: str) -> list[int]:
+    """Parses a sysfs CPU list like `0-3,8,10-11`."""
+    cpus = []
+    for part in cpu_list.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _read_sysfs(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+class CpuTopology:
+    """Cache, NUMA node and package domains of the CPUs, as reported by sysfs."""
+
+    def __init__(self) -> None:
+        self.package: dict[int, int] = {}
+        self.numa_node: dict[int, int] = {}
+        self.l3: dict[int, int] = {}
+        """ID of the L3 cache domain, i.e. the lowest CPU sharing the cache."""
+        self.l2: dict[int, int] = {}
+        """ID of the L2 cache domain, i.e. the lowest CPU sharing the cache."""
+
+    @classmethod
+    def from_sysfs(cls, sysfs: str = "/sys/devices/system") -> CpuTopology:
+        """Reads the topology. Missing information, e.g. in containers, is treated as a
+        single domain."""
+        topo = cls()
+        for node_dir in glob.glob(f"{sysfs}/node/node[0-9]*"):
+            node = int(re.sub(r".*node", "", node_dir))
+            cpu_list = _read_sysfs(f"{node_dir}/cpulist")
+            for cpu in _parse_cpu_list(cpu_list or ""):
+                topo.numa_node[cpu] = node
+
+        for cpu_dir in glob.glob(f"{sysfs}/cpu/cpu[0-9]*"):
+            cpu = int(re.sub(r".*cpu", "", cpu_dir))
+            package = _read_sysfs(f"{cpu_dir}/topology/physical_package_id")
+            topo.package[cpu] = int(package) if package is not None else 0
+            topo.numa_node.setdefault(cpu, 0)
+            for cache_dir in glob.glob(f"{cpu_dir}/cache/index[0-9]*"):
+                level = _read_sysfs(f"{cache_dir}/level")
+                cache_type = _read_sysfs(f"{cache_dir}/type")
+                shared = _read_sysfs(f"{cache_dir}/shared_cpu_list")
+                if level is None or shared is None or cache_type == "Instruction":
+                    continue
+                domain = min(_parse_cpu_list(shared), default=cpu)
+                if level == "2":
+                    topo.l2[cpu] = domain
+                elif level == "3":
+                    topo.l3[cpu] = domain
+        return topo
+
+    def distance(self, a: int, b: int) -> int:
+        """Cost of a channel between simulators on CPUs `a` and `b`: 0 for a shared L2 cache, 1
+        for a shared L3 cache, 2 for the same NUMA node, 4 for the same package and 8 across
+        packages."""
+        if a == b or (a in self.l2 and self.l2.get(a) == self.l2.get(b)):
+            return 0
+        if a in self.l3 and self.l3.get(a) == self.l3.get(b):
+            return 1
+        if self.numa_node.get(a, 0) == self.numa_node.get(b, 0):
+            return 2
+        if self.package.get(a, 0) == self.package.get(b, 0):
+            return 4
+        return 8
+
+    def sort_key(self, cpu: int) -> tuple[int, int, int, int, int]:
+        """Orders CPUs so that CPUs sharing caches are adjacent."""
+        return (
+            self.package.get(cpu, 0),
+            self.numa_node.get(cpu, 0),
+            self.l3.get(cpu, 0),
+            self.l2.get(cpu, cpu),
+            cpu,
+        )
+
+
+_DISTANCE_NAMES = {0: "L2", 1: "L3", 2: "NUMA node", 4: "package", 8: "cross-package"}
+
+
+class PlacementPolicy(enum.Enum):
+    SEQUENTIAL = "sequential"
+    """Assign cores to simulators in the order the simulators were added."""
+    COMPACT = "compact"
+    """Allocate cores close to each other and place simulators connected through channels on
+    cores sharing caches or at least a NUMA node."""
+    SPREAD = "spread"
+    """Allocate cores evenly across NUMA nodes, e.g. for simulators bound by memory
+    bandwidth."""
+
+
+class CoreAllocator:
+    """Hands out exclusive cores from a fixed set of core IDs."""
+
+    def __init__(
+        self,
+        cores: typing.Iterable[int] | None = None,
+        topology: CpuTopology | None = None,
+        policy: PlacementPolicy = PlacementPolicy.SEQUENTIAL,
+    ) -> None:
+        if cores is None:
+            cores = os.sched_getaffinity(0)
+        self.topology: CpuTopology = topology if topology is not None else CpuTopology()
+        self.policy: PlacementPolicy = policy
+        self._cores: list[int] = sorted(cores, key=self.topology.sort_key)
+        self._free: set[int] = set(self._cores)
+
+    @property
+    def num_cores(self) -> int:
+        return len(self._cores)
+
+    @property
+    def num_free(self) -> int:
+        return len(self._free)
+
+    def allocate(self, count: int) -> list[int] | None:
+        """Allocate `count` cores, for the compact and sequential policies preferring cores that
+        are adjacent in the topology. Returns `None` if not enough cores are free."""
+        if count > len(self._free):
+            return None
+        free = [core for core in self._cores if core in self._free]
+        if self.policy == PlacementPolicy.SPREAD:
+            chosen = self._spread(free, count)
+        else:
+            # the window of free cores with the lowest internal distance
+            chosen = min(
+                (free[start : start + count] for start in range(len(free) - count + 1)),
+                key=lambda window: self.topology.distance(window[0], window[-1]),
+            )
+        self._free.difference_update(chosen)
+        return chosen
+
+    def _spread(self, free: list[int], count: int) -> list[int]:
+        by_node: dict[int, list[int]] = {}
+        for core in free:
+            by_node.setdefault(self.topology.numa_node.get(core, 0), []).append(core)
+        queues = list(by_node.values())
+        chosen = []
+        while len(chosen) < count:
+            for queue in queues:
+                if queue and len(chosen) < count:
+                    chosen.append(queue.pop(0))
+        return chosen
+
+    def release(self, cores: typing.Iterable[int]) -> None:
+        self._free.update(cores)
+
+
+def _channel_weights(
+    simulation: sim_base.Simulation,
+) -> dict[sim_base.Simulator, dict[sim_base.Simulator, int]]:
+    """Channels between simulators, weighted by their number. Synchronized channels count
+    twice since they exchange messages at every synchronization interval."""
+    weights: dict[sim_base.Simulator, dict[sim_base.Simulator, int]] = {
+        sim: {} for sim in simulation.all_simulators()
+    }
+    for sim in simulation.all_simulators():
+        for chan in sim.get_channels():
+            for iface in chan.sys_channel.interfaces():
+                peer = simulation.find_sim(iface.component)
+                if peer is sim:
+                    continue
+                weight = 2 if chan._synchronized else 1
+                weights[sim][peer] = weights[sim].get(peer, 0) + weight
+    return weights
+
+
+def assign_cores(
+    simulation: sim_base.Simulation,
+    cores: list[int],
+    topology: CpuTopology | None = None,
+    policy: PlacementPolicy = PlacementPolicy.SEQUENTIAL,
+) -> dict[sim_base.Simulator, list[int]]:
+    """Split the cores allocated for a simulation among its simulators according to their
+    `resreq_cores()`. With the compact policy, simulators are placed greedily so that the
+    channels between them span as little of the topology as possible."""
+    simulators = simulation.all_simulators()
+    required = sum(sim.resreq_cores() for sim in simulators)
+    if required > len(cores):
+        raise RuntimeError(
+            f"simulation {simulation.name} requires {required} cores, but only {len(cores)}"
+            " were allocated"
+        )
+
+    if policy != PlacementPolicy.COMPACT or topology is None:
+        assignment = {}
+        next_core = 0
+        for sim in simulators:
+            count = sim.resreq_cores()
+            assignment[sim] = cores[next_core : next_core + count]
+            next_core += count
+        return assignment
+
+    weights = _channel_weights(simulation)
+    free = sorted(cores, key=topology.sort_key)
+    placed: dict[sim_base.Simulator, list[int]] = {}
+
+    def cost(sim: sim_base.Simulator, core: int) -> int:
+        return sum(
+            weight * topology.distance(core, placed[peer][0])
+            for peer, weight in weights[sim].items()
+            if peer in placed
+        )
+
+    # Place the most connected simulator first, then always the simulator with the strongest
+    # connection to those already placed, on the free core closest to its placed peers.
+    remaining = list(simulators)
+    while remaining:
+        sim = max(
+            remaining,
+            key=lambda s: (
+                sum(w for peer, w in weights[s].items() if peer in placed),
+                sum(weights[s].values()),
+            ),
+        )
+        remaining.remove(sim)
+        first = min(free, key=lambda core: (cost(sim, core), free.index(core)))
+        count = sim.resreq_cores()
+        sim_cores = sorted(free, key=lambda core: (topology.distance(first, core), core))[:count]
+        for core in sim_cores:
+            free.remove(core)
+        placed[sim] = sim_cores
+
+    # The greedy placement does not leave room for simulators placed later, so improve it by
+    # swapping the cores of simulators with the same core count while that lowers the total cost.
+    def total_cost() -> int:
+        return sum(
+            weight * topology.distance(placed[sim][0], placed[peer][0])
+            for sim in simulators
+            for peer, weight in weights[sim].items()
+        )
+
+    best = total_cost()
+    improved = True
+    while improved and best > 0:
+        improved = False
+        for i, sim_a in enumerate(simulators):
+            for sim_b in simulators[i + 1 :]:
+                if len(placed[sim_a]) != len(placed[sim_b]):
+                    continue
+                placed[sim_a], placed[sim_b] = placed[sim_b], placed[sim_a]
+                swapped = total_cost()
+                if swapped < best:
+                    best = swapped
+                    improved = True
+                else:
+                    placed[sim_a], placed[sim_b] = placed[sim_b], placed[sim_a]
+    return {sim: placed[sim] for sim in simulators}
+
+
+def placement_report(
+    simulation: sim_base.Simulation,
+    assignment: dict[sim_base.Simulator, list[int]],
+    topology: CpuTopology,
+) -> dict:
+    """Describes a placement: the cores and NUMA node of each simulator and, for each pair of
+    connected simulators, the closest level of the topology they share."""
+    weights = _channel_weights(simulation)
+    channels = []
+    cross_package = 0
+    for sim, peers in weights.items():
+        for peer, weight in peers.items():
+            if sim.id() > peer.id() or sim not in assignment or peer not in assignment:
+                continue
+            if not assignment[sim] or not assignment[peer]:
+                continue
+            distance = topology.distance(assignment[sim][0], assignment[peer][0])
+            if distance == 8:
+                cross_package += 1
+            channels.append(
+                {
+                    "a": sim.full_name(),
+                    "b": peer.full_name(),
+                    "weight": weight,
+                    "shared": _DISTANCE_NAMES[distance],
+                }
+            )
+    return {
+        "simulators": {
+            sim.full_name(): {
+                "cores": cores,
+                "numa_nodes": sorted({topology.numa_node.get(core, 0) for core in cores}),
+            }
+            for sim, cores in assignment.items()
+        },
+        "channels": channels,
+        "cross_package_channels": cross_package,
+    }
+
+
+def format_placement_report(report: dict) -> str:
+    lines = []
+    for name, info in report["simulators"].items():
+        lines.append(f"  {name}: cores {info['cores']} (NUMA {info['numa_nodes']})")
+    for chan in report["channels"]:
+        lines.append(f"  {chan['a']} <-> {chan['b']}: shared {chan['shared']}")
+    lines.append(f"  channels crossing packages: {report['cross_package_channels']}")
+    return "\n".join(lines)
@@ -0,0 +1,299 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Critical-path analysis of the startup of a simulation.
+
+Components are started in the order of the instantiation's dependency graph: a component
+connecting to another one can only start once the listening side is ready. Using how long each
+component took to become ready in earlier runs, measured from the timelines written as
+`trace.json`, the analysis determines the chain of components that dictates the time until all
+components are running (the critical path), the slack of all other components, and how much
+faster startup would be if a component were ready instantly or if the listening and connecting
+side of a connection on the critical path were swapped.
+"""
+
+from __future__ import annotations
+
+import collections
+import typing
+
+from simbricks.orchestration.instantiation import dependency_graph as dep_graph
+from simbricks.orchestration.instantiation import socket as inst_socket
+from simbricks.utils import graphlib
+from simbricks.utils import timeline as utils_timeline
+
+if typing.TYPE_CHECKING:
+    from simbricks.orchestration.instantiation import base as inst_base
+    from simbricks.orchestration.simulation import base as sim_base
+
+_STARTUP_SPANS = {
+    "wait for prepare",
+    "spawn",
+    "wait for ready",
+    "start delay",
+    "wait for sockets",
+    "read listening info",
+    "wait for external proxy",
+}
+"""Spans of the timeline that are part of starting a component. A component is ready when the
+last of them ends."""
+
+
+class ComponentTiming:
+    def __init__(self, prepared: float = 0.0, startup: float = 0.0) -> None:
+        self.prepared: float = prepared
+        """Time after the beginning of the startup at which the component's preparation, e.g.
+        copying disk images, was done. Preparation starts before the startup."""
+        self.startup: float = startup
+        """Time the component took to become ready once its dependencies were ready and it was
+        prepared."""
+
+
+Timings = dict[dep_graph.SimulationDependencyNode, ComponentTiming]
+
+
+def _all_nodes(
+    graph: dep_graph.SimulationDependencyGraph,
+) -> set[dep_graph.SimulationDependencyNode]:
+    nodes = set(graph)
+    for deps in graph.values():
+        nodes.update(deps)
+    return nodes
+
+
+def measure_timings(
+    graph: dep_graph.SimulationDependencyGraph, timeline: utils_timeline.Timeline
+) -> Timings:
+    """Timings of the components of `graph` in the run recorded in `timeline`. Components
+    without startup spans in the timeline are omitted."""
+    startup = [
+        span for span in timeline.spans if span.track == "simulation" and span.name == "startup"
+    ]
+    if not startup:
+        raise RuntimeError(f"timeline of {timeline.name} does not contain a simulation startup")
+    begin = startup[0].start
+
+    by_name = {node.name(): node for node in _all_nodes(graph)}
+    ready: dict[dep_graph.SimulationDependencyNode, float] = {}
+    prepared: dict[dep_graph.SimulationDependencyNode, float] = {}
+    for span in timeline.spans:
+        node = by_name.get(span.track)
+        if node is None:
+            continue
+        if span.name in _STARTUP_SPANS:
+            ready[node] = max(ready.get(node, begin), span.end)
+        elif span.name == "prepare":
+            prepared[node] = max(span.end, begin)
+
+    timings = {}
+    for node, ready_time in ready.items():
+        can_start = max((ready.get(dep, begin) for dep in graph.get(node, ())), default=begin)
+        can_start = max(can_start, prepared.get(node, begin))
+        timings[node] = ComponentTiming(
+            prepared.get(node, begin) - begin, max(ready_time - can_start, 0.0)
+        )
+    return timings
+
+
+def mean_timings(
+    graph: dep_graph.SimulationDependencyGraph, timelines: list[utils_timeline.Timeline]
+) -> Timings:
+    """Average of `measure_timings()` over the runs recorded in `timelines`."""
+    sums: Timings = collections.defaultdict(ComponentTiming)
+    counts: dict[dep_graph.SimulationDependencyNode, int] = collections.defaultdict(int)
+    for timeline in timelines:
+        for node, timing in measure_timings(graph, timeline).items():
+            sums[node].prepared += timing.prepared
+            sums[node].startup += timing.startup
+            counts[node] += 1
+    return {
+        node: ComponentTiming(timing.prepared / counts[node], timing.startup / counts[node])
+        for node, timing in sums.items()
+    }
+
+
+def _schedule(
+    graph: dep_graph.SimulationDependencyGraph, timings: Timings
+) -> tuple[dict[dep_graph.SimulationDependencyNode, float], float]:
+    """Time at which each component is ready when every component starts as soon as its
+    dependencies are ready and it is prepared, and the time at which all of them are ready."""
+    finish: dict[dep_graph.SimulationDependencyNode, float] = {}
+    for node in graphlib.TopologicalSorter(graph).static_order():
+        timing = timings.get(node, ComponentTiming())
+        start = max((finish[dep] for dep in graph.get(node, ())), default=0.0)
+        finish[node] = max(start, timing.prepared) + timing.startup
+    return finish, max(finish.values(), default=0.0)
+
+
+def _swappable(
+    inst: inst_base.Instantiation, connecting: sim_base.Simulator, listening: sim_base.Simulator
+) -> bool:
+    """Whether all connections between the two simulators also work the other way round."""
+    for comp in connecting.components():
+        for inf in comp.interfaces():
+            if inst._opposing_interface_within_same_sim(interface=inf):
+                continue
+            opposing = inf.get_opposing_interface()
+            if inst.find_sim_by_interface(opposing) is not listening:
+                continue
+            if inst_socket.SockType.LISTEN not in connecting.supported_socket_types(
+                inf
+            ) or inst_socket.SockType.CONNECT not in listening.supported_socket_types(opposing):
+                return False
+    return True
+
+
+class CriticalPathAnalysis:
+    """Critical path of the startup of `inst` given the timings of its components, e.g. from
+    `mean_timings()`. Alternative configurations are evaluated assuming that the components
+    keep their timings."""
+
+    def __init__(self, inst: inst_base.Instantiation, timings: Timings) -> None:
+        self._inst: inst_base.Instantiation = inst
+        self.graph: dep_graph.SimulationDependencyGraph = inst.sim_dependencies()
+        self.timings: Timings = timings
+        self.finish: dict[dep_graph.SimulationDependencyNode, float]
+        """Time after the beginning of the startup at which each component is ready."""
+        self.makespan: float
+        """Time until all components are ready."""
+        self.finish, self.makespan = _schedule(self.graph, timings)
+
+        successors = collections.defaultdict(set)
+        for node, deps in self.graph.items():
+            for dep in deps:
+                successors[dep].add(node)
+        latest: dict[dep_graph.SimulationDependencyNode, float] = {}
+        for node in reversed(list(graphlib.TopologicalSorter(self.graph).static_order())):
+            latest[node] = min(
+                (latest[succ] - self._timing(succ).startup for succ in successors[node]),
+                default=self.makespan,
+            )
+        self.slack: dict[dep_graph.SimulationDependencyNode, float] = {
+            node: latest[node] - self.finish[node] for node in self.finish
+        }
+        """How much later each component could be ready without delaying the startup."""
+
+        self.critical_path: list[dep_graph.SimulationDependencyNode] = []
+        """Components determining the startup time, in start order. The first one is either
+        the first to start or waited for its own preparation."""
+        node = max(self.finish, key=lambda n: self.finish[n]) if self.finish else None
+        while node is not None:
+            self.critical_path.append(node)
+            deps = self.graph.get(node, ())
+            prev = max(deps, key=lambda n: self.finish[n]) if deps else None
+            if prev is not None and self.finish[prev] < self._timing(node).prepared:
+                prev = None
+            node = prev
+        self.critical_path.reverse()
+
+    def _timing(self, node: dep_graph.SimulationDependencyNode) -> ComponentTiming:
+        return self.timings.get(node, ComponentTiming())
+
+    def speedup_if_ready_instantly(self) -> dict[dep_graph.SimulationDependencyNode, float]:
+        """How much faster the startup would be if a component on the critical path were
+        prepared right away and ready as soon as its dependencies are. Components off the
+        critical path cannot speed it up."""
+        speedup = {}
+        for node in self.critical_path:
+            timing = self._timing(node)
+            if not timing.prepared and not timing.startup:
+                continue
+            timings = dict(self.timings)
+            timings[node] = ComponentTiming()
+            _, makespan = _schedule(self.graph, timings)
+            speedup[node] = self.makespan - makespan
+        return speedup
+
+    def speedup_if_swapped(
+        self,
+    ) -> list[tuple[dep_graph.SimulationDependencyNode, dep_graph.SimulationDependencyNode, float]]:
+        """For consecutive simulators on the critical path whose connections also work the
+        other way round, how much faster the startup would be if the connecting one listened
+        instead, as `(connecting, listening, speedup)`."""
+        result = []
+        for listening, connecting in zip(self.critical_path, self.critical_path[1:]):
+            if (
+                listening.type != dep_graph.SimulationDependencyNodeType.SIMULATOR
+                or connecting.type != dep_graph.SimulationDependencyNodeType.SIMULATOR
+                or not _swappable(self._inst, connecting.get_simulator(), listening.get_simulator())
+            ):
+                continue
+            graph = {node: set(deps) for node, deps in self.graph.items()}
+            graph[connecting].discard(listening)
+            graph.setdefault(listening, set()).add(connecting)
+            try:
+                _, makespan = _schedule(dep_graph.SimulationDependencyGraph(graph), self.timings)
+            except graphlib.CycleError:
+                continue
+            if makespan < self.makespan:
+                result.append((connecting, listening, self.makespan - makespan))
+        return result
+
+    def toJSON(self) -> dict:
+        return {
+            "makespan": self.makespan,
+            "critical_path": [node.name() for node in self.critical_path],
+            "components": {
+                node.name(): {
+                    "prepared": self._timing(node).prepared,
+                    "startup": self._timing(node).startup,
+                    "ready": self.finish[node],
+                    "slack": self.slack[node],
+                }
+                for node in self.finish
+            },
+            "speedup_if_ready_instantly": {
+                node.name(): speedup for node, speedup in self.speedup_if_ready_instantly().items()
+            },
+            "speedup_if_swapped": [
+                {"connecting": conn.name(), "listening": listen.name(), "speedup": speedup}
+                for conn, listen, speedup in self.speedup_if_swapped()
+            ],
+        }
+
+    def format_report(self) -> str:
+        lines = [f"all components ready after {self.makespan:.2f} s", "critical path:"]
+        for i, node in enumerate(self.critical_path):
+            timing = self._timing(node)
+            line = f"  {node.name()}: "
+            if i == 0 and timing.prepared:
+                line += f"prepared after {timing.prepared:.2f} s, "
+            line += f"{timing.startup:.2f} s to become ready"
+            lines.append(line)
+        off_path = sorted(
+            (node for node in self.finish if node not in self.critical_path),
+            key=lambda n: self.slack[n],
+        )
+        if off_path:
+            lines.append("slack of other components:")
+            for node in off_path:
+                lines.append(f"  {node.name()}: {self.slack[node]:.2f} s")
+        speedup = sorted(self.speedup_if_ready_instantly().items(), key=lambda item: -item[1])
+        if speedup:
+            lines.append("startup would be faster if ready instantly:")
+            for node, saved in speedup:
+                lines.append(f"  {node.name()}: {saved:.2f} s")
+        for connecting, listening, saved in self.speedup_if_swapped():
+            lines.append(
+                f"startup would be {saved:.2f} s faster if {listening.name()} connected to"
+                f" {connecting.name()} instead of listening"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,116 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Measures how long the event loop is blocked, attributed to the phases of runs.
+
+A sampling task sleeps for a short interval and measures how much later than requested it wakes
+up. The delay is time during which the loop executed other work without yielding, e.g. synchronous
+file system operations, and during which no simulator output was drained. Blocking time is
+accounted to all phases active when it was observed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+import typing
+
+
+class PhaseStats:
+    def __init__(self) -> None:
+        self.blocked: float = 0.0
+        """Total time in seconds the loop was blocked while the phase was active."""
+        self.max_stall: float = 0.0
+        """Longest single stall in seconds."""
+        self.stalls: int = 0
+        self.duration: float = 0.0
+        """Total time in seconds the phase was active, summed over all its instances."""
+
+    def toJSON(self) -> dict:
+        return {
+            "blocked_s": self.blocked,
+            "max_stall_s": self.max_stall,
+            "stalls": self.stalls,
+            "duration_s": self.duration,
+        }
+
+
+class LoopBlockingMonitor:
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005) -> None:
+        self.interval: float = interval
+        """Sampling interval in seconds."""
+        self.threshold: float = threshold
+        """Delays below this are considered scheduling noise and ignored."""
+        self.stats: dict[str, PhaseStats] = {}
+        self._active: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _sample(self) -> None:
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - before - self.interval
+            if lag < self.threshold:
+                continue
+            for name in self._active:
+                stats = self.stats[name]
+                stats.blocked += lag
+                stats.max_stall = max(stats.max_stall, lag)
+                stats.stalls += 1
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        """Attribute blocking observed while the context is active to phase `name`."""
+        self.stats.setdefault(name, PhaseStats())
+        self._active[name] = self._active.get(name, 0) + 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stats[name].duration += time.monotonic() - start
+            self._active[name] -= 1
+            if not self._active[name]:
+                del self._active[name]
+
+    def toJSON(self) -> dict:
+        return {name: stats.toJSON() for name, stats in self.stats.items()}
+
+    def format_report(self) -> str:
+        lines = ["event loop blocking per phase:"]
+        for name, stats in self.stats.items():
+            lines.append(
+                f"  {name}: blocked {stats.blocked:.3f} s of {stats.duration:.1f} s"
+                f" ({stats.stalls} stalls, longest {stats.max_stall * 1000:.0f} ms)"
+            )
+        return "\n".join(lines)
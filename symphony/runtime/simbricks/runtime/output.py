@@ -22,13 +22,22 @@
 
 from __future__ import annotations
 
+import array
 import collections
+import concurrent.futures
 import enum
+import itertools
 import json
+import os
 import pathlib
+import re
+import struct
+import tempfile
 import time
 import typing
 
+from simbricks.runtime import output_stream, profiler_stats, resource_sampler
+
 if typing.TYPE_CHECKING:
     from simbricks.orchestration.instantiation import proxy as inst_proxy
     from simbricks.orchestration.simulation import base as sim_base
@@ -38,41 +47,354 @@ class SimulationExitState(enum.Enum):
     SUCCESS = 0
     FAILED = 1
     INTERRUPTED = 2
+    TIMEOUT = 3
+    """The simulation exceeded `Simulation.timeout`."""
+    STALLED = 4
+    """No simulator made progress for `Simulation.stall_timeout` seconds."""
+
+
+class OutputStream(enum.IntEnum):
+    STDOUT = 0
+    STDERR = 1
+
+
+class OutputRetentionMode(enum.Enum):
+    FULL = "full"
+    """Keep all output in memory."""
+    HEAD_TAIL = "head-tail"
+    """Keep the first and the last lines of output in memory and drop everything in between."""
+    SPILL = "spill"
+    """Keep all output, but move it to a temporary file once it exceeds a size threshold."""
+
+
+class OutputRetention:
+    """Policy for how much of a process' output is retained until it is dumped."""
+
+    def __init__(
+        self,
+        mode: OutputRetentionMode = OutputRetentionMode.FULL,
+        head_lines: int = 1000,
+        tail_lines: int = 10000,
+        spill_threshold: int = 64 * 1024 * 1024,
+        spill_dir: str | None = None,
+    ) -> None:
+        self.mode: OutputRetentionMode = mode
+        self.head_lines: int = head_lines
+        """Number of lines retained at the start of the output in `HEAD_TAIL` mode."""
+        self.tail_lines: int = tail_lines
+        """Number of lines retained at the end of the output in `HEAD_TAIL` mode."""
+        self.spill_threshold: int = spill_threshold
+        """Bytes of output kept in memory per process before spilling it to disk in `SPILL`
+        mode."""
+        self.spill_dir: str | None = spill_dir
+        """Directory for spill files. Defaults to the system's temporary directory."""
+
+    @classmethod
+    def parse(cls, spec: str) -> OutputRetention:
+        """
+        Parses a retention policy from a string, e.g. given on the command line: `full`,
+        `head-tail:HEAD:TAIL` with line counts, or `spill:MB`.
+        """
+        mode_str, *params = spec.split(":")
+        try:
+            mode = OutputRetentionMode(mode_str)
+            match mode:
+                case OutputRetentionMode.FULL if not params:
+                    return cls(mode)
+                case OutputRetentionMode.HEAD_TAIL if len(params) == 2:
+                    return cls(mode, head_lines=int(params[0]), tail_lines=int(params[1]))
+                case OutputRetentionMode.SPILL if len(params) == 1:
+                    return cls(mode, spill_threshold=int(params[0]) * 1024 * 1024)
+        except ValueError:
+            pass
+        raise ValueError(f"invalid output retention policy '{spec}'")
+
+
+class _OutputRecords:
+    """Compact store of output lines: the encoded text of all lines in one buffer plus arrays
+    with the stream, timestamp and end offset of each line."""
+
+    def __init__(self) -> None:
+        self._streams = array.array("B")
+        self._times = array.array("d")
+        self._ends = array.array("Q")
+        self._data = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._ends)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data)
+
+    def append(self, stream: OutputStream, timestamp: float, lines: list[str]) -> None:
+        for line in lines:
+            self._data += line.encode("utf-8", errors="surrogateescape")
+            self._streams.append(stream)
+            self._times.append(timestamp)
+            self._ends.append(len(self._data))
+
+    def drop_front(self, count: int) -> None:
+        if count <= 0:
+            return
+        cut = self._ends[min(count, len(self)) - 1]
+        del self._data[:cut]
+        del self._streams[:count]
+        del self._times[:count]
+        self._ends = array.array("Q", (end - cut for end in self._ends[count:]))
+
+    def records(self) -> typing.Iterator[tuple[OutputStream, float, bytes]]:
+        start = 0
+        for stream, timestamp, end in zip(self._streams, self._times, self._ends):
+            yield OutputStream(stream), timestamp, bytes(self._data[start:end])
+            start = end
+
+
+_SPILL_RECORD_HDR = struct.Struct("<BdI")
+
+_spill_executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+
+def _get_spill_executor() -> concurrent.futures.ThreadPoolExecutor:
+    # a single thread, so that the chunks of each spill file are written in order
+    global _spill_executor
+    if _spill_executor is None:
+        _spill_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="simbricks-spill"
+        )
+    return _spill_executor
+
+
+def _write_spill(file: typing.BinaryIO, records: _OutputRecords) -> None:
+    buf = bytearray()
+    for stream, timestamp, data in records.records():
+        buf += _SPILL_RECORD_HDR.pack(stream, timestamp, len(data))
+        buf += data
+    file.write(buf)
+
+
+def _write_json_list(file: typing.TextIO, items: typing.Iterable[str], indent: str) -> None:
+    """Write `items` as a JSON list formatted like `json.dump(..., indent=2)` at the nesting
+    level of `indent`."""
+    first = True
+    for item in items:
+        file.write(("[\n" if first else ",\n") + indent + "  " + json.dumps(item))
+        first = False
+    file.write("[]" if first else f"\n{indent}]")
 
 
 class ProcessOutput:
-    def __init__(self, cmd: str):
+    """Output of a single process. Every line is stored once together with the stream it was
+    written to and the time it was received. The `stdout`, `stderr` and `merged` views are
+    derived on access."""
+
+    def __init__(self, cmd: str, retention: OutputRetention | None = None):
         self.cmd = cmd
-        self.stdout: list[str] = []
-        self.stderr: list[str] = []
-        self.merged: list[str] = []
+        self.retention: OutputRetention = retention if retention is not None else OutputRetention()
+        self._head: _OutputRecords = _OutputRecords()
+        self._tail: _OutputRecords | None = None
+        """Ring buffer of the last lines in `HEAD_TAIL` mode."""
+        self._omitted: list[int] = [0, 0]
+        """Number of dropped lines per stream in `HEAD_TAIL` mode."""
+        self._spill_file: typing.BinaryIO | None = None
+        self._spill_writes: list[concurrent.futures.Future] = []
+        """Pending writes to the spill file, which happen in a background thread to not block
+        the event loop."""
+        self.stdout_file: str | None = None
+        self.stderr_file: str | None = None
+        """If set, the process wrote its output directly to these files and no lines are
+        retained here."""
+
+    def set_output_files(self, stdout_file: str, stderr_file: str) -> None:
+        self.stdout_file = stdout_file
+        self.stderr_file = stderr_file
+
+    def _append(self, stream: OutputStream, lines: list[str]) -> None:
+        if not lines:
+            return
+        timestamp = time.time()
+        match self.retention.mode:
+            case OutputRetentionMode.FULL:
+                self._head.append(stream, timestamp, lines)
+            case OutputRetentionMode.HEAD_TAIL:
+                head_free = max(self.retention.head_lines - len(self._head), 0)
+                if head_free:
+                    self._head.append(stream, timestamp, lines[:head_free])
+                    lines = lines[head_free:]
+                if lines:
+                    self._append_tail(stream, timestamp, lines)
+            case OutputRetentionMode.SPILL:
+                self._head.append(stream, timestamp, lines)
+                if self._head.nbytes >= self.retention.spill_threshold:
+                    self._spill()
+
+    def _append_tail(self, stream: OutputStream, timestamp: float, lines: list[str]) -> None:
+        keep = self.retention.tail_lines
+        if len(lines) > keep:
+            self._omitted[stream] += len(lines) - keep
+            lines = lines[len(lines) - keep :]
+        if self._tail is None:
+            self._tail = _OutputRecords()
+        self._tail.append(stream, timestamp, lines)
+        # compact only once the buffer holds twice its capacity to amortize the cost
+        excess = len(self._tail) - keep
+        if excess > 0 and len(self._tail) >= 2 * keep:
+            for dropped_stream, _, _ in itertools.islice(self._tail.records(), excess):
+                self._omitted[dropped_stream] += 1
+            self._tail.drop_front(excess)
+
+    def _spill(self) -> None:
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(
+                prefix="simbricks-output-", dir=self.retention.spill_dir
+            )
+        # raise errors of earlier writes
+        for future in self._spill_writes:
+            if future.done():
+                future.result()
+        self._spill_writes = [future for future in self._spill_writes if not future.done()]
+        records, self._head = self._head, _OutputRecords()
+        self._spill_writes.append(
+            _get_spill_executor().submit(_write_spill, self._spill_file, records)
+        )
+
+    def _spilled_records(self) -> typing.Iterator[tuple[OutputStream, float, bytes]]:
+        if self._spill_file is None:
+            return
+        for future in self._spill_writes:
+            future.result()
+        self._spill_writes = []
+        self._spill_file.flush()
+        fd = self._spill_file.fileno()
+        # read with explicit offsets to not disturb the position used for appending
+        offset = 0
+        chunk = b""
+        while True:
+            data = os.pread(fd, 1024 * 1024, offset)
+            if not data:
+                break
+            offset += len(data)
+            chunk += data
+            pos = 0
+            while pos + _SPILL_RECORD_HDR.size <= len(chunk):
+                stream, timestamp, length = _SPILL_RECORD_HDR.unpack_from(chunk, pos)
+                end = pos + _SPILL_RECORD_HDR.size + length
+                if end > len(chunk):
+                    break
+                yield OutputStream(stream), timestamp, chunk[pos + _SPILL_RECORD_HDR.size : end]
+                pos = end
+            chunk = chunk[pos:]
+
+    def _tail_records(self) -> typing.Iterator[tuple[OutputStream, float, bytes]]:
+        if self._tail is None:
+            return iter(())
+        # lines in the ring buffer beyond its capacity are logically dropped already
+        excess = max(len(self._tail) - self.retention.tail_lines, 0)
+        return itertools.islice(self._tail.records(), excess, None)
+
+    def records(self) -> typing.Iterator[tuple[OutputStream, float, str]]:
+        """Iterates over all retained lines in the order they were received as (stream,
+        timestamp, line) tuples."""
+        raw = itertools.chain(self._spilled_records(), self._head.records(), self._tail_records())
+        for stream, timestamp, data in raw:
+            yield stream, timestamp, data.decode("utf-8", errors="surrogateescape")
+
+    def omitted_lines(self, stream: OutputStream | None = None) -> int:
+        """Number of lines dropped due to the retention policy."""
+        omitted = list(self._omitted)
+        if self._tail is not None:
+            excess = max(len(self._tail) - self.retention.tail_lines, 0)
+            for rec_stream, _, _ in itertools.islice(self._tail.records(), excess):
+                omitted[rec_stream] += 1
+        return sum(omitted) if stream is None else omitted[stream]
+
+    def _iter_view(self, stream: OutputStream | None) -> typing.Iterator[str]:
+        def decode(
+            records: typing.Iterable[tuple[OutputStream, float, bytes]],
+        ) -> typing.Iterator[str]:
+            for rec_stream, _, data in records:
+                if stream is None or rec_stream == stream:
+                    yield data.decode("utf-8", errors="surrogateescape")
+
+        yield from decode(itertools.chain(self._spilled_records(), self._head.records()))
+        omitted = self.omitted_lines(stream)
+        if omitted:
+            yield f"[... {omitted} lines omitted ...]"
+        yield from decode(self._tail_records())
+
+    def _view(self, stream: OutputStream | None) -> list[str]:
+        return list(self._iter_view(stream))
+
+    @property
+    def stdout(self) -> list[str]:
+        return self._view(OutputStream.STDOUT)
+
+    @property
+    def stderr(self) -> list[str]:
+        return self._view(OutputStream.STDERR)
+
+    @property
+    def merged(self) -> list[str]:
+        return self._view(None)
 
     def append_stdout(self, lines: list[str]) -> None:
-        self.stdout.extend(lines)
-        self.merged.extend(lines)
+        if self.stdout_file is not None:
+            return
+        self._append(OutputStream.STDOUT, lines)
 
     def append_stderr(self, lines: list[str]) -> None:
-        self.stderr.extend(lines)
-        self.merged.extend(lines)
+        if self.stderr_file is not None:
+            return
+        self._append(OutputStream.STDERR, lines)
 
     def toJSON(self) -> dict:
-        return {
+        json_obj = {
             "cmd": self.cmd,
             "stdout": self.stdout,
             "stderr": self.stderr,
             "merged_output": self.merged,
         }
+        if self.stdout_file is not None:
+            json_obj["stdout_file"] = self.stdout_file
+            json_obj["stderr_file"] = self.stderr_file
+        return json_obj
+
+    def write_json(self, file: typing.TextIO, indent: str) -> None:
+        """Write `toJSON()` to `file` like `json.dump(..., indent=2)` at the nesting level of
+        `indent`. The lines are written one at a time, so the views, e.g. of spilled output, are
+        never held in memory."""
+        inner = indent + "  "
+        file.write(f'{{\n{inner}"cmd": {json.dumps(self.cmd)}')
+        views = (
+            ("stdout", OutputStream.STDOUT),
+            ("stderr", OutputStream.STDERR),
+            ("merged_output", None),
+        )
+        for key, stream in views:
+            file.write(f',\n{inner}"{key}": ')
+            _write_json_list(file, self._iter_view(stream), inner)
+        if self.stdout_file is not None:
+            file.write(f',\n{inner}"stdout_file": {json.dumps(self.stdout_file)}')
+            file.write(f',\n{inner}"stderr_file": {json.dumps(self.stderr_file)}')
+        file.write(f"\n{indent}}}")
+
+
+_PROCESS_PLACEHOLDER = re.compile(r'"\\u0000process-(\d+)\\u0000"')
+"""A process in the JSON output that `SimulationOutput.dump()` writes separately."""
 
 
 class SimulationOutput:
     """Manages an experiment's output."""
 
-    def __init__(self, sim: sim_base.Simulation) -> None:
+    def __init__(self, sim: sim_base.Simulation, retention: OutputRetention | None = None) -> None:
+        self._simulation: sim_base.Simulation = sim
         self._simulation_name: str = sim.name
+        self._retention: OutputRetention | None = retention
         self._start_time: float | None = None
         self._end_time: float | None = None
         self._success: bool = True
         self._interrupted: bool = False
+        self._exit_state: SimulationExitState | None = None
         self._metadata = sim.metadata
         self._generic_prepare_output: dict[str, ProcessOutput] = {}
         self._simulator_output: collections.defaultdict[sim_base.Simulator, list[ProcessOutput]] = (
@@ -81,15 +403,143 @@ class SimulationOutput:
         self._proxy_output: collections.defaultdict[inst_proxy.Proxy, list[ProcessOutput]] = (
             collections.defaultdict(list)
         )
+        self._cpu_assignment: dict[str, list[int]] = {}
+        self._placement: dict | None = None
+        self._stream: output_stream.OutputStreamWriter | None = None
+        self._stream_ids: dict[ProcessOutput, int] = {}
+        self._profiler_stats: profiler_stats.ProfilerStatsCollector | None = None
+        self._resource_sampler: resource_sampler.ResourceSampler | None = None
+
+    @staticmethod
+    def open(path: str) -> output_stream.OutputStreamReader:
+        """Open output written through `stream_to()` for lazy reading."""
+        return output_stream.OutputStreamReader(path)
+
+    def stream_to(
+        self,
+        path: str,
+        compression: output_stream.OutputCompression = output_stream.OutputCompression.GZIP,
+    ) -> None:
+        """Additionally write all output incrementally to `path` in the streaming output format
+        while the simulation runs. Unlike the in-memory output, the stream is not subject to the
+        retention policy."""
+        self._stream = output_stream.OutputStreamWriter(path, compression)
+        self._stream.write(
+            {"type": "simulation", "name": self._simulation_name, "metadata": self._metadata}
+        )
+
+    def enable_profiler_stats(self) -> None:
+        """Parse the statistics simulators print in response to the profiler's SIGUSR1 from
+        their output. Output the simulators write directly to files is not parsed."""
+        self._profiler_stats = profiler_stats.ProfilerStatsCollector(self._simulation)
+
+    @property
+    def profiler_stats(self) -> profiler_stats.ProfilerStatsCollector | None:
+        return self._profiler_stats
+
+    def set_resource_sampler(self, sampler: resource_sampler.ResourceSampler) -> None:
+        """Include the resource usage recorded by `sampler` in the output."""
+        self._resource_sampler = sampler
+
+    @property
+    def resource_sampler(self) -> resource_sampler.ResourceSampler | None:
+        return self._resource_sampler
+
+    def close_stream(self) -> None:
+        """Write the end of the simulation, if it ended, and close the stream. Called once the
+        simulators were terminated, so output they produced during teardown is included."""
+        if self._stream is None:
+            return
+        if self._end_time is not None:
+            assert self._exit_state is not None
+            self._stream.write(
+                {
+                    "type": "end",
+                    "time": self._end_time,
+                    "success": self._success,
+                    "interrupted": self._interrupted,
+                    "exit_state": self._exit_state.name,
+                }
+            )
+        self._stream.close()
+        self._stream = None
+
+    def _new_process(self, kind: str, component: str, cls: str | None, cmd: str) -> ProcessOutput:
+        proc_out = ProcessOutput(cmd, self._retention)
+        if self._stream is not None:
+            proc_id = len(self._stream_ids)
+            self._stream_ids[proc_out] = proc_id
+            self._stream.write(
+                {
+                    "type": "process",
+                    "id": proc_id,
+                    "kind": kind,
+                    "component": component,
+                    "class": cls,
+                    "cmd": cmd,
+                }
+            )
+        return proc_out
+
+    def _set_output_files(
+        self, proc_out: ProcessOutput, stdout_file: str, stderr_file: str
+    ) -> None:
+        proc_out.set_output_files(stdout_file, stderr_file)
+        if self._stream is not None and proc_out in self._stream_ids:
+            self._stream.write(
+                {
+                    "type": "files",
+                    "id": self._stream_ids[proc_out],
+                    "stdout_file": stdout_file,
+                    "stderr_file": stderr_file,
+                }
+            )
+
+    def _append(self, proc_out: ProcessOutput, stream: OutputStream, lines: list[str]) -> None:
+        if stream == OutputStream.STDOUT:
+            proc_out.append_stdout(lines)
+            captured = proc_out.stdout_file is not None
+        else:
+            proc_out.append_stderr(lines)
+            captured = proc_out.stderr_file is not None
+        if self._stream is not None and lines and not captured and proc_out in self._stream_ids:
+            self._stream.write(
+                {
+                    "type": "output",
+                    "id": self._stream_ids[proc_out],
+                    "stream": int(stream),
+                    "time": time.time(),
+                    "lines": lines,
+                }
+            )
+
+    def set_cpu_assignment(
+        self, assignment: dict[sim_base.Simulator, list[int]], placement: dict | None = None
+    ) -> None:
+        """Record the cores each simulator was pinned to and optionally the placement report
+        from `cpu_alloc.placement_report()`."""
+        self._cpu_assignment = {sim.full_name(): cores for sim, cores in assignment.items()}
+        self._placement = placement
+        if self._stream is not None:
+            self._stream.write(
+                {
+                    "type": "cpu_assignment",
+                    "assignment": self._cpu_assignment,
+                    "placement": self._placement,
+                }
+            )
 
     def is_ended(self) -> bool:
         return self._end_time is not None or self._interrupted
 
     def set_start(self) -> None:
         self._start_time = time.time()
+        if self._stream is not None:
+            self._stream.write({"type": "start", "time": self._start_time})
 
     def set_end(self, exit_state: SimulationExitState) -> None:
         self._end_time = time.time()
+        self._exit_state = exit_state
         match exit_state:
             case SimulationExitState.SUCCESS:
                 self._success = True
@@ -98,65 +548,106 @@ class SimulationOutput:
             case SimulationExitState.INTERRUPTED:
                 self._success = False
                 self._interrupted = True
+            case SimulationExitState.TIMEOUT | SimulationExitState.STALLED:
+                self._success = False
             case _:
                 raise RuntimeError("Unknown simulation exit state")
 
     def failed(self) -> bool:
         return not self._success
 
+    @property
+    def exit_state(self) -> SimulationExitState | None:
+        return self._exit_state
+
     # generic prepare command execution
     def add_generic_prepare_cmd(self, cmd: str) -> None:
-        self._generic_prepare_output[cmd] = ProcessOutput(cmd)
+        self._generic_prepare_output[cmd] = self._new_process(
+            "prepare", "generic_prepare", None, cmd
+        )
 
     def generic_prepare_cmd_stdout(self, cmd: str, lines: list[str]) -> None:
         assert cmd in self._generic_prepare_output
-        self._generic_prepare_output[cmd].append_stdout(lines)
+        self._append(self._generic_prepare_output[cmd], OutputStream.STDOUT, lines)
 
     def generic_prepare_cmd_stderr(self, cmd: str, lines: list[str]) -> None:
         assert cmd in self._generic_prepare_output
-        self._generic_prepare_output[cmd].append_stderr(lines)
+        self._append(self._generic_prepare_output[cmd], OutputStream.STDERR, lines)
 
     # simulator execution
     def set_simulator_cmd(self, sim: sim_base.Simulator, cmd: str) -> None:
-        self._simulator_output[sim].append(ProcessOutput(cmd))
+        self._simulator_output[sim].append(
+            self._new_process("simulator", sim.full_name(), sim.__class__.__name__, cmd)
+        )
+
+    def set_simulator_output_files(
+        self, sim: sim_base.Simulator, stdout_file: str, stderr_file: str
+    ) -> None:
+        assert sim in self._simulator_output
+        assert self._simulator_output[sim]
+        self._set_output_files(self._simulator_output[sim][-1], stdout_file, stderr_file)
 
     def append_simulator_stdout(self, sim: sim_base.Simulator, lines: list[str]) -> None:
         assert sim in self._simulator_output
         assert self._simulator_output[sim]
-        self._simulator_output[sim][-1].append_stdout(lines)
+        self._append(self._simulator_output[sim][-1], OutputStream.STDOUT, lines)
+        if self._profiler_stats is not None:
+            self._profiler_stats.parse(sim, lines, time.time())
 
     def append_simulator_stderr(self, sim: sim_base.Simulator, lines: list[str]) -> None:
         assert sim in self._simulator_output
         assert self._simulator_output[sim]
-        self._simulator_output[sim][-1].append_stderr(lines)
+        self._append(self._simulator_output[sim][-1], OutputStream.STDERR, lines)
+        if self._profiler_stats is not None:
+            self._profiler_stats.parse(sim, lines, time.time())
 
     def set_proxy_cmd(self, proxy: inst_proxy.Proxy, cmd: str) -> None:
-        self._proxy_output[proxy].append(ProcessOutput(cmd))
+        self._proxy_output[proxy].append(
+            self._new_process("proxy", proxy.name, proxy.__class__.__name__, cmd)
+        )
+
+    def set_proxy_output_files(
+        self, proxy: inst_proxy.Proxy, stdout_file: str, stderr_file: str
+    ) -> None:
+        assert proxy in self._proxy_output
+        self._set_output_files(self._proxy_output[proxy][-1], stdout_file, stderr_file)
 
     def append_proxy_stdout(self, proxy: inst_proxy.Proxy, lines: list[str]) -> None:
         assert proxy in self._proxy_output
-        self._proxy_output[proxy][-1].append_stdout(lines)
+        self._append(self._proxy_output[proxy][-1], OutputStream.STDOUT, lines)
 
     def append_proxy_stderr(self, proxy: inst_proxy.Proxy, lines: list[str]) -> None:
         assert proxy in self._proxy_output
-        self._proxy_output[proxy][-1].append_stderr(lines)
+        self._append(self._proxy_output[proxy][-1], OutputStream.STDERR, lines)
 
     def toJSON(self) -> dict:
+        return self._to_json(ProcessOutput.toJSON)
+
+    def _to_json(self, process_json: typing.Callable[[ProcessOutput], typing.Any]) -> dict:
         json_obj = {}
         json_obj["_sim_name"] = self._simulation_name
         json_obj["_start_time"] = self._start_time
         json_obj["_end_time"] = self._end_time
         json_obj["_success"] = self._success
         json_obj["_interrupted"] = self._interrupted
+        json_obj["_exit_state"] = self._exit_state.name if self._exit_state else None
         json_obj["_metadata"] = self._metadata
+        if self._cpu_assignment:
+            json_obj["_cpu_assignment"] = self._cpu_assignment
+        if self._placement is not None:
+            json_obj["_placement"] = self._placement
+        if self._profiler_stats is not None:
+            json_obj["_profiler_stats"] = self._profiler_stats.toJSON()
+        if self._resource_sampler is not None:
+            json_obj["_resource_usage"] = self._resource_sampler.toJSON()
         json_obj_out_list = []
         for _, proc_out in self._generic_prepare_output.items():
-            json_obj_out_list.append(proc_out.toJSON())
+            json_obj_out_list.append(process_json(proc_out))
         json_obj["generic_prepare"] = json_obj_out_list
         for sim, proc_list in self._simulator_output.items():
             json_obj_out_list = []
             for proc_out in proc_list:
-                json_obj_out_list.append(proc_out.toJSON())
+                json_obj_out_list.append(process_json(proc_out))
             json_obj[sim.full_name()] = {
                 "class": sim.__class__.__name__,
                 "output": json_obj_out_list,
@@ -164,13 +655,37 @@ class SimulationOutput:
         for proxy, proc_list in self._proxy_output.items():
             json_obj_out_list = []
             for proc_out in proc_list:
-                json_obj_out_list.append(proc_out.toJSON())
+                json_obj_out_list.append(process_json(proc_out))
             json_obj[proxy.name] = {"class": proxy.__class__.__name__, "output": json_obj_out_list}
 
         return json_obj
 
     def dump(self, outpath: str) -> None:
-        json_obj = self.toJSON()
+        """Write the output as JSON to `outpath`, in the format of `toJSON()`. The output of the
+        processes is written line by line instead of building it in memory first."""
+        self.close_stream()
+        # processes are represented by placeholders that are replaced while writing
+        processes: list[ProcessOutput] = []
+
+        def placeholder(proc_out: ProcessOutput) -> str:
+            processes.append(proc_out)
+            return f"\0process-{len(processes) - 1}\0"
+
+        json_obj = self._to_json(placeholder)
         pathlib.Path(outpath).parent.mkdir(parents=True, exist_ok=True)
         with open(outpath, "w", encoding="utf-8") as file:
-            json.dump(json_obj, file, indent=2)
+            # the last line written so far, for the indentation of processes
+            line = ""
+            for chunk in json.JSONEncoder(indent=2).iterencode(json_obj):
+                pos = 0
+                for match in _PROCESS_PLACEHOLDER.finditer(chunk):
+                    text = chunk[pos : match.start()]
+                    file.write(text)
+                    line = (line + text).rsplit("\n", 1)[-1]
+                    indent = line[: len(line) - len(line.lstrip(" "))]
+                    processes[int(match.group(1))].write_json(file, indent)
+                    line = indent + "}"
+                    pos = match.end()
+                text = chunk[pos:]
+                file.write(text)
+                line = (line + text).rsplit("\n", 1)[-1]
@@ -0,0 +1,407 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Streaming on-disk format for simulation output.
+
+The output is written incrementally during the run as newline-delimited JSON records. Records are
+grouped into chunks that are compressed independently (concatenated gzip members or zstd frames
+still form a valid file) and listed in a small index file next to the output, together with the
+time range of the output they contain. Readers use the index to find processes and to seek to a
+point in time without decompressing the whole file.
+
+Record types:
+
+- ``simulation``: name and metadata of the simulation
+- ``start`` / ``end``: start and end time, plus the exit state for ``end``
+- ``process``: a started process (``id``, ``kind``, ``component``, ``class``, ``cmd``)
+- ``files``: log files of a process that wrote its output directly to files
+- ``cpu_assignment``: cores each simulator was pinned to, by simulator name, and the placement
+  report if the cores were placed according to the CPU topology
+- ``output``: a batch of ``lines`` of process ``id`` written to ``stream`` (0 = stdout,
+  1 = stderr), received at ``time``
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import enum
+import gzip
+import json
+import os
+import pathlib
+import typing
+
+
+class OutputCompression(enum.Enum):
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+    @property
+    def suffix(self) -> str:
+        match self:
+            case OutputCompression.NONE:
+                return ".ndjson"
+            case OutputCompression.GZIP:
+                return ".ndjson.gz"
+            case OutputCompression.ZSTD:
+                return ".ndjson.zst"
+
+    @classmethod
+    def from_path(cls, path: str) -> OutputCompression:
+        for compression in (cls.GZIP, cls.ZSTD):
+            if path.endswith(compression.suffix):
+                return compression
+        return cls.NONE
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compressed output requires the 'zstandard' package")
+    return zstandard
+
+
+def _compress(data: bytes, compression: OutputCompression) -> bytes:
+    match compression:
+        case OutputCompression.NONE:
+            return data
+        case OutputCompression.GZIP:
+            return gzip.compress(data, compresslevel=6)
+        case OutputCompression.ZSTD:
+            return _zstandard().ZstdCompressor().compress(data)
+
+
+def _decompress(data: bytes, compression: OutputCompression) -> bytes:
+    match compression:
+        case OutputCompression.NONE:
+            return data
+        case OutputCompression.GZIP:
+            return gzip.decompress(data)
+        case OutputCompression.ZSTD:
+            return _zstandard().ZstdDecompressor().decompress(data)
+
+
+def index_path(path: str) -> str:
+    return f"{path}.idx"
+
+
+_HEADER_TYPES = frozenset(("simulation", "start", "end", "process", "files", "cpu_assignment"))
+
+
+class OutputStreamWriter:
+    """Appends output records to a streaming output file.
+
+    Chunks are compressed and written, in order, by a background thread of the writer, so that
+    writing does not block the event loop draining the output of simulators."""
+
+    def __init__(
+        self,
+        path: str,
+        compression: OutputCompression = OutputCompression.GZIP,
+        chunk_size: int = 1024 * 1024,
+    ) -> None:
+        self.path: str = path
+        self.compression: OutputCompression = compression
+        self._chunk_size: int = chunk_size
+        """Uncompressed size after which buffered records are written out as a chunk."""
+        self._buf: list[bytes] = []
+        self._buf_size: int = 0
+        self._first_time: float | None = None
+        self._last_time: float | None = None
+        self._offset: int = 0
+        """Offset of the next chunk in the file, only used by the writer thread."""
+        self._file: typing.BinaryIO | None = None
+        self._index: typing.TextIO | None = None
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._pending: list[concurrent.futures.Future] = []
+
+    def _open(self) -> None:
+        pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._index = open(index_path(self.path), "w", encoding="utf-8")
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="simbricks-output-stream"
+        )
+
+    def _submit(self, func: typing.Callable[..., None], *args) -> None:
+        """Run `func` on the writer thread after all earlier submitted work. Raises errors of
+        work that already completed."""
+        assert self._executor is not None
+        still_pending = []
+        for future in self._pending:
+            if future.done():
+                future.result()
+            else:
+                still_pending.append(future)
+        still_pending.append(self._executor.submit(func, *args))
+        self._pending = still_pending
+
+    def _write_index(self, line: str) -> None:
+        assert self._index is not None
+        self._index.write(line)
+
+    def write(self, record: dict) -> None:
+        if self._file is None:
+            self._open()
+        if record["type"] in _HEADER_TYPES:
+            # also kept in the index, so readers can list processes without touching the data
+            self._submit(self._write_index, json.dumps(record) + "\n")
+        if record["type"] == "output":
+            if self._first_time is None:
+                self._first_time = record["time"]
+            self._last_time = record["time"]
+        data = (json.dumps(record) + "\n").encode("utf-8")
+        self._buf.append(data)
+        self._buf_size += len(data)
+        if self._buf_size >= self._chunk_size:
+            self.flush()
+
+    def _write_chunk(self, data: bytes, first_time: float | None, last_time: float | None) -> None:
+        assert self._file is not None and self._index is not None
+        chunk = _compress(data, self.compression)
+        self._file.write(chunk)
+        self._file.flush()
+        self._index.write(
+            json.dumps(
+                {
+                    "type": "chunk",
+                    "offset": self._offset,
+                    "length": len(chunk),
+                    "first_time": first_time,
+                    "last_time": last_time,
+                }
+            )
+            + "\n"
+        )
+        self._index.flush()
+        self._offset += len(chunk)
+
+    def flush(self) -> None:
+        if not self._buf:
+            return
+        self._submit(self._write_chunk, b"".join(self._buf), self._first_time, self._last_time)
+        self._buf = []
+        self._buf_size = 0
+        self._first_time = None
+        self._last_time = None
+
+    def close(self) -> None:
+        """Write out the remaining records and wait until everything is written."""
+        if self._file is None:
+            return
+        self.flush()
+        assert self._executor is not None and self._index is not None
+        self._executor.shutdown(wait=True)
+        try:
+            for future in self._pending:
+                future.result()
+        finally:
+            self._file.close()
+            self._index.close()
+            self._file = None
+            self._index = None
+            self._executor = None
+            self._pending = []
+
+
+class ProcessInfo:
+    def __init__(self, record: dict) -> None:
+        self.id: int = record["id"]
+        self.kind: str = record["kind"]
+        """One of `prepare`, `simulator` or `proxy`."""
+        self.component: str = record["component"]
+        self.cls: str | None = record.get("class")
+        self.cmd: str = record["cmd"]
+        self.stdout_file: str | None = None
+        self.stderr_file: str | None = None
+
+
+class OutputLine(typing.NamedTuple):
+    process: ProcessInfo
+    stream: int
+    time: float
+    line: str
+
+
+class OutputStreamReader:
+    """Lazily reads a streaming output file. Obtain through `SimulationOutput.open()`."""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.compression: OutputCompression = OutputCompression.from_path(path)
+        self.simulation_name: str | None = None
+        self.metadata: dict = {}
+        self.start_time: float | None = None
+        self.end_time: float | None = None
+        self.success: bool | None = None
+        self.interrupted: bool | None = None
+        self.exit_state: str | None = None
+        self.processes: dict[int, ProcessInfo] = {}
+        self.cpu_assignment: dict[str, list[int]] = {}
+        self.placement: dict | None = None
+        self._chunks: list[dict] | None = None
+        """Chunks listed in the index, `None` if there is no index."""
+        self._load_header()
+
+    def _apply_header(self, record: dict) -> None:
+        match record["type"]:
+            case "simulation":
+                self.simulation_name = record["name"]
+                self.metadata = record["metadata"]
+            case "start":
+                self.start_time = record["time"]
+            case "end":
+                self.end_time = record["time"]
+                self.success = record["success"]
+                self.interrupted = record["interrupted"]
+                self.exit_state = record.get("exit_state")
+            case "process":
+                self.processes[record["id"]] = ProcessInfo(record)
+            case "cpu_assignment":
+                self.cpu_assignment = record["assignment"]
+                self.placement = record.get("placement")
+            case "files":
+                proc = self.processes[record["id"]]
+                proc.stdout_file = record["stdout_file"]
+                proc.stderr_file = record["stderr_file"]
+
+    def _load_header(self) -> None:
+        idx = index_path(self.path)
+        if not os.path.exists(idx):
+            # no index, e.g. the file was copied on its own, so scan the data once
+            for record in self._scan():
+                if record["type"] in _HEADER_TYPES:
+                    self._apply_header(record)
+            return
+
+        self._chunks = []
+        with open(idx, encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                if record["type"] == "chunk":
+                    self._chunks.append(record)
+                else:
+                    self._apply_header(record)
+
+    def _scan(self) -> typing.Iterator[dict]:
+        match self.compression:
+            case OutputCompression.NONE:
+                file = open(self.path, "rb")
+            case OutputCompression.GZIP:
+                file = gzip.open(self.path, "rb")
+            case OutputCompression.ZSTD:
+                raw = open(self.path, "rb")
+                file = _zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        with file:
+            for line in typing.cast(typing.IO[bytes], file):
+                yield json.loads(line)
+
+    def _records(self, start_time: float | None) -> typing.Iterator[dict]:
+        if self._chunks is None:
+            yield from self._scan()
+            return
+        with open(self.path, "rb") as file:
+            for chunk in self._chunks:
+                last = chunk["last_time"]
+                if start_time is not None and last is not None and last < start_time:
+                    continue
+                file.seek(chunk["offset"])
+                data = _decompress(file.read(chunk["length"]), self.compression)
+                for line in data.splitlines():
+                    yield json.loads(line)
+
+    def components(self) -> list[str]:
+        return list(dict.fromkeys(proc.component for proc in self.processes.values()))
+
+    def lines(
+        self,
+        component: str | None = None,
+        stream: int | None = None,
+        start_time: float | None = None,
+        end_time: float | None = None,
+    ) -> typing.Iterator[OutputLine]:
+        """
+        Iterate over output lines in the order they were received, optionally only of one
+        component (simulator full name, proxy name or `generic_prepare`), one stream, or within
+        a time range. Chunks before `start_time` are skipped without decompressing them.
+        """
+        for record in self._records(start_time):
+            if record["type"] != "output":
+                continue
+            proc = self.processes[record["id"]]
+            if component is not None and proc.component != component:
+                continue
+            if stream is not None and record["stream"] != stream:
+                continue
+            timestamp = record["time"]
+            if start_time is not None and timestamp < start_time:
+                continue
+            if end_time is not None and timestamp > end_time:
+                # records are in receive order, nothing later can match
+                return
+            for line in record["lines"]:
+                yield OutputLine(proc, record["stream"], timestamp, line)
+
+    def toJSON(self) -> dict:
+        """Returns the output in the format of `SimulationOutput.toJSON()`, e.g. to export it as
+        `out.json`. This loads all output into memory."""
+        out: dict[int, dict[str, list[str]]] = {
+            proc_id: {"stdout": [], "stderr": [], "merged_output": []} for proc_id in self.processes
+        }
+        for record in self._records(None):
+            if record["type"] != "output":
+                continue
+            proc_out = out[record["id"]]
+            proc_out["stdout" if record["stream"] == 0 else "stderr"].extend(record["lines"])
+            proc_out["merged_output"].extend(record["lines"])
+
+        json_obj: dict[str, typing.Any] = {
+            "_sim_name": self.simulation_name,
+            "_start_time": self.start_time,
+            "_end_time": self.end_time,
+            "_success": self.success,
+            "_interrupted": self.interrupted,
+            "_exit_state": self.exit_state,
+            "_metadata": self.metadata,
+            "generic_prepare": [],
+        }
+        if self.cpu_assignment:
+            json_obj["_cpu_assignment"] = self.cpu_assignment
+        if self.placement is not None:
+            json_obj["_placement"] = self.placement
+        for proc in self.processes.values():
+            proc_json: dict[str, typing.Any] = {"cmd": proc.cmd, **out[proc.id]}
+            if proc.stdout_file is not None:
+                proc_json["stdout_file"] = proc.stdout_file
+                proc_json["stderr_file"] = proc.stderr_file
+            if proc.kind == "prepare":
+                json_obj["generic_prepare"].append(proc_json)
+                continue
+            comp = json_obj.setdefault(proc.component, {"class": proc.cls, "output": []})
+            comp["output"].append(proc_json)
+        return json_obj
+
+    def export_json(self, outpath: str) -> None:
+        pathlib.Path(outpath).parent.mkdir(parents=True, exist_ok=True)
+        with open(outpath, "w", encoding="utf-8") as file:
+            json.dump(self.toJSON(), file, indent=2)
@@ -0,0 +1,232 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Statistics that simulators print in response to the profiler's SIGUSR1, as time series.
+
+SimBricks adapters report, per runner, the current simulation time (`main_time`) and for each
+interface the timestamps of the last message received from (`in_timestamp`) and sent to
+(`out_timestamp`) the peer, all in picoseconds. On exit, they additionally report poll and
+synchronization counters. Every report is recorded together with the wall-clock time it was
+received.
+
+In a synchronized simulation, a simulator may not advance past the `in_timestamp` of any of its
+interfaces. A report with `main_time >= in_timestamp` therefore shows the simulator waiting on
+the peer of that interface. The fraction of such reports per channel approximates the share of
+time spent waiting on the peer, and the simulator that its peers wait on most is the one
+limiting the speed of the simulation.
+"""
+
+from __future__ import annotations
+
+import collections
+import re
+import typing
+
+from simbricks.orchestration import system as sys_conf
+
+if typing.TYPE_CHECKING:
+    from simbricks.orchestration.simulation import base as sim_base
+
+_MAIN_TIME_RE = re.compile(r"\[Runner (\S+)\] main_time = (\d+)")
+_TIMESTAMP_RE = re.compile(r"\b(\w+)_(in|out)_timestamp = (\d+)")
+_COUNTER_RE = re.compile(r"\b(\w+_(?:total|suc|sync)):\s+(\d+)")
+_EXIT_MAIN_TIME_RE = re.compile(r"exit main_time: (\d+)")
+
+_INTERFACE_CHANNELS: dict[str, type[sys_conf.Channel]] = {
+    "net": sys_conf.EthChannel,
+    "pci": sys_conf.PCIeChannel,
+}
+"""Channel type of each interface name used in the adapter statistics."""
+
+_COUNTER_INTERFACES = {"h2d": "pci", "n2d": "net"}
+"""Interface each poll counter prefix refers to."""
+
+
+class SimulatorProfilerStats:
+    """Profiler statistics parsed from the output of one simulator."""
+
+    def __init__(self) -> None:
+        self.samples: list[dict] = []
+        """One entry per runner and report with the keys `time` (wall-clock time the report was
+        received), `runner`, `main_time` and `interfaces`, which maps interface names to their
+        `in` and `out` timestamps."""
+        self.counters: dict[str, int] = {}
+        """Counters reported when the simulator exits, e.g. `h2d_poll_total`."""
+
+    def parse(self, lines: list[str], timestamp: float) -> None:
+        for line in lines:
+            if "main_time" in line:
+                match = _MAIN_TIME_RE.search(line)
+                if match:
+                    self.samples.append(
+                        {
+                            "time": timestamp,
+                            "runner": match[1],
+                            "main_time": int(match[2]),
+                            "interfaces": {},
+                        }
+                    )
+                    continue
+                match = _EXIT_MAIN_TIME_RE.search(line)
+                if match:
+                    self.counters["exit_main_time"] = int(match[1])
+            elif "_timestamp = " in line:
+                match = _TIMESTAMP_RE.search(line)
+                if match and self.samples:
+                    interfaces = self.samples[-1]["interfaces"]
+                    interfaces.setdefault(match[1], {})[match[2]] = int(match[3])
+            elif "_total:" in line or "_sync:" in line:
+                for name, value in _COUNTER_RE.findall(line):
+                    self.counters[name] = int(value)
+
+    def progress_rate(self) -> float | None:
+        """Simulated picoseconds per wall-clock second between the first and the last report,
+        or `None` with fewer than two reports."""
+        if not self.samples:
+            return None
+        runner = self.samples[0]["runner"]
+        samples = [s for s in self.samples if s["runner"] == runner]
+        first, last = samples[0], samples[-1]
+        if last["time"] <= first["time"]:
+            return None
+        return (last["main_time"] - first["main_time"]) / (last["time"] - first["time"])
+
+    def waiting(self) -> dict[str, tuple[int, int]]:
+        """Number of reports showing the simulator waiting on the peer and the total number of
+        reports, per interface."""
+        waiting: dict[str, list[int]] = collections.defaultdict(lambda: [0, 0])
+        for sample in self.samples:
+            for iface, timestamps in sample["interfaces"].items():
+                if "in" not in timestamps:
+                    continue
+                counts = waiting[iface]
+                counts[0] += int(sample["main_time"] >= timestamps["in"])
+                counts[1] += 1
+        return {iface: (counts[0], counts[1]) for iface, counts in waiting.items()}
+
+    def toJSON(self) -> dict:
+        return {
+            "samples": self.samples,
+            "counters": self.counters,
+            "progress_rate": self.progress_rate(),
+        }
+
+
+class ProfilerStatsCollector:
+    """Collects the profiler statistics of all simulators of a simulation."""
+
+    def __init__(self, simulation: sim_base.Simulation) -> None:
+        self._simulation: sim_base.Simulation = simulation
+        self._stats: dict[sim_base.Simulator, SimulatorProfilerStats] = {}
+
+    def parse(self, sim: sim_base.Simulator, lines: list[str], timestamp: float) -> None:
+        if sim not in self._stats:
+            self._stats[sim] = SimulatorProfilerStats()
+        self._stats[sim].parse(lines, timestamp)
+
+    def stats(self, sim: sim_base.Simulator) -> SimulatorProfilerStats | None:
+        return self._stats.get(sim)
+
+    def _peer(self, sim: sim_base.Simulator, iface: str) -> sim_base.Simulator | None:
+        """The simulator at the other end of interface `iface` of `sim`. `None` if the interface
+        is not synchronized or cannot be mapped to a single channel, e.g. for multiple NICs
+        simulated by one process."""
+        chan_type = _INTERFACE_CHANNELS.get(iface)
+        if chan_type is None:
+            return None
+        channels = [chan for chan in sim.get_channels() if isinstance(chan.sys_channel, chan_type)]
+        if len(channels) != 1 or not channels[0]._synchronized:
+            return None
+        components = sim.components()
+        for sys_iface in channels[0].sys_channel.interfaces():
+            if sys_iface.component not in components:
+                return self._simulation.find_sim(sys_iface.component)
+        return None
+
+    def channel_summary(self) -> list[dict]:
+        """For each interface of each simulator that reported statistics, the peer and the
+        fraction of reports in which the simulator was waiting on it."""
+        summary = []
+        for sim, stats in self._stats.items():
+            for iface, (waiting, total) in stats.waiting().items():
+                peer = self._peer(sim, iface)
+                entry = {
+                    "simulator": sim.full_name(),
+                    "interface": iface,
+                    "peer": peer.full_name() if peer is not None else None,
+                    "samples": total,
+                    "waiting_on_peer": waiting / total,
+                }
+                for prefix, counter_iface in _COUNTER_INTERFACES.items():
+                    successful = stats.counters.get(f"{prefix}_poll_suc")
+                    if counter_iface == iface and successful:
+                        entry["sync_msg_ratio"] = stats.counters[f"{prefix}_poll_sync"] / successful
+                summary.append(entry)
+        return summary
+
+    def slowest_simulator(self) -> sim_base.Simulator | None:
+        """The simulator that its peers wait on most. Without any waiting attributed to a peer,
+        the simulator with the lowest progress rate."""
+        waited_on: dict[sim_base.Simulator, float] = collections.defaultdict(float)
+        for sim, stats in self._stats.items():
+            for iface, (waiting, total) in stats.waiting().items():
+                peer = self._peer(sim, iface)
+                if peer is not None and waiting:
+                    waited_on[peer] += waiting / total
+        if waited_on:
+            return max(waited_on, key=lambda sim: waited_on[sim])
+
+        rates = {}
+        for sim, stats in self._stats.items():
+            rate = stats.progress_rate()
+            if rate is not None:
+                rates[sim] = rate
+        if rates:
+            return min(rates, key=lambda sim: rates[sim])
+        return None
+
+    def format_summary(self) -> str:
+        lines = []
+        for entry in self.channel_summary():
+            peer = entry["peer"] if entry["peer"] is not None else "unknown peer"
+            line = (
+                f"{entry['simulator']} [{entry['interface']}] waiting on {peer}:"
+                f" {entry['waiting_on_peer'] * 100:.1f}% of {entry['samples']} samples"
+            )
+            if "sync_msg_ratio" in entry:
+                line += f", {entry['sync_msg_ratio'] * 100:.1f}% sync messages"
+            lines.append(line)
+        slowest = self.slowest_simulator()
+        if slowest is not None:
+            lines.append(f"slowest simulator: {slowest.full_name()}")
+        return "\n".join(lines)
+
+    def toJSON(self) -> dict:
+        slowest = self.slowest_simulator()
+        return {
+            "simulators": {
+                sim.full_name(): stats.toJSON()
+                for sim, stats in self._stats.items()
+                if stats.samples or stats.counters
+            },
+            "channels": self.channel_summary(),
+            "slowest_simulator": slowest.full_name() if slowest is not None else None,
+        }
@@ -0,0 +1,244 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Periodic sampling of the resource usage of simulator and proxy processes from `/proc`.
+
+Each sample reads `/proc/<pid>/stat` (CPU time), `status` (resident memory and context
+switches), `io` (bytes read from and written to storage) and the `schedstat` of every thread
+(time spent runnable but waiting for a CPU). The series are stored as columns to keep the
+simulation output compact. A process that on average spends more than `STARVED_THRESHOLD` of
+the wall-clock time waiting for a CPU is flagged as CPU-starved.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+
+STARVED_THRESHOLD = 0.1
+"""Average fraction of wall-clock time spent runnable but not running above which a process is
+considered CPU-starved. Summed over the process' threads."""
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def read_proc_usage(pid: int) -> dict[str, int] | None:
+    """Cumulative resource usage of process `pid`, or `None` if it does not exist anymore.
+    Counters that cannot be read, e.g. `io` of processes owned by other users, are omitted."""
+    stat = _read(f"/proc/{pid}/stat")
+    if stat is None:
+        return None
+    # the command name in parentheses may contain spaces
+    fields = stat[stat.rindex(")") + 2 :].split()
+    if fields[0] == "Z":
+        return None
+    usage = {
+        "cpu_time_ns": (int(fields[11]) + int(fields[12])) * 1_000_000_000 // _CLK_TCK,
+        "threads": int(fields[17]),
+    }
+
+    status = _read(f"/proc/{pid}/status")
+    if status is not None:
+        for line in status.splitlines():
+            key, _, value = line.partition(":")
+            match key:
+                case "VmRSS":
+                    usage["rss"] = int(value.split()[0]) * 1024
+                case "voluntary_ctxt_switches":
+                    usage["voluntary_ctxt_switches"] = int(value)
+                case "nonvoluntary_ctxt_switches":
+                    usage["nonvoluntary_ctxt_switches"] = int(value)
+
+    io = _read(f"/proc/{pid}/io")
+    if io is not None:
+        for line in io.splitlines():
+            key, _, value = line.partition(":")
+            if key in ("read_bytes", "write_bytes"):
+                usage[key] = int(value)
+
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        tids = []
+    run_delay = None
+    for tid in tids:
+        schedstat = _read(f"/proc/{pid}/task/{tid}/schedstat")
+        if schedstat is not None:
+            run_delay = (run_delay or 0) + int(schedstat.split()[1])
+    if run_delay is not None:
+        usage["run_delay_ns"] = run_delay
+    return usage
+
+
+class ProcessResourceUsage:
+    """Resource usage time series of one process."""
+
+    def __init__(self, resreq_cores: int | None = None, resreq_mem: int | None = None) -> None:
+        self.resreq_cores: int | None = resreq_cores
+        self.resreq_mem: int | None = resreq_mem
+        """Resources the process was expected to require, memory in MB."""
+        self.series: dict[str, list] = {
+            "time": [],
+            "cpu": [],
+            "rss": [],
+            "read_bytes": [],
+            "write_bytes": [],
+            "ctxt_switches": [],
+            "runqueue_wait": [],
+        }
+        """Per sample: wall-clock time, CPU utilization in cores and fraction of time spent
+        waiting for a CPU since the previous sample, resident memory in bytes, and the
+        cumulative bytes read and written and context switches."""
+        self._last: tuple[float, dict[str, int]] | None = None
+        self._totals: dict[str, int] = {}
+        self._start: float | None = None
+        self._start_usage: dict[str, int] = {}
+
+    def add(self, timestamp: float, usage: dict[str, int]) -> None:
+        if self._last is None:
+            self._start = timestamp
+            self._start_usage = usage
+            self._last = (timestamp, usage)
+            return
+        last_time, last_usage = self._last
+        elapsed = timestamp - last_time
+        if elapsed <= 0:
+            return
+        self._last = (timestamp, usage)
+        self._totals = usage
+
+        def rate(key: str) -> float | None:
+            if key not in usage or key not in last_usage:
+                return None
+            return round((usage[key] - last_usage[key]) / 1e9 / elapsed, 3)
+
+        self.series["time"].append(timestamp)
+        self.series["cpu"].append(rate("cpu_time_ns"))
+        self.series["runqueue_wait"].append(rate("run_delay_ns"))
+        self.series["rss"].append(usage.get("rss"))
+        self.series["read_bytes"].append(usage.get("read_bytes"))
+        self.series["write_bytes"].append(usage.get("write_bytes"))
+        ctxt_switches = None
+        if "voluntary_ctxt_switches" in usage:
+            ctxt_switches = usage["voluntary_ctxt_switches"] + usage["nonvoluntary_ctxt_switches"]
+        self.series["ctxt_switches"].append(ctxt_switches)
+
+    def _mean(self, key: str) -> float | None:
+        """Mean of a rate over the whole sampling period."""
+        if self._start is None or self._last is None or self._last[0] <= self._start:
+            return None
+        if key not in self._totals or key not in self._start_usage:
+            return None
+        delta = self._totals[key] - self._start_usage[key]
+        return round(delta / 1e9 / (self._last[0] - self._start), 3)
+
+    def summary(self) -> dict:
+        def peak(values: list) -> float | int | None:
+            values = [v for v in values if v is not None]
+            return max(values) if values else None
+
+        rss = [v for v in self.series["rss"] if v is not None]
+        runqueue_wait = self._mean("run_delay_ns")
+        summary = {
+            "samples": len(self.series["time"]),
+            "cpu_mean": self._mean("cpu_time_ns"),
+            "cpu_peak": peak(self.series["cpu"]),
+            "rss_mean": sum(rss) // len(rss) if rss else None,
+            "rss_peak": peak(rss),
+            "runqueue_wait_mean": runqueue_wait,
+            "runqueue_wait_peak": peak(self.series["runqueue_wait"]),
+            "starved": runqueue_wait is not None and runqueue_wait > STARVED_THRESHOLD,
+            "resreq_cores": self.resreq_cores,
+            "resreq_mem": self.resreq_mem,
+        }
+        for key in ("read_bytes", "write_bytes"):
+            if key in self._totals and key in self._start_usage:
+                summary[key] = self._totals[key] - self._start_usage[key]
+        if "voluntary_ctxt_switches" in self._totals:
+            for key in ("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches"):
+                summary[key] = self._totals[key] - self._start_usage.get(key, 0)
+        return summary
+
+    def toJSON(self) -> dict:
+        return {"summary": self.summary(), "series": self.series}
+
+
+class ResourceSampler:
+    """Samples the resource usage of a set of processes."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval: float = interval
+        """Seconds between samples."""
+        self._usage: dict[str, ProcessResourceUsage] = {}
+
+    def sample(
+        self,
+        name: str,
+        pid: int,
+        resreq_cores: int | None = None,
+        resreq_mem: int | None = None,
+    ) -> None:
+        """Take a sample of process `pid`, which is recorded under `name`. Reading `/proc` is
+        cheap enough to do on the event loop."""
+        usage = read_proc_usage(pid)
+        if usage is None:
+            return
+        if name not in self._usage:
+            self._usage[name] = ProcessResourceUsage(resreq_cores, resreq_mem)
+        self._usage[name].add(time.time(), usage)
+
+    def starved(self) -> list[str]:
+        """Names of the processes considered CPU-starved."""
+        return [name for name, usage in self._usage.items() if usage.summary()["starved"]]
+
+    def format_summary(self) -> str:
+        lines = []
+        for name, usage in self._usage.items():
+            summary = usage.summary()
+            if summary["cpu_mean"] is None:
+                continue
+            line = f"{name}: {summary['cpu_mean']:.2f} cores"
+            if summary["resreq_cores"] is not None:
+                line += f" (requested {summary['resreq_cores']})"
+            if summary["rss_peak"] is not None:
+                line += f", peak {summary['rss_peak'] // (1024 * 1024)} MB"
+            if summary["resreq_mem"] is not None:
+                line += f" (requested {summary['resreq_mem']} MB)"
+            if summary["runqueue_wait_mean"] is not None:
+                line += f", waiting for a CPU {summary['runqueue_wait_mean'] * 100:.1f}%"
+            if summary["starved"]:
+                line += ", CPU-starved"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def toJSON(self) -> dict:
+        return {
+            "interval": self.interval,
+            "processes": {name: usage.toJSON() for name, usage in self._usage.items()},
+        }
@@ -0,0 +1,170 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Cache of the results of completed runs, so that runs identical to earlier ones are skipped.
+
+Runs are identified by a hash of their system, simulation and instantiation configuration, the
+simulator executables, and input files such as disk images. The output directory and output
+artifact of each successful run are stored in a `ContentCache` entry. When a run with the same
+key is encountered later, the stored files are copied into its workdir instead of executing it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import shutil
+import typing
+
+from simbricks.utils import content_cache as utils_content_cache
+from simbricks.utils import file as utils_file
+
+if typing.TYPE_CHECKING:
+    from simbricks.runtime.runs import base as run_base
+
+_VOLATILE_ATTRS = {
+    "input_artifact_name",
+    "output_artifact_name",
+    "preserve_checkpoints",
+    "preserve_tmp_folder",
+}
+"""Configuration attributes that are randomly generated or do not affect the results."""
+
+_ARTIFACT = "artifact"
+
+
+def _stable_json(json_obj: typing.Any) -> typing.Any:
+    if isinstance(json_obj, dict):
+        return {k: _stable_json(v) for k, v in json_obj.items() if k not in _VOLATILE_ATTRS}
+    if isinstance(json_obj, list):
+        return [_stable_json(v) for v in json_obj]
+    return json_obj
+
+
+def _resolve_executable(executable: str) -> str | None:
+    if os.path.isfile(executable):
+        return executable
+    return shutil.which(executable)
+
+
+def _list_files(path: str) -> list[str]:
+    if os.path.isfile(path):
+        return [path]
+    if not os.path.isdir(path):
+        raise RuntimeError(f"input {path} of the run does not exist")
+    files = []
+    for dirpath, _, filenames in os.walk(path):
+        files.extend(os.path.join(dirpath, name) for name in filenames)
+    return sorted(files)
+
+
+def _store_files(run: run_base.Run, entry: pathlib.Path) -> None:
+    inst = run.instantiation
+    shutil.copytree(inst.env.output_base(), entry / "output")
+    if os.path.isfile(inst.assigned_fragment.output_artifact_name):
+        shutil.copy2(inst.assigned_fragment.output_artifact_name, entry / _ARTIFACT)
+
+
+def _restore_files(run: run_base.Run, entry: pathlib.Path) -> None:
+    inst = run.instantiation
+    output_base = pathlib.Path(inst.env.output_base())
+    utils_file.rmtree(output_base.as_posix())
+    # copies, not links, so later runs in this workdir cannot modify the stored results
+    shutil.copytree(entry / "output", output_base, copy_function=shutil.copyfile)
+    if inst.assigned_fragment.output_artifact_paths and (entry / _ARTIFACT).exists():
+        shutil.copyfile(entry / _ARTIFACT, inst.assigned_fragment.output_artifact_name)
+
+
+class ResultCache:
+    def __init__(self, root: str | os.PathLike[str], max_size: int | None = None) -> None:
+        self.cache: utils_content_cache.ContentCache = utils_content_cache.ContentCache(
+            root, max_size
+        )
+        """Stores the results, `max_size` in bytes limits its size."""
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stored: int = 0
+        self._keys: dict[run_base.Run, str] = {}
+
+    async def run_key(self, run: run_base.Run) -> str:
+        """Hash of everything the results of `run` depend on."""
+        if run in self._keys:
+            return self._keys[run]
+        inst = run.instantiation
+        config = {
+            "system": inst.simulation.system.toJSON(),
+            "simulation": inst.simulation.toJSON(),
+            "instantiation": inst.toJSON(),
+        }
+        parts: list[str] = [
+            json.dumps(_stable_json(config), sort_keys=True),
+            str(run.repetition),
+        ]
+
+        inputs = list(inst.input_artifact_paths)
+        for fragment in inst.fragments:
+            inputs.extend(fragment.input_artifact_paths)
+        for sim in sorted(inst.assigned_fragment.all_simulators(), key=lambda sim: sim.id()):
+            executable = _resolve_executable(sim._executable)
+            if executable is None:
+                # e.g. a command resolved by the simulator itself
+                parts.append(f"executable {sim._executable}")
+            else:
+                inputs.append(executable)
+            inputs.extend(sim.input_files(inst))
+
+        for path in inputs:
+            for file in await utils_file.run_blocking(_list_files, path):
+                digest = await self.cache.file_digest(file)
+                parts.append(f"{pathlib.Path(file).name} {digest}")
+
+        key = utils_content_cache.content_key(*parts)
+        self._keys[run] = key
+        return key
+
+    async def lookup(self, run: run_base.Run) -> str | None:
+        """Path of the stored results of a run identical to `run`, if there are any."""
+        return self.cache.lookup(await self.run_key(run))
+
+    async def restore(self, run: run_base.Run, entry: str) -> None:
+        """Copy the stored results `entry` into the workdir of `run`."""
+        self.hits += 1
+        await utils_file.run_blocking(_restore_files, run, pathlib.Path(entry))
+
+    async def store(self, run: run_base.Run, replace: bool = False) -> None:
+        """Store the results of the completed `run`. With `replace`, existing results of an
+        identical run are replaced, otherwise they are kept."""
+        key = await self.run_key(run)
+        if replace:
+            self.cache.remove(key)
+
+        async def build(path: str) -> None:
+            self.stored += 1
+            await utils_file.run_blocking(_store_files, run, pathlib.Path(path))
+
+        await self.cache.get(key, build)
+
+    def format_stats(self) -> str:
+        return (
+            f"result cache: {self.hits} runs skipped, {self.misses} executed, {self.stored}"
+            f" stored, {self.cache.size() / 10**9:.1f} GB used"
+        )
@@ -27,7 +27,13 @@ import abc
 import itertools
 
 from simbricks.orchestration.instantiation import base as inst_base
-from simbricks.runtime import output
+from simbricks.runtime import (
+    checkpoint_cache,
+    loop_monitor,
+    output,
+    output_stream,
+    result_cache,
+)
 
 
 class Run:
@@ -42,12 +48,21 @@ class Run:
         simulation_output: output.SimulationOutput | None = None,
         job_id: int | None = None,
         cp: bool = False,
+        priority: int = 0,
+        repetition: int = 0,
     ):
         self.instantiation: inst_base.Instantiation = instantiation
         self._run_nr = next(self.__run_nr)
         self._output: output.SimulationOutput | None = simulation_output
         self._prereq: Run | None = prereq
         self.checkpoint: bool = cp
+        self.priority: int = priority
+        """Runtimes that execute runs in parallel start runs with higher priority first."""
+        self.repetition: int = repetition
+        """Distinguishes repeated runs of the same instantiation, which are otherwise identical."""
+        self.from_cache: bool = False
+        """Whether the results were restored from the result cache instead of executing the
+        run."""
 
     def name(self) -> str:
         return self.instantiation.simulation.name + "." + str(self._run_nr)
@@ -60,6 +75,15 @@ class Runtime(metaclass=abc.ABCMeta):
         self._interrupted = False
         """Indicates whether interrupt has been signaled."""
         self._profile_int: int | None = None
+        self._resource_sample_int: float | None = None
+        self._output_retention: output.OutputRetention | None = None
+        self._output_stream: output_stream.OutputCompression | None = None
+        self._output_coalesce_window: float = 0.0
+        self._loop_monitor: loop_monitor.LoopBlockingMonitor = loop_monitor.LoopBlockingMonitor()
+        """Measures how long each phase of the runs blocked the event loop."""
+        self._result_cache: result_cache.ResultCache | None = None
+        self._force: bool = False
+        self._checkpoint_cache: checkpoint_cache.CheckpointCache | None = None
 
     @abc.abstractmethod
     def add_run(self, run: Run) -> None:
@@ -89,4 +113,112 @@ class Runtime(metaclass=abc.ABCMeta):
             self.interrupt_handler()
 
     def enable_profiler(self, profile_int: int) -> None:
+        """Send SIGUSR1 to all simulators every `profile_int` seconds and collect the statistics
+        they print in response in the simulation output."""
         self._profile_int = profile_int
+
+    def enable_resource_sampling(self, interval: float) -> None:
+        """Sample the CPU, memory and I/O usage of all simulators and proxies from `/proc` every
+        `interval` seconds and include it in the simulation output."""
+        self._resource_sample_int = interval
+
+    def set_output_retention(self, retention: output.OutputRetention) -> None:
+        """Set the policy for how much output of simulators and proxies is kept in memory."""
+        self._output_retention = retention
+
+    def set_output_coalesce_window(self, window: float) -> None:
+        """Hand output that trickles in slowly to the output handling in larger batches, by
+        waiting up to `window` seconds after draining a simulator's output. Fast output is never
+        delayed."""
+        self._output_coalesce_window = window
+
+    def enable_output_stream(self, compression: output_stream.OutputCompression) -> None:
+        """Additionally write the output of each run incrementally in the streaming output format,
+        which can be read back through `SimulationOutput.open()`."""
+        self._output_stream = compression
+
+    def enable_result_cache(self, cache: result_cache.ResultCache, force: bool = False) -> None:
+        """Skip runs identical to earlier successful runs and reuse their results instead. With
+        `force`, all runs are executed and their results replace the stored ones."""
+        self._result_cache = cache
+        self._force = force
+
+    def enable_checkpoint_cache(self, cache: checkpoint_cache.CheckpointCache) -> None:
+        """Publish checkpoints of runs creating them to `cache` and release the checkpoints of
+        runs restoring from it when they finished. Runs are assigned to checkpoints in
+        `cache` through `CheckpointCache.create_checkpoint()` and
+        `CheckpointCache.use_checkpoint()`."""
+        self._checkpoint_cache = cache
+
+    def _checkpoint_finished(self, run: Run, success: bool) -> None:
+        if self._checkpoint_cache is not None:
+            self._checkpoint_cache.finish(run.instantiation, success)
+
+    def _dependent_runs(self, run: Run) -> list[Run]:
+        """Runs that have `run` as prerequisite."""
+        return []
+
+    async def _restore_cached_result(self, run: Run) -> bool:
+        """Copy the results of an earlier identical run into the workdir of `run` if there are
+        any. Returns whether `run` can be skipped, in which case its checkpoint, if it creates
+        or restores one, is already released."""
+        cache = self._result_cache
+        if cache is None or self._force:
+            return False
+        if run.from_cache:
+            self._checkpoint_finished(run, False)
+            return True
+
+        entry = await cache.lookup(run)
+        # runs depending on this one, e.g. on its checkpoint, must be skipped as well
+        dependents = self._dependent_runs(run)
+        dependent_entries = [await cache.lookup(dependent) for dependent in dependents]
+        if entry is None or None in dependent_entries:
+            cache.misses += 1
+            return False
+
+        try:
+            for dependent, dependent_entry in zip(dependents, dependent_entries):
+                assert dependent_entry is not None
+                await cache.restore(dependent, dependent_entry)
+                dependent.from_cache = True
+            await cache.restore(run, entry)
+            run.from_cache = True
+        finally:
+            # the run is not executed, so a checkpoint it was to create is not published
+            self._checkpoint_finished(run, False)
+        print(f"skipping run {run.name()}, reusing results of an identical earlier run")
+        return True
+
+    async def _store_result(self, run: Run) -> None:
+        if self._result_cache is None or run._output is None or run._output.failed():
+            return
+        await self._result_cache.store(run, replace=self._force)
+
+    def _report_stats(self, run: Run) -> None:
+        """Print the profiler statistics and resource usage of `run` if they were collected."""
+        if run._output is None:
+            return
+        if run._output.profiler_stats is not None:
+            summary = run._output.profiler_stats.format_summary()
+            if summary:
+                print(f"profiler statistics of run {run.name()}:")
+                print(summary)
+        if run._output.resource_sampler is not None:
+            summary = run._output.resource_sampler.format_summary()
+            if summary:
+                print(f"resource usage of run {run.name()}:")
+                print(summary)
+
+    def loop_blocking_stats(self) -> dict:
+        """Time the event loop was blocked during each phase of the runs (`prepare`, `run`,
+        `dump`, `artifact`, `cleanup`), summed over all runs."""
+        return self._loop_monitor.toJSON()
+
+    def _setup_output(self, run: Run, sim_output: output.SimulationOutput) -> None:
+        if self._profile_int:
+            sim_output.enable_profiler_stats()
+        if self._output_stream is None:
+            return
+        path = run.instantiation.env.get_simulation_output_stream_path(self._output_stream.suffix)
+        sim_output.stream_to(path, self._output_stream)
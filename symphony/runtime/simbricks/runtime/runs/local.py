@@ -23,26 +23,40 @@
 from __future__ import annotations
 
 import asyncio
+import os
 import pathlib
+import shutil
+import time
 import typing
 
+from simbricks.runtime import cpu_alloc
 from simbricks.runtime import simulation_executor as sim_exec
 from simbricks.runtime.runs import base as run_base
 from simbricks.utils import artifatcs as utils_art
+from simbricks.utils import file as utils_file
 
 if typing.TYPE_CHECKING:
     from simbricks.orchestration.instantiation import base as inst_base
     from simbricks.orchestration.instantiation import proxy as inst_proxy
     from simbricks.orchestration.simulation import base as sim_base
+    from simbricks.runtime import output as sim_out
 
 
 class LocalSimulationExecutorCallbacks(sim_exec.SimulationExecutorCallbacks):
-    def __init__(self, instantiation: inst_base.Instantiation, verbose: bool):
-        super().__init__(instantiation)
+    def __init__(
+        self,
+        instantiation: inst_base.Instantiation,
+        verbose: bool,
+        output_retention: sim_out.OutputRetention | None = None,
+    ):
+        super().__init__(instantiation, output_retention)
         self._instantiation = instantiation
         self._verbose = verbose
         self._simulation_executor: sim_exec.SimulationExecutor
 
+    def needs_output_lines(self) -> bool:
+        return self._verbose
+
     # ---------------------------------------
     # Callbacks related to whole simulation -
     # ---------------------------------------
@@ -159,20 +173,36 @@ class LocalSimpleRuntime(run_base.Runtime):
 
     async def do_run(self, run: run_base.Run) -> None:
         """Actually executes `run`."""
+        if await self._restore_cached_result(run):
+            self._complete.append(run)
+            return
 
         try:
-            callbacks = LocalSimulationExecutorCallbacks(run.instantiation, self._verbose)
+            callbacks = LocalSimulationExecutorCallbacks(
+                run.instantiation, self._verbose, self._output_retention
+            )
             sim_executor = sim_exec.SimulationExecutor(
-                run.instantiation, callbacks, self._verbose, "", self._profile_int
+                run.instantiation,
+                callbacks,
+                self._verbose,
+                "",
+                self._profile_int,
+                output_coalesce_window=self._output_coalesce_window,
+                resource_sample_int=self._resource_sample_int,
             )
             callbacks._simulation_executor = sim_executor
-            await sim_executor.prepare()
+            self._setup_output(run, callbacks.simulation_output)
+            with self._loop_monitor.phase("prepare"):
+                await sim_executor.prepare()
         except asyncio.CancelledError:
             # it is safe to just exit here because we are not running any
             # simulators yet
+            self._checkpoint_finished(run, False)
             return
 
-        run._output = await sim_executor.run()  # handles CancelledError
+        with self._loop_monitor.phase("run"):
+            run._output = await sim_executor.run()  # handles CancelledError
+        self._report_stats(run)
         self._complete.append(run)
 
         # if the log is huge, this step takes some time
@@ -181,39 +211,105 @@ class LocalSimpleRuntime(run_base.Runtime):
 
         # dump output into a file and then, before cleanup, create an artifact
         output_path = run.instantiation.env.get_simulation_output_path()
-        run._output.dump(outpath=output_path)
-        if run.instantiation.assigned_fragment.output_artifact_paths:
-            utils_art.create_artifact(
-                file=run.instantiation.assigned_fragment.output_artifact_name,
-                paths_to_include=run.instantiation.assigned_fragment.output_artifact_paths,
-                base_path=pathlib.Path(run.instantiation.env._work_dir),
-                check_relative=True,
+        with self._loop_monitor.phase("dump"):
+            await utils_file.run_blocking(run._output.dump, outpath=output_path)
+            await utils_file.run_blocking(
+                run.instantiation.timeline.dump_chrome_trace,
+                run.instantiation.env.get_simulation_trace_path(),
             )
-
-        await sim_executor.cleanup()
+        if run.instantiation.assigned_fragment.output_artifact_paths:
+            with self._loop_monitor.phase("artifact"):
+                await utils_file.run_blocking(
+                    utils_art.create_artifact,
+                    file=run.instantiation.assigned_fragment.output_artifact_name,
+                    paths_to_include=run.instantiation.assigned_fragment.output_artifact_paths,
+                    base_path=pathlib.Path(run.instantiation.env._work_dir),
+                    check_relative=True,
+                )
+        self._checkpoint_finished(run, not run._output.failed())
+        await self._store_result(run)
+
+        with self._loop_monitor.phase("cleanup"):
+            await sim_executor.cleanup()
 
     async def start(self) -> None:
         """Execute the runs defined in `self.runnable`."""
-        for run in self._runnable:
-            if self._interrupted:
-                return
+        self._loop_monitor.start()
+        try:
+            for run in self._runnable:
+                if self._interrupted:
+                    return
+
+                self._running = asyncio.create_task(self.do_run(run))
+                await self._running
+        finally:
+            await self._loop_monitor.stop()
+            await utils_file.await_deferred_deletions()
+            if self._verbose:
+                print(self._loop_monitor.format_report())
 
-            self._running = asyncio.create_task(self.do_run(run))
-            await self._running
+    def _dependent_runs(self, run: run_base.Run) -> list[run_base.Run]:
+        return [other for other in self._runnable if other._prereq is run]
 
     def interrupt_handler(self) -> None:
         if self._running:
             self._running.cancel()
 
 
+class _PreparedRun:
+    """A queued run whose preparation was started ahead of time."""
+
+    def __init__(
+        self,
+        callbacks: LocalSimulationExecutorCallbacks,
+        sim_executor: sim_exec.SimulationExecutor,
+        disk_space: int,
+    ) -> None:
+        self.callbacks: LocalSimulationExecutorCallbacks = callbacks
+        self.sim_executor: sim_exec.SimulationExecutor = sim_executor
+        self.disk_space: int = disk_space
+        """Estimated disk space in bytes that is reserved until preparation finished."""
+        self.task: asyncio.Task
+        self.preparing: bool = False
+        """Whether preparation got an I/O slot and started."""
+
+
 class LocalParallelRuntime(run_base.Runtime):
-    """Execute runs locally in parallel on multiple cores."""
+    """
+    Execute runs locally in parallel on multiple cores.
+
+    Whenever resources become available, the scheduler starts as many runs as fit from all
+    pending runs whose prerequisite completed, not just from the head of the queue. Runs with a
+    higher `Run.priority` are started first; among runs of equal priority, the one using most of
+    the free cores (best fit) is picked, then the one submitted first. To prevent large runs from
+    starving, no other run is started ahead of the first waiting run once it was passed over
+    `backfill_limit` times.
+
+    With `pin_cores`, each run is additionally allocated exclusive core IDs and every simulator
+    is pinned to its share of them. `placement_policy` determines how cores are chosen based on
+    the CPU topology: `compact` keeps a run's cores close together and puts simulators connected
+    through channels on cores sharing caches, `spread` distributes a run across NUMA nodes and
+    `sequential` assigns cores in order without considering the topology.
+
+    With `prepare_ahead` > 0, the workdir setup, disk image copies and other preparation of up to
+    that many queued runs whose prerequisites completed is done while other runs execute, so
+    runs can start right away when resources become available. At most `prepare_concurrency`
+    runs are prepared ahead at once, and only as long as the file system of a run's workdir keeps
+    `prepare_disk_reserve` MB free after its estimated disk usage. Runs sharing their workdir with
+    a started run, e.g. other repetitions of it, are not prepared ahead.
+    """
 
     def __init__(
         self,
         cores: int,
         mem: int | None = None,
         verbose: bool = False,
+        backfill_limit: int = 16,
+        pin_cores: bool = False,
+        placement_policy: cpu_alloc.PlacementPolicy = cpu_alloc.PlacementPolicy.COMPACT,
+        prepare_ahead: int = 0,
+        prepare_concurrency: int = 2,
+        prepare_disk_reserve: int = 1024,
     ):
         super().__init__()
         self._runs_noprereq: list[run_base.Run] = []
@@ -224,9 +320,53 @@ class LocalParallelRuntime(run_base.Runtime):
         self._cores: int = cores
         self._mem: int | None = mem
         self._verbose: bool = verbose
+        self._backfill_limit: int = backfill_limit
+        """How often the first waiting run can be passed over by runs submitted after it."""
+        self._core_allocator: cpu_alloc.CoreAllocator | None = None
+        self._run_cores: dict[run_base.Run, list[int]] = {}
+        self._placement_policy: cpu_alloc.PlacementPolicy = placement_policy
+        self._topology: cpu_alloc.CpuTopology | None = None
+        if pin_cores:
+            available = sorted(os.sched_getaffinity(0))
+            if cores > len(available):
+                raise RuntimeError(
+                    f"cannot pin simulators to {cores} cores, only {len(available)} are available"
+                )
+            if placement_policy == cpu_alloc.PlacementPolicy.SEQUENTIAL:
+                self._topology = cpu_alloc.CpuTopology()
+            else:
+                self._topology = cpu_alloc.CpuTopology.from_sysfs()
+                # use the first `cores` cores in topology order, not by ID
+                available.sort(key=self._topology.sort_key)
+            self._core_allocator = cpu_alloc.CoreAllocator(
+                available[:cores], self._topology, placement_policy
+            )
+
+        self._prepare_ahead: int = prepare_ahead
+        """Maximum number of queued runs prepared ahead of time."""
+        self._prepare_slots: asyncio.Semaphore = asyncio.Semaphore(prepare_concurrency)
+        """Limits the number of runs prepared ahead concurrently."""
+        self._prepare_disk_reserve: int = prepare_disk_reserve * 1024 * 1024
+        """Free disk space in bytes that preparing ahead must leave."""
+        self._prepared: dict[run_base.Run, _PreparedRun] = {}
+        """Queued runs that are prepared ahead of time."""
 
-        self._pending_jobs: set[asyncio.Task] = set()
+        self._pending_jobs: dict[asyncio.Task, run_base.Run] = {}
         self._starter_task: asyncio.Task
+        self._cores_used: int = 0
+        self._mem_used: int = 0
+
+        # utilization statistics
+        self._stats_start: float = 0.0
+        self._stats_last: float = 0.0
+        self._core_seconds: float = 0.0
+        self._mem_seconds: float = 0.0
+        self._busy_seconds: float = 0.0
+        """Time during which at least one run was executing."""
+        self._peak_cores: int = 0
+        self._peak_mem: int = 0
+        self._queue_wait: dict[run_base.Run, float] = {}
+        self._skipped: dict[run_base.Run, int] = {}
 
     def add_run(self, run: run_base.Run) -> None:
         if run.instantiation.simulation.resreq_cores() > self._cores:
@@ -240,48 +380,227 @@ class LocalParallelRuntime(run_base.Runtime):
         else:
             self._runs_prereq.append(run)
 
+    def _create_executor(
+        self, run: run_base.Run
+    ) -> tuple[LocalSimulationExecutorCallbacks, sim_exec.SimulationExecutor]:
+        callbacks = LocalSimulationExecutorCallbacks(
+            run.instantiation, self._verbose, self._output_retention
+        )
+        sim_executor = sim_exec.SimulationExecutor(
+            run.instantiation,
+            callbacks,
+            self._verbose,
+            "",
+            self._profile_int,
+            output_coalesce_window=self._output_coalesce_window,
+            resource_sample_int=self._resource_sample_int,
+        )
+        callbacks._simulation_executor = sim_executor
+        self._setup_output(run, callbacks.simulation_output)
+        return callbacks, sim_executor
+
+    def _workdir_free_space(self, run: run_base.Run) -> int:
+        path = pathlib.Path(run.instantiation.env.work_dir()).absolute()
+        while not path.exists():
+            path = path.parent
+        return shutil.disk_usage(path).free
+
+    def _workdir_in_use(self, run: run_base.Run) -> bool:
+        """Whether a started or prepared run uses the same workdir as `run`, e.g. another
+        repetition of the same instantiation. Preparing `run` would delete the temporary files
+        of that run, and cleaning it up those of `run`."""
+        work_dir = run.instantiation.env.work_dir()
+        return any(
+            other.instantiation.env.work_dir() == work_dir
+            for other in (*self._pending_jobs.values(), *self._prepared)
+        )
+
+    def _prepare_queued(self, queue: list[run_base.Run]) -> None:
+        """Start preparing the runs most likely to be started next, up to `prepare_ahead`."""
+        candidates = sorted(
+            (run for run in queue if run not in self._prepared and self.prereq_ready(run)),
+            key=lambda run: (-run.priority, queue.index(run)),
+        )
+        for run in candidates:
+            if len(self._prepared) >= self._prepare_ahead:
+                return
+            if self._workdir_in_use(run):
+                continue
+            disk_space = run.instantiation.disk_space_estimate()
+            reserved = sum(prepared.disk_space for prepared in self._prepared.values())
+            if self._workdir_free_space(run) - reserved - disk_space < self._prepare_disk_reserve:
+                if self._verbose:
+                    print(f"not preparing run {run.name()} ahead, not enough free disk space")
+                return
+            callbacks, sim_executor = self._create_executor(run)
+            prepared = _PreparedRun(callbacks, sim_executor, disk_space)
+            prepared.task = asyncio.create_task(self._prepare_ahead_of_time(run, prepared))
+            self._prepared[run] = prepared
+
+    async def _prepare_ahead_of_time(self, run: run_base.Run, prepared: _PreparedRun) -> None:
+        async with self._prepare_slots:
+            prepared.preparing = True
+            if self._verbose:
+                print(f"preparing run {run.name()} ahead of time")
+            try:
+                with self._loop_monitor.phase("prepare"):
+                    await prepared.sim_executor.prepare()
+                    await prepared.sim_executor.wait_prepared()
+            finally:
+                # the disk space is now in use and accounted for by the file system
+                prepared.disk_space = 0
+
+    async def _take_prepared(
+        self, run: run_base.Run
+    ) -> tuple[LocalSimulationExecutorCallbacks, sim_exec.SimulationExecutor] | None:
+        """Return the callbacks and executor of `run` if it was successfully prepared ahead of
+        time. Otherwise, whatever was prepared is cleaned up and None is returned, so the run is
+        prepared from scratch with a fresh executor."""
+        prepared = self._prepared.pop(run, None)
+        if prepared is None:
+            return None
+        if not prepared.preparing:
+            # still waiting for an I/O slot, prepare right away instead
+            prepared.task.cancel()
+        try:
+            await asyncio.shield(prepared.task)
+            return prepared.callbacks, prepared.sim_executor
+        except asyncio.CancelledError:
+            if not prepared.task.cancelled():
+                # do_run itself was cancelled
+                prepared.task.cancel()
+                await self._cleanup_prepared(prepared)
+                raise
+        except Exception as e:
+            # e.g. the free shared memory was checked while other runs used it, retry
+            print(f"preparing run {run.name()} ahead of time failed: {e}")
+        await self._cleanup_prepared(prepared)
+        return None
+
+    async def _cleanup_prepared(self, prepared: _PreparedRun) -> None:
+        """Clean up a run prepared ahead of time that is not going to be started with this
+        executor."""
+        if prepared.preparing:
+            await prepared.sim_executor.cleanup()
+        prepared.callbacks.simulation_output.close_stream()
+
+    async def _discard_prepared(self, runs: list[run_base.Run] | None = None) -> None:
+        """Clean up `runs`, by default all, that were prepared ahead of time but not
+        started."""
+        if runs is None:
+            runs = list(self._prepared)
+        discarded = [self._prepared.pop(run) for run in runs if run in self._prepared]
+        for prepared in discarded:
+            prepared.task.cancel()
+        await asyncio.gather(*(prepared.task for prepared in discarded), return_exceptions=True)
+        for prepared in discarded:
+            await self._cleanup_prepared(prepared)
+
     async def do_run(self, run: run_base.Run) -> run_base.Run | None:
         """Actually executes `run`."""
-        try:
-            callbacks = LocalSimulationExecutorCallbacks(run.instantiation, self._verbose)
-            sim_executor = sim_exec.SimulationExecutor(
-                run.instantiation, callbacks, self._verbose, "", self._profile_int
+        if await self._restore_cached_result(run):
+            await self._discard_prepared([run, *self._dependent_runs(run)])
+            return run
+
+        cpu_assignment = None
+        placement = None
+        if run in self._run_cores:
+            assert self._topology is not None
+            simulation = run.instantiation.simulation
+            cpu_assignment = cpu_alloc.assign_cores(
+                simulation, self._run_cores[run], self._topology, self._placement_policy
             )
-            callbacks._simulation_executor = sim_executor
-            await sim_executor.prepare()
+            placement = cpu_alloc.placement_report(simulation, cpu_assignment, self._topology)
+            if self._verbose:
+                print(f"core placement of run {run.name()}:")
+                print(cpu_alloc.format_placement_report(placement))
+        try:
+            prepared = await self._take_prepared(run)
+            if prepared is not None:
+                callbacks, sim_executor = prepared
+                is_prepared = True
+            else:
+                callbacks, sim_executor = self._create_executor(run)
+                is_prepared = False
+            if cpu_assignment:
+                sim_executor.set_cpu_assignment(cpu_assignment)
+                callbacks.simulation_output.set_cpu_assignment(cpu_assignment, placement)
+            if not is_prepared:
+                with self._loop_monitor.phase("prepare"):
+                    await sim_executor.prepare()
         except asyncio.CancelledError:
             # it is safe to just exit here because we are not running any
             # simulators yet
+            self._checkpoint_finished(run, False)
             return None
 
         print("starting run ", run.name())
-        run._output = await sim_executor.run()  # already handles CancelledError
+        with self._loop_monitor.phase("run"):
+            run._output = await sim_executor.run()  # already handles CancelledError
+        self._report_stats(run)
 
         # if the log is huge, this step takes some time
         if self._verbose:
             print(f"Writing collected output of run {run.name()} to JSON file ...")
 
         output_path = run.instantiation.env.get_simulation_output_path()
-        run._output.dump(outpath=output_path)
+        with self._loop_monitor.phase("dump"):
+            await utils_file.run_blocking(run._output.dump, outpath=output_path)
+            await utils_file.run_blocking(
+                run.instantiation.timeline.dump_chrome_trace,
+                run.instantiation.env.get_simulation_trace_path(),
+            )
+        self._checkpoint_finished(run, not run._output.failed())
+        await self._store_result(run)
 
-        await sim_executor.cleanup()
+        with self._loop_monitor.phase("cleanup"):
+            await sim_executor.cleanup()
 
         print("finished run ", run.name())
         return run
 
+    def _account_usage(self) -> None:
+        """Integrate resource usage up to now. Call before changing the used resources."""
+        now = time.monotonic()
+        self._core_seconds += self._cores_used * (now - self._stats_last)
+        self._mem_seconds += self._mem_used * (now - self._stats_last)
+        if self._cores_used > 0:
+            self._busy_seconds += now - self._stats_last
+        self._stats_last = now
+
+    def _run_started(self, run: run_base.Run) -> None:
+        self._account_usage()
+        self._cores_used += run.instantiation.simulation.resreq_cores()
+        self._mem_used += run.instantiation.simulation.resreq_mem()
+        self._peak_cores = max(self._peak_cores, self._cores_used)
+        self._peak_mem = max(self._peak_mem, self._mem_used)
+        self._queue_wait[run] = time.monotonic() - self._stats_start
+        if self._core_allocator is not None:
+            cores = self._core_allocator.allocate(run.instantiation.simulation.resreq_cores())
+            # enough_resources() checked that enough cores are free
+            assert cores is not None
+            self._run_cores[run] = cores
+
+    def _run_finished(self, run: run_base.Run) -> None:
+        self._account_usage()
+        self._complete.add(run)
+        if self._core_allocator is not None:
+            self._core_allocator.release(self._run_cores.pop(run))
+        self._cores_used -= run.instantiation.simulation.resreq_cores()
+        self._mem_used -= run.instantiation.simulation.resreq_mem()
+
     async def wait_completion(self) -> None:
         """Wait for any run to terminate and return."""
         assert self._pending_jobs
 
-        done, self._pending_jobs = await asyncio.wait(
-            self._pending_jobs, return_when=asyncio.FIRST_COMPLETED
-        )
+        done, _ = await asyncio.wait(self._pending_jobs, return_when=asyncio.FIRST_COMPLETED)
 
-        for r_awaitable in done:
-            run = await r_awaitable
-            self._complete.add(run)
-            self._cores_used -= run.instantiation.simulation.resreq_cores()
-            self._mem_used -= run.instantiation.simulation.resreq_mem()
+        for job in done:
+            run = self._pending_jobs.pop(job)
+            # a run that was cancelled before it started returns None but still releases its
+            # resources
+            await job
+            self._run_finished(run)
 
     def enough_resources(self, run: run_base.Run) -> bool:
         """Check if enough cores and mem are available for the run."""
@@ -299,6 +618,9 @@ class LocalParallelRuntime(run_base.Runtime):
 
         return enough_cores and enough_mem
 
+    def _dependent_runs(self, run: run_base.Run) -> list[run_base.Run]:
+        return [other for other in self._runs_prereq if other._prereq is run]
+
     def prereq_ready(self, run: run_base.Run) -> bool:
         """Check if the prerequesite run for `run` has completed."""
         if run._prereq is None:
@@ -306,36 +628,120 @@ class LocalParallelRuntime(run_base.Runtime):
 
         return run._prereq in self._complete
 
+    def _pick_next(self, queue: list[run_base.Run]) -> run_base.Run | None:
+        """Select the next run to start from `queue` or None if none can be started now."""
+        ready = [run for run in queue if self.prereq_ready(run)]
+        if not ready:
+            return None
+
+        # the first waiting run of the highest priority reserves the machine once it was passed
+        # over too often
+        head = min(ready, key=lambda run: (-run.priority, queue.index(run)))
+        if self._skipped.get(head, 0) >= self._backfill_limit:
+            return head if self.enough_resources(head) else None
+
+        fitting = [run for run in ready if self.enough_resources(run)]
+        if not fitting:
+            return None
+        best = min(
+            fitting,
+            key=lambda run: (
+                -run.priority,
+                -run.instantiation.simulation.resreq_cores(),
+                queue.index(run),
+            ),
+        )
+        if best is not head:
+            self._skipped[head] = self._skipped.get(head, 0) + 1
+        return best
+
     async def do_start(self) -> None:
         """Asynchronously execute the runs defined in `self.runs_noprereq +
         self.runs_prereq."""
-        # self.completions = asyncio.Queue()
         self._cores_used = 0
         self._mem_used = 0
-
-        runs = self._runs_noprereq + self._runs_prereq
-        for run in runs:
-            # if necessary, wait for enough memory or cores
-            while not self.enough_resources(run):
-                print("waiting for resources")
+        self._stats_start = self._stats_last = time.monotonic()
+
+        queue = self._runs_noprereq + self._runs_prereq
+        while queue:
+            # start as many runs as fit into the free resources
+            while (run := self._pick_next(queue)) is not None:
+                queue.remove(run)
+                # runs sharing the workdir must not be prepared while this one executes
+                work_dir = run.instantiation.env.work_dir()
+                await self._discard_prepared(
+                    [
+                        other
+                        for other in self._prepared
+                        if other is not run and other.instantiation.env.work_dir() == work_dir
+                    ]
+                )
+                self._run_started(run)
+                job = asyncio.create_task(self.do_run(run))
+                self._pending_jobs[job] = run
+
+            if self._prepare_ahead > 0:
+                self._prepare_queued(queue)
+
+            if queue:
+                if not self._pending_jobs:
+                    raise RuntimeError(
+                        "cannot start remaining runs, their prerequisite runs are not scheduled"
+                    )
+                if self._verbose:
+                    print(f"{len(queue)} runs waiting for resources or prerequisite runs")
                 await self.wait_completion()
 
-            # if necessary, wait for prerequesite runs to complete
-            while not self.prereq_ready(run):
-                print("waiting for prereq")
-                await self.wait_completion()
-
-            self._cores_used += run.instantiation.simulation.resreq_cores()
-            self._mem_used += run.instantiation.simulation.resreq_mem()
-
-            job = asyncio.create_task(self.do_run(run))
-            self._pending_jobs.add(job)
-
         # wait for all runs to finish
-        await asyncio.gather(*self._pending_jobs)
+        while self._pending_jobs:
+            await self.wait_completion()
+
+        self.print_utilization()
+
+    def utilization_stats(self) -> dict[str, float]:
+        """Resource utilization of the runs executed so far."""
+        self._account_usage()
+        elapsed = self._stats_last - self._stats_start
+        stats = {
+            "runs": len(self._queue_wait),
+            "elapsed_s": elapsed,
+            "peak_cores": self._peak_cores,
+            "avg_cores": self._core_seconds / elapsed if elapsed > 0 else 0.0,
+            "core_utilization": (
+                self._core_seconds / (elapsed * self._cores) if elapsed > 0 else 0.0
+            ),
+            "busy_fraction": self._busy_seconds / elapsed if elapsed > 0 else 0.0,
+            "peak_mem": self._peak_mem,
+            "avg_mem": self._mem_seconds / elapsed if elapsed > 0 else 0.0,
+            "avg_queue_wait_s": (
+                sum(self._queue_wait.values()) / len(self._queue_wait) if self._queue_wait else 0.0
+            ),
+        }
+        if self._mem:
+            stats["mem_utilization"] = (
+                self._mem_seconds / (elapsed * self._mem) if elapsed > 0 else 0.0
+            )
+        return stats
+
+    def print_utilization(self) -> None:
+        stats = self.utilization_stats()
+        msg = (
+            f"executed {stats['runs']} runs in {stats['elapsed_s']:.1f} s, cores:"
+            f" {stats['core_utilization'] * 100:.1f}% utilized"
+            f" (avg {stats['avg_cores']:.1f}, peak {stats['peak_cores']} of {self._cores}),"
+            f" busy {stats['busy_fraction'] * 100:.1f}% of the time"
+        )
+        if "mem_utilization" in stats:
+            msg += (
+                f", memory: {stats['mem_utilization'] * 100:.1f}% utilized"
+                f" (avg {stats['avg_mem']:.0f} MB, peak {stats['peak_mem']} of {self._mem} MB)"
+            )
+        msg += f", avg queue wait {stats['avg_queue_wait_s']:.1f} s"
+        print(msg)
 
     async def start(self) -> None:
         """Execute all defined runs."""
+        self._loop_monitor.start()
         self._starter_task = asyncio.create_task(self.do_start())
         try:
             await self._starter_task
@@ -344,6 +750,12 @@ class LocalParallelRuntime(run_base.Runtime):
                 job.cancel()
             # wait for all runs to finish
             await asyncio.gather(*self._pending_jobs)
+        finally:
+            await self._discard_prepared()
+            await self._loop_monitor.stop()
+            await utils_file.await_deferred_deletions()
+            if self._verbose:
+                print(self._loop_monitor.format_report())
 
     def interrupt_handler(self) -> None:
         self._starter_task.cancel()
@@ -24,7 +24,9 @@ from __future__ import annotations
 
 import asyncio
 import itertools
+import re
 import socket
+import time
 import traceback
 import typing
 
@@ -32,10 +34,15 @@ from simbricks.orchestration.instantiation import base as inst_base
 from simbricks.orchestration.instantiation import dependency_graph as dep_graph
 from simbricks.orchestration.instantiation import socket as inst_socket
 from simbricks.orchestration.simulation import base as sim_base
+from simbricks.orchestration.simulation import readiness as sim_ready
 from simbricks.runtime import command_executor as cmd_exec
-from simbricks.runtime import output
+from simbricks.runtime import output, resource_sampler
 from simbricks.utils import graphlib
 
+_ACTIVITY_POLL_INTERVAL = 1.0
+"""Interval in seconds at which log files that are not read back are checked for new output
+during stall detection."""
+
 if typing.TYPE_CHECKING:
     from simbricks.orchestration.instantiation import proxy as inst_proxy
 
@@ -48,17 +55,77 @@ class ProxyReadyInfo:
         self.port: int | None = None
 
 
+class SimulatorProbeTarget(sim_ready.ProbeTarget):
+    """Exposes a started simulator's process and output to its readiness probes."""
+
+    def __init__(self) -> None:
+        self._executor: cmd_exec.CommandExecutor | None = None
+        self._lines: list[str] = []
+        """Output produced so far. Only retained until the simulator is ready."""
+        self._waiters: list[tuple[re.Pattern[str], asyncio.Future[re.Match[str]]]] = []
+
+    def attach(self, executor: cmd_exec.CommandExecutor) -> None:
+        self._executor = executor
+
+    def detach(self) -> None:
+        if self._executor is not None:
+            self._executor.remove_output_listener(self.on_output)
+        self._lines = []
+        for _, fut in self._waiters:
+            fut.cancel()
+        self._waiters = []
+
+    def on_output(self, lines: list[str]) -> None:
+        self._lines.extend(lines)
+        if not self._waiters:
+            return
+        for line in lines:
+            for pattern, fut in self._waiters:
+                if fut.done():
+                    continue
+                match = pattern.search(line)
+                if match is not None:
+                    fut.set_result(match)
+        self._waiters = [(pattern, fut) for pattern, fut in self._waiters if not fut.done()]
+
+    @property
+    def pid(self) -> int:
+        assert self._executor is not None
+        return self._executor.pid
+
+    def running(self) -> bool:
+        return self._executor is not None and self._executor.running()
+
+    async def wait_for_output(self, pattern: re.Pattern[str]) -> re.Match[str]:
+        for line in self._lines:
+            match = pattern.search(line)
+            if match is not None:
+                return match
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((pattern, fut))
+        return await fut
+
+
 class SimulationExecutorCallbacks:
-    def __init__(self, instantiation: inst_base.Instantiation) -> None:
+    def __init__(
+        self,
+        instantiation: inst_base.Instantiation,
+        output_retention: output.OutputRetention | None = None,
+    ) -> None:
         self._instantiation = instantiation
         self._output: output.SimulationOutput = output.SimulationOutput(
-            self._instantiation.simulation
+            self._instantiation.simulation, output_retention
         )
 
     @property
     def simulation_output(self) -> output.SimulationOutput:
         return self._output
 
+    def needs_output_lines(self) -> bool:
+        """Whether the stdout and stderr callbacks must also be invoked for processes that write
+        their output directly to files. If not, these files are not read back at all."""
+        return False
+
     # ---------------------------------------
     # Callbacks related to whole simulation -
     # ---------------------------------------
@@ -97,6 +164,11 @@ class SimulationExecutorCallbacks:
     async def simulator_started(self, sim: sim_base.Simulator, cmd: str) -> None:
         self._output.set_simulator_cmd(sim, cmd)
 
+    async def simulator_output_files(
+        self, sim: sim_base.Simulator, stdout_file: str, stderr_file: str
+    ) -> None:
+        self._output.set_simulator_output_files(sim, stdout_file, stderr_file)
+
     async def simulator_ready(self, sim: sim_base.Simulator) -> None:
         pass
 
@@ -116,6 +188,11 @@ class SimulationExecutorCallbacks:
     async def proxy_started(self, proxy: inst_proxy.Proxy, cmd: str) -> None:
         self._output.set_proxy_cmd(proxy, cmd)
 
+    async def proxy_output_files(
+        self, proxy: inst_proxy.Proxy, stdout_file: str, stderr_file: str
+    ) -> None:
+        self._output.set_proxy_output_files(proxy, stdout_file, stderr_file)
+
     async def proxy_ready(self, proxy: inst_proxy.Proxy) -> None:
         pass
 
@@ -137,17 +214,39 @@ class SimulationExecutor:
         verbose: bool,
         proxy_host_ip: str,
         profile_int=None,
+        output_coalesce_window: float = 0.0,
+        cpu_assignment: dict[sim_base.Simulator, list[int]] | None = None,
+        resource_sample_int: float | None = None,
     ) -> None:
         self._instantiation: inst_base.Instantiation = instantiation
         self._callbacks: SimulationExecutorCallbacks = callbacks
         self._verbose: bool = verbose
         self._proxy_host_ip: str = proxy_host_ip
         self._profile_int: int | None = profile_int
+        self._cpu_assignment: dict[sim_base.Simulator, list[int]] = cpu_assignment or {}
+        """Cores each simulator is pinned to. Simulators not listed are not pinned."""
         self._running_sims: dict[sim_base.Simulator, cmd_exec.CommandExecutor] = {}
         self._running_proxies: dict[inst_proxy.Proxy, cmd_exec.CommandExecutor] = {}
         self._wait_sims: dict[int, asyncio.Event] = {}
-        self._cmd_executor = cmd_exec.CommandExecutorFactory(callbacks)
+        self._sim_prepare: dict[sim_base.Simulator, asyncio.Task] = {}
+        """Preparation of each simulator, running in the background until it is started."""
+        self._cmd_executor = cmd_exec.CommandExecutorFactory(callbacks, output_coalesce_window)
         self._external_proxy_running: dict[int, ProxyReadyInfo] = {}
+        self._profiler_task: asyncio.Task | None = None
+        self._resource_sampler: resource_sampler.ResourceSampler | None = None
+        """Samples the resource usage of all simulators and proxies if enabled."""
+        if resource_sample_int:
+            self._resource_sampler = resource_sampler.ResourceSampler(resource_sample_int)
+            callbacks.simulation_output.set_resource_sampler(self._resource_sampler)
+        self._resource_sampler_task: asyncio.Task | None = None
+        self._last_activity: float = time.monotonic()
+        """Last time any simulator or proxy produced new output. Used for stall detection."""
+        self._log_sizes: dict[cmd_exec.CommandExecutor, int] = {}
+        """Size of the log files of processes whose output is not read back at the last check."""
+
+    def set_cpu_assignment(self, cpu_assignment: dict[sim_base.Simulator, list[int]]) -> None:
+        """Set the cores each simulator is pinned to. Must be called before `run()`."""
+        self._cpu_assignment = cpu_assignment
 
     async def mark_external_proxies_running(self, id: int, ip: str, port: int):
         if id not in self._external_proxy_running:
@@ -175,18 +274,29 @@ class SimulationExecutor:
                 f"could not resolve address '{self._proxy_host_ip}' for proxy {proxy.id}"
             )
 
-        cmd_exec = await self._cmd_executor.start_proxy(
-            proxy, proxy.run_cmd(self._instantiation, ip)
-        )
+        log_files = None
+        if self._instantiation.simulation.output_to_file:
+            log_files = self._instantiation.env.get_proxy_log_paths(proxy)
+        timeline = self._instantiation.timeline
+        with timeline.span(proxy.name, "spawn"):
+            cmd_exec = await self._cmd_executor.start_proxy(
+                proxy,
+                proxy.run_cmd(self._instantiation, ip),
+                log_files,
+                self._callbacks.needs_output_lines(),
+            )
         self._running_proxies[proxy] = cmd_exec
+        cmd_exec.add_output_listener(self._activity_listener())
 
         # Wait till sockets exist
         wait_socks = proxy.sockets_wait(inst=self._instantiation)
-        for sock in wait_socks:
-            await sock.wait()
+        with timeline.span(proxy.name, "wait for sockets"):
+            for sock in wait_socks:
+                await sock.wait()
         # Retrieve the port of a listening proxy
         if proxy._connection_mode == inst_socket.SockType.LISTEN:
-            await proxy.read_listening_info()
+            with timeline.span(proxy.name, "read listening info"):
+                await proxy.read_listening_info()
             assert proxy._port is not None and proxy._port != 0
         await self._callbacks.proxy_ready(proxy)
 
@@ -197,38 +307,103 @@ class SimulationExecutor:
         proxy_info = self._external_proxy_running[proxy_id]
 
         # Wait until the external proxy is ready
-        await proxy_info.event.wait()
+        with self._instantiation.timeline.span(external_proxy.name, "wait for external proxy"):
+            await proxy_info.event.wait()
 
         assert proxy_info.ip is not None
         assert proxy_info.port is not None
         external_proxy._ip = proxy_info.ip
         external_proxy._port = proxy_info.port
 
+    async def _await_probes(
+        self,
+        sim: sim_base.Simulator,
+        executor: cmd_exec.CommandExecutor,
+        target: SimulatorProbeTarget,
+        probes: list[sim_ready.ReadinessProbe],
+    ) -> None:
+        """Wait for all readiness probes, failing early if the simulator exits first."""
+        probes_task = asyncio.gather(*[probe.wait(target) for probe in probes])
+        exit_task = asyncio.create_task(executor.wait())
+        try:
+            await asyncio.wait({probes_task, exit_task}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            probes_task.cancel()
+            raise
+        finally:
+            exit_task.cancel()
+        if not probes_task.done():
+            probes_task.cancel()
+            try:
+                await probes_task
+            except asyncio.CancelledError:
+                pass
+            raise RuntimeError(f"simulator {sim.full_name()} exited before becoming ready")
+        probes_task.result()
+
+    async def _start_component(self, comp: dep_graph.SimulationDependencyNode) -> None:
+        """Start a node of the dependency graph and wait for it to be ready."""
+        match comp.type:
+            case dep_graph.SimulationDependencyNodeType.SIMULATOR:
+                await self._start_sim(comp.get_simulator())
+            case dep_graph.SimulationDependencyNodeType.PROXY:
+                await self._start_proxy(comp.get_proxy())
+            case dep_graph.SimulationDependencyNodeType.EXTERNAL_PROXY:
+                # woken up through the ProxyReadyInfo event once the other runner reports it
+                await self._wait_for_external_proxy(comp.get_proxy())
+            case _:
+                raise RuntimeError("Unhandled topology component type")
+
     async def _start_sim(self, sim: sim_base.Simulator) -> None:
         """Start a simulator and wait for it to be ready."""
         try:
             name = sim.full_name()
-            cmd_exec = await self._cmd_executor.start_simulator(
-                sim, sim.run_cmd(self._instantiation)
+            timeline = self._instantiation.timeline
+            # preparation of other simulators, e.g. copying host disk images, may still be
+            # running, but only this simulator's own has to be done before it can start
+            with timeline.span(name, "wait for prepare"):
+                await self._sim_prepare[sim]
+            target = SimulatorProbeTarget()
+            probes = sim.readiness_probes(self._instantiation)
+            log_files = None
+            if sim.output_to_file:
+                log_files = self._instantiation.env.get_simulator_log_paths(sim)
+            tail_logs = self._callbacks.needs_output_lines() or any(
+                probe.needs_output for probe in probes
             )
+            with timeline.span(name, "spawn"):
+                cmd_exec = await self._cmd_executor.start_simulator(
+                    sim,
+                    sim.run_cmd(self._instantiation),
+                    target.on_output,
+                    log_files,
+                    tail_logs,
+                    self._cpu_assignment.get(sim),
+                )
+            target.attach(cmd_exec)
+            cmd_exec.add_output_listener(self._activity_listener())
             self._running_sims[sim] = cmd_exec
 
-            # give simulator time to start if indicated
-            delay = sim.start_delay()
-            if delay > 0:
-                await asyncio.sleep(delay)
-
-            # Wait till sockets exist
-            wait_socks = sim.sockets_wait(inst=self._instantiation)
-            if len(wait_socks) > 0:
-                if self._verbose:
-                    print(f"{self._instantiation.simulation.name}: waiting for sockets {name}")
-                for sock in wait_socks:
-                    await sock.wait()
-                if self._verbose:
-                    print(
-                        f"{self._instantiation.simulation.name}: waited successfully for sockets {name}"
-                    )
+            try:
+                if probes:
+                    if self._verbose:
+                        print(
+                            f"{self._instantiation.simulation.name}: waiting for {name} to be ready"
+                        )
+                    with timeline.span(
+                        name, "wait for ready", probes=[type(p).__name__ for p in probes]
+                    ):
+                        await self._await_probes(sim, cmd_exec, target, probes)
+                    if self._verbose:
+                        print(f"{self._instantiation.simulation.name}: {name} is ready")
+                else:
+                    # no way to tell when the simulator is ready, give it time to start
+                    delay = sim.start_delay()
+                    if delay > 0:
+                        with timeline.span(name, "start delay"):
+                            await asyncio.sleep(delay)
+            finally:
+                target.detach()
             await self._callbacks.simulator_ready(sim)
 
         except asyncio.CancelledError:
@@ -236,7 +411,13 @@ class SimulationExecutor:
 
     async def prepare(self) -> None:
         self._instantiation._cmd_executor = self._cmd_executor
-        await self._instantiation.prepare()
+        await self._instantiation.prepare_env()
+
+        # Simulators are prepared concurrently in the background and each one is started as soon
+        # as its own preparation and its dependencies are done, so that e.g. a switch does not
+        # wait for the disk image copies of all hosts.
+        for sim in self._instantiation.assigned_fragment.all_simulators():
+            self._sim_prepare[sim] = asyncio.create_task(self._prepare_sim(sim))
 
         for sim in self._instantiation.simulation.all_simulators():
             if sim.wait_terminate:
@@ -249,6 +430,23 @@ class SimulationExecutor:
                 " Set wait_terminate on a simulator or wait on an application to wait for it."
             )
 
+    async def _prepare_sim(self, sim: sim_base.Simulator) -> None:
+        with self._instantiation.timeline.span(sim.full_name(), "prepare"):
+            await sim.prepare(inst=self._instantiation)
+
+    async def wait_prepared(self) -> None:
+        """Wait until all simulators are prepared. Failures are not raised here but when the
+        affected simulator is started in `run()`."""
+        if self._sim_prepare:
+            await asyncio.wait(self._sim_prepare.values())
+
+    async def _cancel_prepare(self) -> None:
+        """Cancel preparation of simulators that have not been started."""
+        for task in self._sim_prepare.values():
+            task.cancel()
+        # retrieves exceptions of failed preparations whose simulators were never started
+        await asyncio.gather(*self._sim_prepare.values(), return_exceptions=True)
+
     async def terminate_collect_sims(self) -> None:
         """Terminates all simulators and collects output."""
         if self._verbose:
@@ -256,86 +454,201 @@ class SimulationExecutor:
 
         # Interrupt, then terminate, then kill all processes. Do this in parallel so user does not
         # have to wait unnecessaryily long.
+        timeline = self._instantiation.timeline
         scs = []
-        for exec in itertools.chain(self._running_sims.values(), self._running_proxies.values()):
-            scs.append(asyncio.create_task(exec.int_term_kill()))
-        await asyncio.gather(*scs)
+        for sim, exec in self._running_sims.items():
+            scs.append(
+                asyncio.create_task(
+                    self._terminate(sim.full_name(), exec, sim.shutdown_grace_period())
+                )
+            )
+        for proxy, exec in self._running_proxies.items():
+            scs.append(asyncio.create_task(self._terminate(proxy.name, exec)))
+        with timeline.span("simulation", "terminate"):
+            await asyncio.gather(*scs)
 
         # wait for all processes to terminate
         for exec in itertools.chain(self._running_sims.values(), self._running_proxies.values()):
             await exec.wait()
 
+    async def _terminate(
+        self, track: str, exec: cmd_exec.CommandExecutor, grace: float = 5
+    ) -> None:
+        with self._instantiation.timeline.span(track, "terminate"):
+            await exec.int_term_kill(grace)
+
     async def sigusr1(self) -> None:
         for exec in self._running_sims.values():
             await exec.sigusr1()
 
+    def _activity_listener(self) -> typing.Callable[[list[str]], None]:
+        """Returns an output listener for one process that records activity for stall detection.
+        A batch identical to the process' previous one, e.g. unchanged statistics printed in
+        response to the profiler's SIGUSR1, does not count as progress."""
+        last: list[str] = []
+
+        def on_output(lines: list[str]) -> None:
+            nonlocal last
+            if lines != last:
+                self._last_activity = time.monotonic()
+                last = lines
+
+        return on_output
+
+    def _poll_log_activity(self) -> None:
+        """Record activity of processes writing to log files that are not read back, which
+        output listeners do not see, if the files grew since the last check. Unlike for output
+        that is read back, the statistics simulators print in response to the profiler also
+        count as activity here."""
+        for exec in itertools.chain(self._running_sims.values(), self._running_proxies.values()):
+            size = exec.unread_log_size()
+            if size is not None and size != self._log_sizes.get(exec, 0):
+                self._log_sizes[exec] = size
+                self._last_activity = time.monotonic()
+
+    async def _watch(self, task: asyncio.Task) -> output.SimulationExitState:
+        """Wait for `task` while enforcing the simulation's timeout and stall timeout. If one
+        of them expires, `task` is cancelled. Both only start once all simulators are
+        prepared, as preparation, e.g. copying disk images, produces no output."""
+        simulation = self._instantiation.simulation
+        stall_timeout = simulation.stall_timeout
+
+        exit_state = output.SimulationExitState.SUCCESS
+        try:
+            prepared = asyncio.create_task(self.wait_prepared())
+            try:
+                await asyncio.wait({task, prepared}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                prepared.cancel()
+            deadline = None
+            if simulation.timeout is not None:
+                deadline = time.monotonic() + simulation.timeout
+            self._last_activity = time.monotonic()
+
+            while True:
+                now = time.monotonic()
+                wake_ups = []
+                if deadline is not None:
+                    wake_ups.append(deadline - now)
+                if stall_timeout is not None:
+                    self._poll_log_activity()
+                    wake_ups.append(
+                        min(self._last_activity + stall_timeout - now, _ACTIVITY_POLL_INTERVAL)
+                    )
+                wait_time = max(min(wake_ups), 0) if wake_ups else None
+
+                done, _ = await asyncio.wait({task}, timeout=wait_time)
+                if done:
+                    task.result()
+                    return exit_state
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    exit_state = output.SimulationExitState.TIMEOUT
+                    print(
+                        f"{simulation.name}: timeout of {simulation.timeout} s expired,"
+                        " terminating simulation"
+                    )
+                    break
+                if stall_timeout is not None:
+                    self._poll_log_activity()
+                if stall_timeout is not None and now - self._last_activity >= stall_timeout:
+                    exit_state = output.SimulationExitState.STALLED
+                    print(
+                        f"{simulation.name}: no progress for {stall_timeout} s,"
+                        " terminating simulation"
+                    )
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        return exit_state
+
+    def _sample_resources(self) -> None:
+        assert self._resource_sampler is not None
+        for sim, exec in list(self._running_sims.items()):
+            if exec.running():
+                self._resource_sampler.sample(
+                    sim.full_name(), exec.pid, sim.resreq_cores(), sim.resreq_mem()
+                )
+        for proxy, exec in list(self._running_proxies.items()):
+            if exec.running():
+                self._resource_sampler.sample(proxy.name, exec.pid)
+
+    async def _resource_sampler_loop(self) -> None:
+        assert self._resource_sampler is not None
+        while True:
+            self._sample_resources()
+            await asyncio.sleep(self._resource_sampler.interval)
+
     async def _profiler(self) -> None:
         assert self._profile_int
         while True:
             await asyncio.sleep(self._profile_int)
             await self.sigusr1()
 
-    async def run(self) -> output.SimulationOutput:
-        profiler_task = None
+    async def _start_and_wait(self, starting: list[asyncio.Task]) -> None:
+        """Start all components and wait for the simulators flagged with wait_terminate to
+        exit."""
+        graph = self._instantiation.sim_dependencies()
+
+        # add a ProxyReadyInfo mapping for each external proxy in the graph
+        for node in graph:
+            for dep in graph[node]:
+                if (
+                    dep.type == dep_graph.SimulationDependencyNodeType.EXTERNAL_PROXY
+                    and dep.get_proxy().id() not in self._external_proxy_running
+                ):
+                    proxy_id = dep.get_proxy().id()
+                    self._external_proxy_running[proxy_id] = ProxyReadyInfo(proxy_id)
+
+        # Start every component as soon as all of its own dependencies are ready, so a slow
+        # component only delays its successors rather than the whole graph.
+        ts = graphlib.TopologicalSorter(graph)
+        ts.prepare()
+        timeline = self._instantiation.timeline
+        startup_begin = time.time()
+        pending: dict[asyncio.Task, dep_graph.SimulationDependencyNode] = {}
+        while ts.is_active():
+            for comp in ts.get_ready():
+                if graph[comp]:
+                    timeline.add(comp.name(), "wait for dependencies", startup_begin)
+                task = asyncio.create_task(self._start_component(comp))
+                starting.append(task)
+                pending[task] = comp
+
+            if not pending:
+                raise RuntimeError("dependency graph has active nodes but none can be started")
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                comp = pending.pop(task)
+                # propagate failures to start a component
+                task.result()
+                ts.done(comp)
+
+        timeline.add("simulation", "startup", startup_begin)
+
+        if self._profile_int:
+            self._profiler_task = asyncio.create_task(self._profiler())
+
+        # wait until all simulators indicated to be awaited exit
+        with timeline.span("simulation", "run"):
+            for sc in self._wait_sims.values():
+                await sc.wait()
 
+    async def run(self) -> output.SimulationOutput:
         starting: list[asyncio.Task] = []
         try:
             await self._callbacks.simulation_started()
-            graph = self._instantiation.sim_dependencies()
-
-            # add a ProxyReadyInfo mapping for each external proxy in the graph
-            for node in graph:
-                for dep in graph[node]:
-                    if (
-                        dep.type == dep_graph.SimulationDependencyNodeType.EXTERNAL_PROXY
-                        and dep.get_proxy().id() not in self._external_proxy_running
-                    ):
-                        proxy_id = dep.get_proxy().id()
-                        self._external_proxy_running[proxy_id] = ProxyReadyInfo(proxy_id)
-
-            ts = graphlib.TopologicalSorter(graph)
-            ts.prepare()
-            while ts.is_active():
-                # start ready simulators in parallel
-                topo_comps = []
-                for comp in ts.get_ready():
-                    comp: dep_graph.SimulationDependencyNode
-                    match comp.type:
-                        case dep_graph.SimulationDependencyNodeType.SIMULATOR:
-                            starting.append(
-                                asyncio.create_task(self._start_sim(comp.get_simulator()))
-                            )
-                            topo_comps.append(comp)
-                        case dep_graph.SimulationDependencyNodeType.PROXY:
-                            starting.append(
-                                asyncio.create_task(self._start_proxy(comp.get_proxy()))
-                            )
-                            topo_comps.append(comp)
-                        case dep_graph.SimulationDependencyNodeType.EXTERNAL_PROXY:
-                            starting.append(
-                                asyncio.create_task(self._wait_for_external_proxy(comp.get_proxy()))
-                            )
-                            topo_comps.append(comp)
-                        case _:
-                            raise RuntimeError("Unhandled topology component type")
-
-                # wait for starts to complete
-                await asyncio.gather(*starting)
-
-                for comp in topo_comps:
-                    ts.done(comp)
-
-                # could happen when blocked by waiting for external proxy to start
-                if not topo_comps:
-                    await asyncio.sleep(3)
-
-            if self._profile_int:
-                profiler_task = asyncio.create_task(self._profiler())
-
-            # wait until all simulators indicated to be awaited exit
-            for sc in self._wait_sims.values():
-                await sc.wait()
-            await self._callbacks.simulation_exited(output.SimulationExitState.SUCCESS)
+            if self._resource_sampler is not None:
+                self._resource_sampler_task = asyncio.create_task(self._resource_sampler_loop())
+            exit_state = await self._watch(asyncio.create_task(self._start_and_wait(starting)))
+            await self._callbacks.simulation_exited(exit_state)
         except asyncio.CancelledError:
             if self._verbose:
                 print(f"{self._instantiation.simulation.name}: interrupted")
@@ -344,16 +657,25 @@ class SimulationExecutor:
             await self._callbacks.simulation_exited(output.SimulationExitState.FAILED)
             traceback.print_exc()
 
-        if profiler_task:
+        if self._profiler_task:
             try:
-                profiler_task.cancel()
+                self._profiler_task.cancel()
             except asyncio.CancelledError:
                 pass
+        if self._resource_sampler_task:
+            self._resource_sampler_task.cancel()
+            # record the usage up to the end before the processes are terminated
+            self._sample_resources()
 
         for task in starting:
             if not task.done():
                 task.cancel()
-                await task
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    # proxies and external proxies do not swallow the cancellation
+                    pass
+        await self._cancel_prepare()
 
         # The bare except above guarantees that we always execute the following
         # code, which terminates all simulators and produces a proper output
@@ -363,9 +685,12 @@ class SimulationExecutor:
         while True:
             try:
                 await asyncio.shield(terminate_collect_task)
+                # only now all output, including what simulators print during teardown, is in
+                self._callbacks.simulation_output.close_stream()
                 return self._callbacks.simulation_output
             except asyncio.CancelledError as e:
                 print(e)
 
     async def cleanup(self) -> None:
+        await self._cancel_prepare()
         await self._instantiation.cleanup()
@@ -0,0 +1,270 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Persistent cache of files addressed by a hash of the inputs they were built from.
+
+Entries are files or directories. They are built at a temporary path and published with an atomic rename, so readers never see
+partially written entries. Concurrent builds of the same entry, also from different processes,
+are serialized through a lock file. Whenever an entry is used, its modification time is updated,
+which is used to evict the least recently used entries once the cache exceeds its size limit.
+Entries can be retained to protect them from eviction while they are in use, also by other
+processes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import hashlib
+import os
+import pathlib
+import typing
+import uuid
+
+from simbricks.utils import file as utils_file
+
+
+def content_key(*parts: str | bytes) -> str:
+    """Hash the given parts into a cache key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # length prefix, so that ("ab", "c") and ("a", "bc") differ
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _list_tree(path: str) -> list[str]:
+    files = []
+    for dirpath, _, filenames in os.walk(path):
+        files.extend(os.path.relpath(os.path.join(dirpath, name), path) for name in filenames)
+    return sorted(files)
+
+
+def _entry_size(path: pathlib.Path) -> int:
+    if not path.is_dir():
+        return path.stat().st_size
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            size += os.lstat(os.path.join(dirpath, name)).st_size
+    return size
+
+
+def _lock(path: pathlib.Path) -> int:
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o666)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return fd
+
+
+def _lock_shared(path: pathlib.Path) -> int:
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o666)
+    fcntl.flock(fd, fcntl.LOCK_SH)
+    return fd
+
+
+def _try_lock(path: pathlib.Path) -> int | None:
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _unlock(fd: int) -> None:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+class ContentCache:
+    def __init__(self, root: str | os.PathLike[str], max_size: int | None = None) -> None:
+        self.root: pathlib.Path = pathlib.Path(root).resolve()
+        self.max_size: int | None = max_size
+        """Size limit in bytes, `None` for no limit."""
+        self.hits: int = 0
+        self.misses: int = 0
+        self._retained: dict[str, tuple[int, int]] = {}
+        """Lock file descriptor and reference count of each entry retained by this process."""
+        for subdir in ("entries", "tmp", "locks", "digests"):
+            (self.root / subdir).mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, key: str, suffix: str = "") -> pathlib.Path:
+        return self.root / "entries" / f"{key}{suffix}"
+
+    def _lock_path(self, name: str) -> pathlib.Path:
+        return self.root / "locks" / f"{name}.lock"
+
+    def retain(self, key: str, suffix: str = "") -> None:
+        """Protect the entry from eviction until it is released as often as it was retained.
+        The entry does not have to exist yet."""
+        name = f"{key}{suffix}"
+        if name in self._retained:
+            fd, refs = self._retained[name]
+        else:
+            fd, refs = _lock_shared(self._lock_path(name)), 0
+        self._retained[name] = (fd, refs + 1)
+
+    def release(self, key: str, suffix: str = "") -> None:
+        name = f"{key}{suffix}"
+        fd, refs = self._retained.pop(name)
+        if refs > 1:
+            self._retained[name] = (fd, refs - 1)
+        else:
+            _unlock(fd)
+
+    def staging_path(self, key: str, suffix: str = "") -> str:
+        """A temporary path to build the entry at outside of `get()`, see `publish()`."""
+        return (self.root / "tmp" / f"{key}.{uuid.uuid4().hex}{suffix}").as_posix()
+
+    def publish(self, key: str, path: str, suffix: str = "") -> str:
+        """Publish the entry built at the staging path `path`. If the entry was published by
+        someone else in the meantime, that one is kept."""
+        entry = self.entry_path(key, suffix)
+        try:
+            os.rename(path, entry)
+        except OSError:
+            if not entry.exists():
+                raise
+            utils_file.rmtree(path)
+        self.evict(entry)
+        return entry.as_posix()
+
+    def lookup(self, key: str, suffix: str = "") -> str | None:
+        """Returns the path of the entry if it exists, marking it as recently used."""
+        path = self.entry_path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path.as_posix()
+
+    async def get(
+        self,
+        key: str,
+        build: typing.Callable[[str], typing.Awaitable[None]],
+        suffix: str = "",
+    ) -> str:
+        """
+        Returns the path of the entry for `key`, building it first if it does not exist yet.
+        `build` is called with a temporary path to write the entry to, which is published once
+        `build` returns.
+        """
+        path = self.lookup(key, suffix)
+        if path is not None:
+            self.hits += 1
+            return path
+
+        lock_fd = await asyncio.to_thread(_lock, self._lock_path(f"{key}{suffix}"))
+        try:
+            # someone else may have built the entry while we were waiting for the lock
+            path = self.lookup(key, suffix)
+            if path is not None:
+                self.hits += 1
+                return path
+
+            self.misses += 1
+            tmp_path = self.root / "tmp" / f"{key}.{uuid.uuid4().hex}{suffix}"
+            try:
+                await build(tmp_path.as_posix())
+                os.rename(tmp_path, self.entry_path(key, suffix))
+            finally:
+                utils_file.rmtree(tmp_path.as_posix())
+        finally:
+            _unlock(lock_fd)
+
+        await asyncio.to_thread(self.evict, self.entry_path(key, suffix))
+        return self.entry_path(key, suffix).as_posix()
+
+    async def file_digest(self, path: str) -> str:
+        """Content hash of a file. Hashes are remembered by inode, size and modification time, so
+        large files are only read again after they changed."""
+        stat = os.stat(path)
+        memo = (
+            self.root / "digests" / f"{stat.st_dev}-{stat.st_ino}-{stat.st_size}-{stat.st_mtime_ns}"
+        )
+        try:
+            return memo.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            pass
+        digest = await asyncio.to_thread(_hash_file, path)
+        tmp_memo = memo.with_name(f"{memo.name}.{uuid.uuid4().hex}")
+        tmp_memo.write_text(digest, encoding="utf-8")
+        os.rename(tmp_memo, memo)
+        return digest
+
+    async def path_digest(self, path: str) -> str:
+        """Content hash of a file, or of the names and contents of all files in a directory."""
+        if not os.path.isdir(path):
+            return await self.file_digest(path)
+        parts = []
+        for name in await asyncio.to_thread(_list_tree, path):
+            parts.append(name)
+            parts.append(await self.file_digest(os.path.join(path, name)))
+        return content_key(*parts)
+
+    def remove(self, key: str, suffix: str = "") -> None:
+        utils_file.rmtree(self.entry_path(key, suffix).as_posix())
+
+    def size(self) -> int:
+        return sum(_entry_size(entry) for entry in (self.root / "entries").iterdir())
+
+    def evict(self, keep: pathlib.Path | None = None) -> list[str]:
+        """Removes least recently used entries that are not retained until the cache fits its
+        size limit. Processes still using a removed entry keep their open file. Returns the
+        removed paths."""
+        if self.max_size is None:
+            return []
+        entries = []
+        for entry in (self.root / "entries").iterdir():
+            try:
+                entries.append((entry.stat().st_mtime, _entry_size(entry), entry))
+            except FileNotFoundError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_size:
+                break
+            if entry == keep:
+                continue
+            lock_fd = _try_lock(self._lock_path(entry.name))
+            if lock_fd is None:
+                # retained or being rebuilt
+                continue
+            try:
+                utils_file.rmtree(entry.as_posix())
+            finally:
+                _unlock(lock_fd)
+            total -= size
+            removed.append(entry.as_posix())
+        return removed
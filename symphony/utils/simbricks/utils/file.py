@@ -22,21 +22,30 @@
 """Utility functions for operations on files and directories."""
 
 import asyncio
+import concurrent.futures
+import functools
 import os
 import pathlib
 import shutil
 import typing
+import uuid
+
+from simbricks.utils import fswatch as utils_fswatch
+
+T = typing.TypeVar("T")
 
 
 async def await_file(path: str, delay=0.1, verbose=False, timeout=600) -> None:
+    """
+    Wait for `path` to exist.
+
+    Waiting is event-driven through a watcher shared by all waiters of the event loop, so the
+    call returns as soon as the file is created. `delay` is only used as polling interval when
+    the file cannot be watched, e.g. because its parent directory does not exist yet.
+    """
     if verbose:
         print(f"await_file({path})")
-    t = 0
-    while not os.path.exists(path):
-        if t >= timeout:
-            raise TimeoutError()
-        await asyncio.sleep(delay)
-        t += delay
+    await utils_fswatch.get_file_watcher().wait(path, timeout=timeout, delay=delay)
 
 
 def mkdir(path: str) -> None:
@@ -50,6 +59,54 @@ def rmtree(path: str) -> None:
         os.unlink(path)
 
 
+_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_deferred_deletions: set[asyncio.Task] = set()
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="simbricks-fs"
+        )
+    return _executor
+
+
+async def run_blocking(func: typing.Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run blocking file system work, e.g. deleting directories or writing large files, on a
+    dedicated thread pool instead of the event loop, which also drains the output of running
+    simulators.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def rmtree_deferred(path: str) -> None:
+    """
+    Remove `path` without waiting for it. The path is renamed first, so it can be recreated right
+    away, and the renamed tree is deleted in the background. Use `await_deferred_deletions()` to
+    wait until all deletions completed. If the path cannot be renamed, it is removed synchronously
+    instead, as callers rely on being able to recreate it once this returns.
+    """
+    if not os.path.lexists(path):
+        return
+    trash = f"{path}.deleted-{uuid.uuid4().hex[:8]}"
+    try:
+        os.rename(path, trash)
+    except OSError:
+        rmtree(path)
+        return
+    task = asyncio.get_running_loop().create_task(run_blocking(rmtree, trash))
+    _deferred_deletions.add(task)
+    task.add_done_callback(_deferred_deletions.discard)
+
+
+async def await_deferred_deletions() -> None:
+    while _deferred_deletions:
+        await asyncio.gather(*_deferred_deletions, return_exceptions=True)
+
+
 def is_absolute_exists(path: str) -> bool:
     pl_path = pathlib.Path(path)
     return pl_path.is_absolute() and pl_path.is_file()
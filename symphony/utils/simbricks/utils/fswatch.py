@@ -0,0 +1,310 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Event-driven waiting for files to appear.
+
+All waiters of an event loop share one :class:`FileWatcher`. On Linux, the watcher uses a single
+inotify instance with one watch per directory, so waiting on hundreds of sockets under the same
+SHM directory costs one file descriptor and no polling. Where inotify is not available (or a
+directory does not exist yet), waiters fall back to a single shared polling task instead of one
+polling coroutine per file."""
+
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import weakref
+
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+
+_WATCH_MASK = _IN_CREATE | _IN_MOVED_TO | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+_EVENT_HDR = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Thin ctypes wrapper around a non-blocking inotify instance."""
+
+    _libc: ctypes.CDLL | None = None
+    _libc_loaded: bool = False
+
+    def __init__(self, fd: int) -> None:
+        self.fd: int = fd
+
+    @classmethod
+    def _load_libc(cls) -> ctypes.CDLL | None:
+        if not cls._libc_loaded:
+            cls._libc_loaded = True
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+                cls._libc = libc
+            except (OSError, AttributeError):
+                cls._libc = None
+        return cls._libc
+
+    @classmethod
+    def create(cls) -> _Inotify | None:
+        """Returns a new inotify instance or `None` if inotify is not supported."""
+        libc = cls._load_libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        return cls(fd)
+
+    def add_watch(self, path: str) -> int | None:
+        assert self._libc is not None
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        return wd if wd >= 0 else None
+
+    def rm_watch(self, wd: int) -> None:
+        assert self._libc is not None
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> list[tuple[int, int, str]]:
+        """Drains all pending events and returns them as (wd, mask, name) tuples."""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            offset = 0
+            while offset + _EVENT_HDR.size <= len(buf):
+                wd, mask, _, name_len = _EVENT_HDR.unpack_from(buf, offset)
+                offset += _EVENT_HDR.size
+                name = os.fsdecode(buf[offset : offset + name_len].rstrip(b"\0"))
+                offset += name_len
+                events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _Waiter:
+    def __init__(self, path: str, future: asyncio.Future[None], delay: float) -> None:
+        self.path: str = path
+        self.future: asyncio.Future[None] = future
+        self.delay: float = delay
+
+    def resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class FileWatcher:
+    """Resolves waiters as soon as the file they are waiting for appears."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop: asyncio.AbstractEventLoop = loop
+        self._inotify: _Inotify | None = None
+        self._inotify_failed: bool = False
+        self._dir_wd: dict[str, int] = {}
+        self._wd_dir: dict[int, str] = {}
+        self._dir_waiters: dict[str, dict[str, list[_Waiter]]] = {}
+        """Waiters resolved through inotify, by directory and file name."""
+        self._polled: list[_Waiter] = []
+        """Waiters resolved through the polling fallback."""
+        self._poll_task: asyncio.Task | None = None
+
+    # -------------------
+    # inotify handling  -
+    # -------------------
+
+    def _ensure_inotify(self) -> _Inotify | None:
+        if self._inotify is None and not self._inotify_failed:
+            self._inotify = _Inotify.create()
+            if self._inotify is None:
+                self._inotify_failed = True
+            else:
+                self._loop.add_reader(self._inotify.fd, self._on_inotify_readable)
+        return self._inotify
+
+    def _close_inotify_if_idle(self) -> None:
+        if self._inotify is None or self._dir_wd:
+            return
+        self._loop.remove_reader(self._inotify.fd)
+        self._inotify.close()
+        self._inotify = None
+
+    def _watch_dir(self, directory: str) -> bool:
+        if directory in self._dir_wd:
+            return True
+        inotify = self._ensure_inotify()
+        if inotify is None:
+            return False
+        wd = inotify.add_watch(directory)
+        if wd is None:
+            self._close_inotify_if_idle()
+            return False
+        self._dir_wd[directory] = wd
+        self._wd_dir[wd] = directory
+        self._dir_waiters.setdefault(directory, {})
+        return True
+
+    def _unwatch_dir(self, directory: str, rm_watch: bool = True) -> None:
+        wd = self._dir_wd.pop(directory, None)
+        self._dir_waiters.pop(directory, None)
+        if wd is not None:
+            self._wd_dir.pop(wd, None)
+            if rm_watch and self._inotify is not None:
+                self._inotify.rm_watch(wd)
+        self._close_inotify_if_idle()
+
+    def _on_inotify_readable(self) -> None:
+        assert self._inotify is not None
+        for wd, mask, name in self._inotify.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                # Events were lost, fall back to checking every waiter explicitly
+                for directory in list(self._dir_waiters):
+                    self._recheck_dir(directory)
+                continue
+
+            directory = self._wd_dir.get(wd)
+            if directory is None:
+                continue
+
+            if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                # The directory itself is gone. Hand its waiters over to polling so they still
+                # resolve once the directory and file are re-created.
+                waiters = self._dir_waiters.get(directory, {})
+                self._unwatch_dir(directory, rm_watch=not (mask & _IN_IGNORED))
+                for name_waiters in waiters.values():
+                    for waiter in name_waiters:
+                        self._add_polled(waiter)
+                continue
+
+            name_waiters = self._dir_waiters[directory].pop(name, None)
+            if name_waiters:
+                for waiter in name_waiters:
+                    waiter.resolve()
+                if not self._dir_waiters[directory]:
+                    self._unwatch_dir(directory)
+
+    def _recheck_dir(self, directory: str) -> None:
+        waiters = self._dir_waiters.get(directory)
+        if waiters is None:
+            return
+        for name in list(waiters):
+            if os.path.exists(os.path.join(directory, name)):
+                for waiter in waiters.pop(name):
+                    waiter.resolve()
+        if not waiters:
+            self._unwatch_dir(directory)
+
+    # -------------------
+    # polling fallback  -
+    # -------------------
+
+    def _add_polled(self, waiter: _Waiter) -> None:
+        self._polled.append(waiter)
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = self._loop.create_task(self._poll_loop())
+
+    async def _poll_loop(self) -> None:
+        while self._polled:
+            await asyncio.sleep(min(waiter.delay for waiter in self._polled))
+            pending = []
+            for waiter in self._polled:
+                if waiter.future.done():
+                    continue
+                if os.path.exists(waiter.path):
+                    waiter.resolve()
+                else:
+                    pending.append(waiter)
+            self._polled = pending
+
+    # ------------
+    # public API -
+    # ------------
+
+    def _register(self, waiter: _Waiter) -> None:
+        directory, name = os.path.split(waiter.path)
+        if self._watch_dir(directory):
+            self._dir_waiters[directory].setdefault(name, []).append(waiter)
+            # The file may have been created between the initial check and adding the watch.
+            if os.path.exists(waiter.path):
+                self._recheck_dir(directory)
+        else:
+            self._add_polled(waiter)
+
+    def _unregister(self, waiter: _Waiter) -> None:
+        directory, name = os.path.split(waiter.path)
+        name_waiters = self._dir_waiters.get(directory, {}).get(name)
+        if name_waiters and waiter in name_waiters:
+            name_waiters.remove(waiter)
+            if not name_waiters:
+                del self._dir_waiters[directory][name]
+            if not self._dir_waiters[directory]:
+                self._unwatch_dir(directory)
+        if waiter in self._polled:
+            self._polled.remove(waiter)
+
+    async def wait(self, path: str, timeout: float | None = None, delay: float = 0.1) -> None:
+        """
+        Wait until `path` exists.
+
+        `delay` is only used as the polling interval if the file cannot be watched through
+        inotify. Raises `TimeoutError` if the file did not appear within `timeout` seconds.
+        """
+        path = os.path.abspath(path)
+        if os.path.exists(path):
+            return
+
+        waiter = _Waiter(path, self._loop.create_future(), delay)
+        self._register(waiter)
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        # before Python 3.11, asyncio.wait_for() throws asyncio.TimeoutError
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"timed out waiting for {path}")
+        finally:
+            self._unregister(waiter)
+
+
+_watchers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, FileWatcher] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_file_watcher() -> FileWatcher:
+    """Returns the file watcher shared by all waiters of the running event loop."""
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = FileWatcher(loop)
+        _watchers[loop] = watcher
+    return watcher
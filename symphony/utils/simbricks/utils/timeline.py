@@ -0,0 +1,154 @@
+# Copyright 2025 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Timestamped spans of the phases of a run, e.g. preparing and starting each simulator.
+
+Spans are recorded on named tracks, usually one per simulator or proxy, and can be exported in
+the Chrome trace event format to be viewed in `chrome://tracing` or Perfetto. Timestamps are
+wall-clock times so that timelines of the fragments of a distributed run can be merged.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import pathlib
+import time
+import typing
+
+
+class Span:
+    def __init__(
+        self, track: str, name: str, start: float, end: float, args: dict | None = None
+    ) -> None:
+        self.track: str = track
+        self.name: str = name
+        self.start: float = start
+        self.end: float = end
+        """Wall-clock start and end time in seconds."""
+        self.args: dict = args or {}
+
+    def toJSON(self) -> dict:
+        return {
+            "track": self.track,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "args": self.args,
+        }
+
+
+class Timeline:
+    """Records spans on named tracks."""
+
+    def __init__(self, name: str = "") -> None:
+        self.name: str = name
+        self.spans: list[Span] = []
+
+    def add(
+        self, track: str, name: str, start: float, end: float | None = None, **args: typing.Any
+    ) -> None:
+        """Record a span that already finished. Without `end`, it ends now."""
+        if end is None:
+            end = time.time()
+        self.spans.append(Span(track, name, start, end, args))
+
+    @contextlib.contextmanager
+    def span(self, track: str, name: str, **args: typing.Any) -> typing.Iterator[dict]:
+        """Record a span covering the body of the `with` statement, also if it raises or is
+        cancelled. Yields the span's arguments, which can still be extended in the body."""
+        start = time.time()
+        try:
+            yield args
+        finally:
+            self.add(track, name, start, **args)
+
+    def toJSON(self) -> dict:
+        return {"name": self.name, "spans": [span.toJSON() for span in self.spans]}
+
+    def to_chrome_trace(self) -> dict:
+        """The spans in the Chrome trace event format, one thread per track. Spans starting at
+        the same time are ordered longest first so that nested spans are displayed as such."""
+        tids: dict[str, int] = {}
+        events = [
+            {"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": self.name}}
+        ]
+        for span in sorted(self.spans, key=lambda span: (span.start, span.start - span.end)):
+            if span.track not in tids:
+                tids[span.track] = len(tids) + 1
+                events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": 1,
+                        "tid": tids[span.track],
+                        "args": {"name": span.track},
+                    }
+                )
+            events.append(
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": tids[span.track],
+                    "ts": span.start * 1e6,
+                    "dur": (span.end - span.start) * 1e6,
+                    "args": span.args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    @classmethod
+    def from_chrome_trace(cls, json_obj: dict) -> Timeline:
+        """Read back a timeline exported with `to_chrome_trace()`."""
+        timeline = cls()
+        tracks: dict[int, str] = {}
+        for event in json_obj["traceEvents"]:
+            if event["ph"] != "M":
+                continue
+            if event["name"] == "process_name":
+                timeline.name = event["args"]["name"]
+            elif event["name"] == "thread_name":
+                tracks[event["tid"]] = event["args"]["name"]
+        for event in json_obj["traceEvents"]:
+            if event["ph"] != "X":
+                continue
+            start = event["ts"] / 1e6
+            timeline.spans.append(
+                Span(
+                    tracks.get(event["tid"], str(event["tid"])),
+                    event["name"],
+                    start,
+                    start + event["dur"] / 1e6,
+                    event.get("args"),
+                )
+            )
+        return timeline
+
+    @classmethod
+    def load_chrome_trace(cls, path: str) -> Timeline:
+        with open(path, encoding="utf-8") as file:
+            return cls.from_chrome_trace(json.load(file))
+
+    def dump_chrome_trace(self, path: str) -> None:
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_chrome_trace(), file)